@@ -1,22 +1,290 @@
+import hashlib
+import json
 import os
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+import config
 
 from flask_openapi3 import OpenAPI, Info, Tag
-from flask import redirect
+from flask import g, redirect, request, Response, stream_with_context
+from pydantic import ValidationError
 from flask_cors import CORS
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm.attributes import set_committed_value
 
-from model import Session, User, Car, Rental
+from model import engine, Session, User, Car, Rental, with_profile, has_overlap, available_cars, lock_car, \
+    bulk_insert, bulk_write, insert_rows, batches, run_write, cursor_row, keyset_query, sort_column, filter_cars, \
+    filter_rentals, CarReport, UserReport, record_rentals, revenue_by_period, period_start, next_period, key_sweeper, \
+    find_response, store_response, PricingRule, soft_delete, archiver, record_cars, search_cars, record_changes, \
+    changes_after, log_bounds, is_purged, change_sweeper
+from cache import cache
+from pricing import pricing
+from occupancy import occupancy, occupancy_days
+from passwords import hasher, needs_rehash, PasswordHasherBusy
 from logger import logger
+from metrics import metrics, install_metrics
+from compression import compressor, install_compression
+from ratelimit import install_rate_limits
+from serialization import FastJSONProvider, fast_json_available
 from schemas import *
 
 info = Info(title="Car Rental API", version="1.0.0")
 app = OpenAPI(__name__, info=info)
 CORS(app)
+install_metrics(app, engine)
+install_compression(app, compressor)
+install_rate_limits(app)
+if config.JSON_FAST_PATH and fast_json_available():
+    app.json = FastJSONProvider(app)
 
 home_tag = Tag(name="Documentation", description="Selection of documentation: Swagger, Redoc, or RapiDoc")
 user_tag = Tag(name="User", description="Add, view, and remove users")
 car_tag = Tag(name="Car", description="Add, view, and remove cars")
 rental_tag = Tag(name="Rental", description="Manage car rentals")
+pricing_tag = Tag(name="Pricing", description="Manage pricing rules and quote rental prices")
+report_tag = Tag(name="Report", description="Revenue and fleet utilization reports")
+change_tag = Tag(name="Change", description="Follow the inserts and deletes of users, cars and rentals")
+monitoring_tag = Tag(name="Monitoring", description="Inspect the read-through cache and the request metrics")
+
+
+@app.teardown_appcontext
+def remove_session(exception=None):
+    """Closes the session of the request, returning its connection to the pool."""
+    Session.remove()
+
+
+@app.errorhandler(OperationalError)
+def database_busy(e):
+    """Answers the writes that found the database locked, or waited too long for the write queue, with 503."""
+    logger.warning("Error handling %s %s: Database is busy, Exception: %s", request.method, request.path, e)
+    return {"message": "Database is busy, try again"}, 503
+
+
+# The cache namespace each read endpoint is built from. Its generation changes whenever a write invalidates the
+# namespace, so it versions the responses of the endpoint.
+ETAG_NAMESPACES = {
+    "get_users": lambda args: "users",
+    "get_user": lambda args: f"user:{args.get('id', 1, type=int)}",
+    # Availability is changed by rentals, so listings filtered on it are neither cached nor tagged.
+    "get_cars": lambda args: None if "available" in args else "cars",
+    "get_car": lambda args: f"car:{args.get('id', 1, type=int)}",
+    "search_cars_by_name": lambda args: "cars",
+    "get_rentals": lambda args: "rentals",
+    "get_rental": lambda args: f"rental:{args.get('id', 1, type=int)}",
+    "get_car_reports": lambda args: "reports",
+    "get_user_reports": lambda args: "reports",
+    "get_period_report": lambda args: "reports",
+}
+
+# The responses of these endpoints also change when the day does, without any write: the availability of a car is
+# derived from its rentals covering today. Their ETags and cache entries are keyed on the date as well.
+DAILY_ENDPOINTS = ("get_car",)
+
+
+def etag_parts(endpoint: str, path: str) -> tuple:
+    """Returns what identifies the response of an endpoint within its ETag namespace."""
+    return (path, date.today()) if endpoint in DAILY_ENDPOINTS else (path,)
+
+
+def forget_archived_rentals(rentals):
+    """Drops the cached responses and the occupancy of a batch of rentals, once the archiver has committed it."""
+    namespaces = {"rentals", "reports"}
+    for rental in rentals:
+        namespaces.update((f"rental:{rental.id}", f"user:{rental.user_id}", f"car:{rental.car_id}"))
+        if rental.deleted_at is None:
+            occupancy.remove(rental.car_id, rental.rental_start_date, rental.rental_end_date)
+    cache.invalidate(*sorted(namespaces))
+
+
+if archiver is not None:
+    archiver.on_archived = forget_archived_rentals
+
+
+@app.before_request
+def start_archiver():
+    """Starts the rental archiver of the worker process, when archival is enabled."""
+    if archiver is not None:
+        archiver.start()
+
+
+@app.before_request
+def start_change_sweeper():
+    """Starts the change log sweeper of the worker process, when a retention limit is set."""
+    if change_sweeper is not None:
+        change_sweeper.start()
+
+
+@app.before_request
+def check_etag():
+    """Answers a conditional GET with 304 Not Modified when the client's copy is current.
+
+    The ETag comes from the version of the endpoint's namespace, so an unchanged resource is answered before the
+    handler runs, without opening a session. Versions are only shared by the worker processes with the redis
+    cache backend, so with the others no ETag is issued (see ReadThroughCache.etag).
+    """
+    namespace = ETAG_NAMESPACES.get(request.endpoint)
+    if request.method != "GET" or namespace is None or streamed(request.args):
+        return None
+    namespace = namespace(request.args)
+    if namespace is None:
+        return None
+    g.etag = cache.etag(namespace, *etag_parts(request.endpoint, request.full_path))
+    # Compressed responses carry the weak form of the ETag (see install_compression), so it is compared weakly.
+    if g.etag and request.if_none_match.contains_weak(g.etag):
+        response = Response(status=304)
+        response.set_etag(g.etag)
+        return response
+
+
+@app.after_request
+def set_etag(response):
+    """Tags the successful responses of the versioned read endpoints with their ETag."""
+    etag = g.pop("etag", None)
+    if etag and response.status_code == 200:
+        response.set_etag(etag)
+    return response
+
+
+def list_query(session, profile, columns, fields=None):
+    """Builds the base query of a listing.
+
+    It loads ORM instances with the loader profile or, on the JSON fast path, only the presented columns as row
+    tuples, which skips ORM hydration and the identity map. The presenters read both the same way. With the
+    `fields` of a projection, only their columns (and the ID) are selected, as row tuples.
+    """
+    if fields:
+        return session.query(*project_columns(columns, fields))
+    if config.JSON_FAST_PATH:
+        return session.query(*columns)
+    return with_profile(session.query(columns[0].class_), profile)
+
+
+# Answered to a sorted page whose cursor row no longer exists (see missing_cursor).
+MISSING_CURSOR_MESSAGE = "Invalid cursor: The row of after_id no longer exists, start again from the first page"
+
+
+def missing_cursor(session, id_column, after_id, sort_column=None, descending=False) -> bool:
+    """Checks whether the cursor row of a sorted keyset query is gone, so its next page cannot be found.
+
+    Pages sorted by ID do not need the row, so their cursor is never missing (see cursor_row).
+    """
+    query = cursor_row(id_column, after_id, sort_column)
+    return query is not None and session.execute(query).first() is None
+
+
+def fetch_page(query, limit, key="id"):
+    """Fetches one page of a keyset query.
+
+    One extra row is read to find out whether there is a next page. It returns the rows and the
+    cursor of the next page (the `key` attribute of its last row), which is None when this is the last page.
+    """
+    limit = limit or DEFAULT_PAGE_LIMIT
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, getattr(rows[-1], key)
+    return rows, None
+
+
+def stream_rows(session, query, limit, present, key):
+    """Streams the rows of a keyset query as NDJSON, one JSON object per line.
+
+    Rows are read from the database in batches with `yield_per`, so the memory used does not depend
+    on the size of the table. The session is closed once the stream is exhausted.
+    """
+    if limit:
+        query = query.limit(limit)
+
+    def generate():
+        try:
+            batch = []
+            for row in query.yield_per(STREAM_BATCH_SIZE):
+                batch.append(row)
+                if len(batch) == STREAM_BATCH_SIZE:
+                    for item in present(batch)[key]:
+                        yield app.json.dumps(item, separators=(",", ":")) + "\n"
+                    batch = []
+            for item in present(batch)[key]:
+                yield app.json.dumps(item, separators=(",", ":")) + "\n"
+        finally:
+            session.close()
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+def read_bulk_forms(schema):
+    """Reads the rows of a bulk import and validates each of them with the schema of the single-row endpoint.
+
+    The body is either a JSON array or NDJSON (one JSON object per line, with the application/x-ndjson mimetype).
+    It returns the valid rows as (index, form) pairs and the results of the invalid rows, or None when the body
+    itself cannot be read.
+    """
+    try:
+        if request.mimetype == "application/x-ndjson":
+            lines = request.get_data(as_text=True).splitlines()
+            items = [json.loads(line) for line in lines if line.strip()]
+        else:
+            items = request.get_json()
+    except ValueError:
+        return None
+    if not isinstance(items, list):
+        return None
+
+    forms, results = [], []
+    for index, item in enumerate(items):
+        try:
+            forms.append((index, schema.model_validate(item)))
+        except ValidationError as e:
+            results.append({"index": index, "status": 422, "message": str(e)})
+    return forms, results
+
+
+def replay_response(scope, key, form):
+    """Returns the stored response of a write request sent again with the same Idempotency-Key, if any.
+
+    The response is replayed as it was sent, without running the write again. A key reused with a different
+    request is rejected with 422. It returns None when the request has no key, or its key has no stored response.
+    """
+    if key is None:
+        return None
+    stored = find_response(Session(), scope, key)
+    if stored is None:
+        return None
+    if stored.request_hash != request_hash(form):
+        error_msg = "Idempotency-Key was already used with a different request"
+        logger.warning("Error replaying '%s' for key '%s': %s", scope, key, error_msg)
+        return {"message": error_msg}, 422
+    logger.debug("Replaying '%s' for key '%s'", scope, key)
+    return Response(stored.response, 200, mimetype="application/json", headers={"Idempotent-Replayed": "true"})
+
+
+def remember_response(scope, key, form, job):
+    """Wraps a write job so that its response is stored under the request's Idempotency-Key, if it has one.
+
+    The response is stored in the transaction of the write, and only when the job returns a result. When a
+    concurrent request with the same key commits first, the write fails with an IntegrityError and is rolled
+    back, and replay_response then finds the response of the other request.
+    """
+    if key is None:
+        return job
+    key_sweeper.start()
+
+    def job_with_key(session):
+        result = job(session)
+        if result is not None:
+            body = app.json.response(result).get_data(as_text=True)
+            store_response(session, scope, key, request_hash(form), body, config.IDEMPOTENCY_TTL_SECONDS)
+        return result
+
+    return job_with_key
+
+
+def request_hash(form):
+    """Fingerprints the validated body of a write request, to detect an Idempotency-Key reused for another one."""
+    return hashlib.sha256(form.model_dump_json().encode()).hexdigest()
 
 
 @app.get('/', tags=[home_tag])
@@ -25,49 +293,146 @@ def home():
     return redirect('/openapi')
 
 
-@app.post('/user', tags=[user_tag], responses={"200": UserViewSchema, "409": ErrorSchema, "400": ErrorSchema})
-def add_user(form: UserSchema):
+@app.post('/user', tags=[user_tag], responses={"200": UserViewSchema, "409": ErrorSchema, "400": ErrorSchema, "503": ErrorSchema})
+def add_user(form: UserSchema, header: IdempotencyHeaderSchema):
     """Adds a new user to the database.
 
     It returns the newly created user with their ID.
     """
-    user = User(
-        name=form.name,
-        email=form.email,
-        password=form.password,
-        driver_license_number=form.driver_license_number
-    )
-    logger.debug(f"Adding user: '{user.name}'")
+    logger.debug("Adding user: '%s'", form.name)
+
+    replay = replay_response("add_user", header.idempotency_key, form)
+    if replay is not None:
+        return replay
+
     try:
-        session = Session()
+        # Hashed on the hasher's pool, before the write transaction begins.
+        password_hash = hasher.hash(form.password)
+    except PasswordHasherBusy as e:
+        error_msg = "Server is busy, try again"
+        logger.warning("Error adding user '%s': %s, Exception: %s", form.name, error_msg, e)
+        return {"message": error_msg}, 503
+
+    def insert_user(session):
+        user = User(
+            name=form.name,
+            email=form.email,
+            password=password_hash,
+            driver_license_number=form.driver_license_number
+        )
         session.add(user)
-        session.commit()
-        logger.debug(f"User added: '{user.name}'")
-        return present_user(user), 200
+        session.flush()
+        # A new user has no rentals yet, so there is nothing to load for the response.
+        set_committed_value(user, "rentals", [])
+        set_committed_value(user, "total_rentals", 0)
+        user = present_user(user)
+        record_changes(session, "user", "insert", [user])
+        return user
+
+    try:
+        user = run_write(remember_response("add_user", header.idempotency_key, form, insert_user))
+        cache.invalidate("users")
+        logger.debug("User added: '%s'", form.name)
+        return user, 200
     except IntegrityError as e:
+        replay = replay_response("add_user", header.idempotency_key, form)
+        if replay is not None:
+            return replay
         error_msg = "User with the same email or driver license number already exists"
-        logger.warning(f"Error adding user '{user.name}': {error_msg}, Exception: {str(e)}")
+        logger.warning("Error adding user '%s': %s, Exception: %s", form.name, error_msg, e)
         return {"message": error_msg}, 409
+    except OperationalError as e:
+        error_msg = "Database is busy, try again"
+        logger.warning("Error adding user '%s': %s, Exception: %s", form.name, error_msg, e)
+        return {"message": error_msg}, 503
     except Exception as e:
         error_msg = "Failed to add user"
-        logger.warning(f"Error adding user '{user.name}': {error_msg}, Exception: {str(e)}")
+        logger.warning("Error adding user '%s': %s, Exception: %s", form.name, error_msg, e)
         return {"message": error_msg}, 400
 
 
+@app.post('/users/bulk', tags=[user_tag], responses={"200": BulkResultSchema, "400": ErrorSchema})
+def add_users_bulk():
+    """Adds many users to the database from a JSON array or an NDJSON upload of UserSchema rows.
+
+    The users are inserted in batches, one transaction each. It returns the result of every row, with the status
+    add_user would have returned for it.
+    """
+    parsed = read_bulk_forms(UserSchema)
+    if parsed is None:
+        error_msg = "Body must be a JSON array or NDJSON"
+        logger.warning("Error adding users in bulk: %s", error_msg)
+        return {"message": error_msg}, 400
+    forms, results = parsed
+    logger.debug("Adding %s users in bulk", len(forms))
+
+    session = Session()
+    error_msg = "User with the same email or driver license number already exists"
+    seen_emails, seen_licenses = set(), set()
+    for batch in batches(forms):
+        emails = [form.email for _, form in batch]
+        licenses = [form.driver_license_number for _, form in batch]
+        existing = session.query(User.email, User.driver_license_number).filter(
+            (User.email.in_(emails)) | (User.driver_license_number.in_(licenses))
+        ).all()
+        seen_emails.update(email for email, _ in existing)
+        seen_licenses.update(license for _, license in existing)
+
+        accepted = []
+        for index, form in batch:
+            if form.email in seen_emails or form.driver_license_number in seen_licenses:
+                results.append({"index": index, "status": 409, "message": error_msg})
+                continue
+            seen_emails.add(form.email)
+            seen_licenses.add(form.driver_license_number)
+            accepted.append((index, form))
+
+        try:
+            password_hashes = hasher.hash_many([form.password for _, form in accepted])
+        except PasswordHasherBusy as e:
+            logger.warning("Error hashing the passwords of a bulk batch: %s", e)
+            results.extend({"index": index, "status": 503, "message": "Server is busy, try again"}
+                           for index, _ in accepted)
+            continue
+        rows = [dict(form.model_dump(), password=password_hash)
+                for (_, form), password_hash in zip(accepted, password_hashes)]
+        ids = bulk_insert(
+            run_write, User, rows, before_commit=lambda session, rows: record_changes(session, "user", "insert", rows)
+        )
+        for (index, _), user_id in zip(accepted, ids):
+            if user_id is None:
+                results.append({"index": index, "status": 409, "message": error_msg})
+            else:
+                results.append({"index": index, "status": 200, "id": user_id})
+
+    cache.invalidate("users")
+    logger.debug("Bulk users processed: %s rows", len(results))
+    return present_bulk_results(results), 200
+
+
 @app.get('/users', tags=[user_tag], responses={"200": UserListSchema, "404": ErrorSchema})
-def get_users():
-    """Retrieves all users from the database.
+def get_users(query: UserPageQuerySchema):
+    """Retrieves a page of users from the database, ordered by ID.
 
-    This endpoint returns a list of all users stored in the database. If no users are found, an empty list is returned.
+    Pages are selected with keyset pagination: pass the returned `next_after_id` as `after_id` to fetch the next page.
+    With `stream=true` the users are streamed as NDJSON instead, read from the database in batches.
+    With `fields`, only those fields of the users are read and returned.
+    If no users are found, an empty list is returned.
     """
-    logger.debug("Retrieving all users")
+    logger.debug("Retrieving users after ID: %s", query.after_id)
     session = Session()
-    users = session.query(User).all()
+    fields = selected_fields(query.fields, USER_LIST_FIELDS)
+    users_query = keyset_query(list_query(session, "user_list", USER_LIST_COLUMNS, fields), User.id, query.after_id)
+    if query.stream:
+        logger.debug("Streaming users")
+        return stream_rows(session, users_query, query.limit, lambda rows: present_users(rows, fields=fields), "users")
+
+    users, next_after_id = fetch_page(users_query, query.limit)
     if not users:
-        return {"users": []}, 200
+        return {"users": [], "next_after_id": None}, 200
     else:
-        logger.debug(f"{len(users)} users found")
-        return present_users(users), 200
+        logger.debug("%s users found", len(users))
+        return present_users(users, next_after_id, fields), 200
 
 
 @app.get('/user', tags=[user_tag], responses={"200": UserViewSchema, "404": ErrorSchema})
@@ -77,83 +442,326 @@ def get_user(query: UserSearchSchema):
     This endpoint returns the details of a user with the specified ID. If the user is not found, it returns a 404 error.
     """
     user_id = query.id
-    logger.debug(f"Retrieving user with ID: {user_id}")
-    session = Session()
-    user = session.query(User).filter(User.id == user_id).first()
+    logger.debug("Retrieving user with ID: %s", user_id)
+
+    def load_user():
+        user = with_profile(Session().query(User), "user_detail").filter(User.id == user_id).first()
+        return present_user(user) if user else None
+
+    user = cache.get_or_load(f"user:{user_id}", load_user)
     if not user:
         error_msg = "User not found"
-        logger.warning(f"Error retrieving user with ID '{user_id}': {error_msg}")
+        logger.warning("Error retrieving user with ID '%s': %s", user_id, error_msg)
         return {"message": error_msg}, 404
     else:
-        logger.debug(f"User found with ID: '{user_id}'")
-        return present_user(user), 200
+        logger.debug("User found with ID: '%s'", user_id)
+        return user, 200
 
 
 @app.delete('/user', tags=[user_tag], responses={"200": UserDeleteSchema, "404": ErrorSchema})
 def delete_user(query: UserSearchSchema):
     """Deletes a user from the database by their ID.
 
-    It returns a message indicating whether the deletion was successful.
+    The user is soft deleted: the row is kept, with its rentals, but it is no longer served. It returns a message
+    indicating whether the deletion was successful.
     """
     user_id = query.id
-    logger.debug(f"Deleting user with ID: {user_id}")
+    logger.debug("Deleting user with ID: %s", user_id)
 
-    session = Session()
-    count = session.query(User).filter(User.id == user_id).delete()
-    session.commit()
+    def remove_user(session):
+        if soft_delete(session, User, User.id == user_id):
+            record_changes(session, "user", "delete", [{"id": user_id}])
+            return True
+        return False
 
-    if count:
-        logger.debug(f"Deleted user with ID: {user_id}")
+    if run_write(remove_user):
+        cache.invalidate(f"user:{user_id}", "users")
+        logger.debug("Deleted user with ID: %s", user_id)
         return {"message": "User deleted successfully", "id": user_id}, 200
     else:
         error_msg = "User not found"
-        logger.warning(f"Error deleting user with ID '{user_id}': {error_msg}")
+        logger.warning("Error deleting user with ID '%s': %s", user_id, error_msg)
         return {"message": error_msg}, 404
 
 
-@app.post('/car', tags=[car_tag], responses={"200": CarViewSchema, "409": ErrorSchema, "400": ErrorSchema})
-def add_car(form: CarSchema):
+@app.post('/login', tags=[user_tag], responses={"200": LoginResultSchema, "401": ErrorSchema, "503": ErrorSchema})
+def login(form: LoginSchema):
+    """Checks the email and password of a user.
+
+    The password is checked on the password hasher's pool. A password hashed with older parameters than the
+    configured ones is hashed again with them. An unknown email and a wrong password get the same answer.
+    """
+    logger.debug("Logging in user: '%s'", form.email)
+    session = Session()
+    user = session.query(User.id, User.password).filter(User.email == form.email).first()
+    stored = user.password if user else None
+
+    try:
+        valid = hasher.verify(form.password, stored)
+    except PasswordHasherBusy as e:
+        error_msg = "Server is busy, try again"
+        logger.warning("Error logging in user '%s': %s, Exception: %s", form.email, error_msg, e)
+        return {"message": error_msg}, 503
+
+    if not valid:
+        error_msg = "Invalid email or password"
+        logger.warning("Error logging in user '%s': %s", form.email, error_msg)
+        return {"message": error_msg}, 401
+
+    if needs_rehash(stored):
+        try:
+            password_hash = hasher.hash(form.password)
+            # Only replaces the hash that was checked, in case the password changed in the meantime.
+            run_write(lambda session: session.query(User).filter(User.id == user.id, User.password == stored)
+                      .update({User.password: password_hash}, synchronize_session=False))
+            logger.debug("Rehashed the password of user with ID: %s", user.id)
+        except Exception as e:
+            logger.warning("Error rehashing the password of user with ID '%s': %s", user.id, e)
+
+    logger.debug("User logged in with ID: %s", user.id)
+    return {"message": "Login successful", "id": user.id}, 200
+
+
+@app.post('/car', tags=[car_tag], responses={"200": CarViewSchema, "409": ErrorSchema, "400": ErrorSchema, "503": ErrorSchema})
+def add_car(form: CarSchema, header: IdempotencyHeaderSchema):
     """Adds a new car to the database.
 
     It returns the newly created car with its ID and availability status.
     """
-    car = Car(
-        make=form.make,
-        model=form.model,
-        year=form.year,
-        price_per_day=form.price_per_day
-    )
-    logger.debug(f"Adding car: '{car.make} {car.model}'")
-    try:
-        session = Session()
+    logger.debug("Adding car: '%s %s'", form.make, form.model)
+
+    replay = replay_response("add_car", header.idempotency_key, form)
+    if replay is not None:
+        return replay
+
+    def insert_car(session):
+        car = Car(
+            make=form.make,
+            model=form.model,
+            year=form.year,
+            price_per_day=form.price_per_day
+        )
         session.add(car)
-        session.commit()
-        logger.debug(f"Car added: '{car.make} {car.model}'")
-        return present_car(car), 200
+        session.flush()
+        record_cars(session, [{"make": car.make, "model": car.model}])
+        # Reloads the stored values, e.g. price_per_day rounded by its Numeric(10, 2) column.
+        session.refresh(car)
+        car = present_car(car)
+        record_changes(session, "car", "insert", [car])
+        return car
+
+    try:
+        car = run_write(remember_response("add_car", header.idempotency_key, form, insert_car))
+        cache.invalidate("cars", "reports")
+        logger.debug("Car added: '%s %s'", form.make, form.model)
+        return car, 200
     except IntegrityError as e:
+        replay = replay_response("add_car", header.idempotency_key, form)
+        if replay is not None:
+            return replay
         error_msg = "Car with the same make and model already exists"
-        logger.warning(f"Error adding car '{car.make} {car.model}': {error_msg}, Exception: {str(e)}")
+        logger.warning("Error adding car '%s %s': %s, Exception: %s", form.make, form.model, error_msg, e)
         return {"message": error_msg}, 409
+    except OperationalError as e:
+        error_msg = "Database is busy, try again"
+        logger.warning("Error adding car '%s %s': %s, Exception: %s", form.make, form.model, error_msg, e)
+        return {"message": error_msg}, 503
     except Exception as e:
         error_msg = "Failed to add car"
-        logger.warning(f"Error adding car '{car.make} {car.model}': {error_msg}, Exception: {str(e)}")
+        logger.warning("Error adding car '%s %s': %s, Exception: %s", form.make, form.model, error_msg, e)
         return {"message": error_msg}, 400
 
 
-@app.get('/cars', tags=[car_tag], responses={"200": CarListSchema, "404": ErrorSchema})
-def get_cars():
-    """Retrieves all cars from the database.
+@app.post('/cars/bulk', tags=[car_tag], responses={"200": BulkResultSchema, "400": ErrorSchema})
+def add_cars_bulk():
+    """Adds many cars to the database from a JSON array or an NDJSON upload of CarSchema rows.
 
-    It returns a list of all cars stored in the database. If no cars are found, an empty list is returned.
+    The cars are inserted in batches, one transaction each. It returns the result of every row, with the status
+    add_car would have returned for it.
     """
-    logger.debug("Retrieving all cars")
+    parsed = read_bulk_forms(CarSchema)
+    if parsed is None:
+        error_msg = "Body must be a JSON array or NDJSON"
+        logger.warning("Error adding cars in bulk: %s", error_msg)
+        return {"message": error_msg}, 400
+    forms, results = parsed
+    logger.debug("Adding %s cars in bulk", len(forms))
+
+    def record_batch(session, rows):
+        record_cars(session, rows)
+        record_changes(session, "car", "insert", rows)
+
     session = Session()
-    cars = session.query(Car).all()
+    for batch in batches(forms):
+        ids = bulk_insert(run_write, Car, [form.model_dump() for _, form in batch], before_commit=record_batch)
+        for (index, _), car_id in zip(batch, ids):
+            if car_id is None:
+                error_msg = "Car with the same make and model already exists"
+                results.append({"index": index, "status": 409, "message": error_msg})
+            else:
+                results.append({"index": index, "status": 200, "id": car_id})
+    cache.invalidate("cars", "reports")
+
+    logger.debug("Bulk cars processed: %s rows", len(results))
+    return present_bulk_results(results), 200
+
+
+@app.get('/cars', tags=[car_tag], responses={"200": CarListSchema, "400": ErrorSchema, "404": ErrorSchema})
+def get_cars(query: CarFilterSchema):
+    """Retrieves a page of cars from the database, filtered and sorted.
+
+    Cars can be filtered by make, model, year, price range and availability, and sorted by ID, year or price.
+    Every filter is served by an index. Pages are selected with keyset pagination: pass the returned
+    `next_after_id` as `after_id` to fetch the next page. With `stream=true` the cars are streamed as NDJSON
+    instead, read from the database in batches. With `fields`, only those fields of the cars are read and
+    returned. If no cars are found, an empty list is returned.
+    """
+    logger.debug("Retrieving cars after ID: %s", query.after_id)
+    session = Session()
+    fields = selected_fields(query.fields, CAR_LIST_FIELDS)
+    sort = sort_column(Car, query.sort)
+    if missing_cursor(session, Car.id, query.after_id, *sort):
+        logger.warning("Error retrieving cars: %s", MISSING_CURSOR_MESSAGE)
+        return {"message": MISSING_CURSOR_MESSAGE}, 400
+    cars_query = keyset_query(
+        filter_cars(list_query(session, "car_list", CAR_LIST_COLUMNS, fields), query), Car.id, query.after_id, *sort
+    )
+    if query.stream:
+        logger.debug("Streaming cars")
+        return stream_rows(session, cars_query, query.limit, lambda rows: present_cars(rows, fields=fields), "cars")
+
+    def load_page():
+        cars, next_after_id = fetch_page(cars_query, query.limit)
+        return present_cars(cars, next_after_id, fields)
+
+    if query.available is None:
+        page = cache.get_or_load("cars", load_page, *sorted(query.model_dump().items()))
+    else:
+        page = load_page()
+    logger.debug("%s cars found", len(page['cars']))
+    return page, 200
+
+
+@app.get('/cars/search', tags=[car_tag], responses={"200": CarListSchema})
+def search_cars_by_name(query: CarSearchQuerySchema):
+    """Searches the cars by make and model, e.g. `toy cor` for Toyota Corolla.
+
+    Every word of the search must start a word of the make or the model, in any order, ignoring case and accents.
+    The matching makes and models are ranked by relevance, then by number of cars, and up to `limit` of their cars
+    are returned, without pagination. The search is served by an FTS5 index of the makes and models, so it takes
+    the same time on any size of catalogue.
+    """
+    logger.debug("Searching cars: '%s'", query.q)
+
+    def load_results():
+        return present_cars(search_cars(Session(), query.q, query.limit), None)
+
+    page = cache.get_or_load("cars", load_results, "search", query.q, query.limit)
+    logger.debug("%s cars found", len(page['cars']))
+    return page, 200
+
+
+@app.get('/cars/available', tags=[car_tag], responses={"200": CarListSchema, "400": ErrorSchema})
+def get_available_cars(query: CarAvailabilitySearchSchema):
+    """Retrieves a page of the cars that are not rented at any time between the start and end dates.
+
+    The cars are paginated like in /cars. The check of each car is served by the rental period index, so the
+    rental history is never scanned.
+    """
+    logger.debug("Retrieving cars available from %s to %s", query.start, query.end)
+    if query.end < query.start:
+        error_msg = "Invalid rental period: End date is before start date"
+        logger.warning("Error retrieving available cars: %s", error_msg)
+        return {"message": error_msg}, 400
+
+    session = Session()
+    cars_query = keyset_query(
+        with_profile(available_cars(session, query.start, query.end), "car_list"), Car.id, query.after_id
+    )
+    if query.stream:
+        logger.debug("Streaming available cars")
+        return stream_rows(session, cars_query, query.limit, present_cars, "cars")
+
+    cars, next_after_id = fetch_page(cars_query, query.limit)
     if not cars:
-        return {"cars": []}, 200
+        return {"cars": [], "next_after_id": None}, 200
     else:
-        logger.debug(f"{len(cars)} cars found")
-        return present_cars(cars), 200
+        logger.debug("%s available cars found", len(cars))
+        return present_cars(cars, next_after_id), 200
+
+
+def check_calendar_period(start, end):
+    """Returns why a calendar period cannot be served by the occupancy calendar, or None when it can."""
+    if end < start:
+        return "Invalid calendar period: End date is before start date"
+    if (end - start).days > config.CALENDAR_MAX_DAYS:
+        return f"Invalid calendar period: Longer than {config.CALENDAR_MAX_DAYS} days"
+    if not occupancy.covers(start, end):
+        first_day, end_day = occupancy.window()
+        return f"Invalid calendar period: The calendar covers {first_day} to {end_day}"
+    return None
+
+
+@app.get('/car/calendar', tags=[car_tag], responses={"200": CarCalendarSchema, "400": ErrorSchema, "404": ErrorSchema})
+def get_car_calendar(query: CarCalendarQuerySchema):
+    """Retrieves the occupancy calendar of a car: whether it is rented on each day from the start to the end date.
+
+    It is answered from the in-memory occupancy calendar of the fleet, without reading the rentals, for periods of
+    up to a year within the window of the calendar (a year before today to two years after it by default).
+    """
+    car_id = query.id
+    logger.debug("Retrieving the calendar of car ID %s from %s to %s", car_id, query.start, query.end)
+    error_msg = check_calendar_period(query.start, query.end)
+    if error_msg:
+        logger.warning("Error retrieving the calendar of car ID '%s': %s", car_id, error_msg)
+        return {"message": error_msg}, 400
+
+    session = Session()
+    if not session.query(Car.id).filter(Car.id == car_id).first():
+        error_msg = "Car not found"
+        logger.warning("Error retrieving the calendar of car ID '%s': %s", car_id, error_msg)
+        return {"message": error_msg}, 404
+
+    occupancy.refresh(session)
+    bits = occupancy.occupancy([car_id], query.start, query.end)[car_id]
+    return present_car_calendar(car_id, occupancy_days(bits, (query.end - query.start).days)), 200
+
+
+@app.get('/calendar', tags=[car_tag], responses={"200": FleetCalendarSchema, "400": ErrorSchema})
+def get_fleet_calendar(query: FleetCalendarQuerySchema):
+    """Retrieves a page of the occupancy calendar of the fleet: whether each car is rented on each day.
+
+    The cars are paginated by ID like in /cars, and can be limited to those free over the whole period, or rented
+    on some day of it. Their occupancy comes from the in-memory occupancy calendar (see /car/calendar): a shift and
+    a mask of each car's bitset, so the rentals are never read.
+    """
+    logger.debug("Retrieving the fleet calendar from %s to %s", query.start, query.end)
+    error_msg = check_calendar_period(query.start, query.end)
+    if error_msg:
+        logger.warning("Error retrieving the fleet calendar: %s", error_msg)
+        return {"message": error_msg}, 400
+
+    session = Session()
+    occupancy.refresh(session)
+    limit = query.limit or DEFAULT_PAGE_LIMIT
+    days = (query.end - query.start).days
+    cars, after_id = [], query.after_id
+    # The car IDs are read in batches until the page (and one more car, to find out whether there is a next page)
+    # is filled, since the available filter can skip any number of them.
+    while len(cars) <= limit:
+        car_ids = [car_id for car_id, in keyset_query(
+            session.query(Car.id).filter(Car.deleted_at.is_(None)), Car.id, after_id
+        ).limit(STREAM_BATCH_SIZE)]
+        if not car_ids:
+            break
+        for car_id, bits in occupancy.occupancy(car_ids, query.start, query.end).items():
+            if query.available is None or query.available == (bits == 0):
+                cars.append(present_car_calendar(car_id, occupancy_days(bits, days)))
+        after_id = car_ids[-1]
+
+    next_after_id = cars[limit - 1]["id"] if len(cars) > limit else None
+    logger.debug("%s car calendars found", len(cars[:limit]))
+    return {"start": query.start, "end": query.end, "cars": cars[:limit], "next_after_id": next_after_id}, 200
 
 
 @app.get('/car', tags=[car_tag], responses={"200": CarViewSchema, "404": ErrorSchema})
@@ -163,104 +771,245 @@ def get_car(query: CarSearchSchema):
     It returns the details of a car with the specified ID. If the car is not found, it returns a 404 error.
     """
     car_id = query.id
-    logger.debug(f"Retrieving car with ID: {car_id}")
-    session = Session()
-    car = session.query(Car).filter(Car.id == car_id).first()
+    logger.debug("Retrieving car with ID: %s", car_id)
 
+    def load_car():
+        car = with_profile(Session().query(Car), "car_detail").filter(Car.id == car_id).first()
+        return present_car(car) if car else None
+
+    car = cache.get_or_load(f"car:{car_id}", load_car, date.today())
     if not car:
         error_msg = "Car not found"
-        logger.warning(f"Error retrieving car with ID '{car_id}': {error_msg}")
+        logger.warning("Error retrieving car with ID '%s': %s", car_id, error_msg)
         return {"message": error_msg}, 404
     else:
-        logger.debug(f"Car found with ID: '{car_id}'")
-        return present_car(car), 200
+        logger.debug("Car found with ID: '%s'", car_id)
+        return car, 200
 
 
 @app.delete('/car', tags=[car_tag], responses={"200": CarDeleteSchema, "404": ErrorSchema})
 def delete_car(query: CarSearchSchema):
     """Deletes a car from the database by its ID.
 
-    It returns a message indicating whether the deletion was successful.
+    The car is soft deleted: the row is kept, with its rentals, but it is no longer served or rented. It returns a
+    message indicating whether the deletion was successful.
     """
     car_id = query.id
-    logger.debug(f"Deleting car with ID: {car_id}")
+    logger.debug("Deleting car with ID: %s", car_id)
 
-    session = Session()
-    count = session.query(Car).filter(Car.id == car_id).delete()
-    session.commit()
+    def remove_car(session):
+        car = session.query(Car.make, Car.model).filter(Car.id == car_id).first()
+        if car and soft_delete(session, Car, Car.id == car_id):
+            record_cars(session, [car._asdict()], sign=-1)
+            record_changes(session, "car", "delete", [{"id": car_id}])
+            return True
+        return False
 
-    if count:
-        logger.debug(f"Deleted car with ID: {car_id}")
+    if run_write(remove_car):
+        cache.invalidate(f"car:{car_id}", "cars", "reports")
+        logger.debug("Deleted car with ID: %s", car_id)
         return {"message": "Car deleted successfully", "id": car_id}, 200
     else:
         error_msg = "Car not found"
-        logger.warning(f"Error deleting car with ID '{car_id}': {error_msg}")
+        logger.warning("Error deleting car with ID '%s': %s", car_id, error_msg)
         return {"message": error_msg}, 404
 
 
-@app.post('/rental', tags=[rental_tag], responses={"200": RentalViewSchema, "409": ErrorSchema, "400": ErrorSchema})
-def add_rental(form: RentalSchema):
+@app.post('/rental', tags=[rental_tag], responses={"200": RentalViewSchema, "409": ErrorSchema, "400": ErrorSchema, "503": ErrorSchema})
+def add_rental(form: RentalSchema, header: IdempotencyHeaderSchema):
     """Adds a new rental record to the database.
 
     It returns the newly created rental with its ID.
     """
-    logger.debug(f"Adding rental for user ID: '{form.user_id}' and car ID: '{form.car_id}'")
+    logger.debug("Adding rental for user ID: '%s' and car ID: '%s'", form.user_id, form.car_id)
+
+    replay = replay_response("add_rental", header.idempotency_key, form)
+    if replay is not None:
+        return replay
 
     session = Session()
 
     car = session.query(Car).filter(Car.id == form.car_id).first()
     if not car:
         error_msg = "Car not found"
-        logger.warning(f"Error adding rental: {error_msg}")
+        logger.warning("Error adding rental: %s", error_msg)
         return {"message": error_msg}, 400
 
-    price_per_day = car.price_per_day
     rental_days = (form.rental_end_date - form.rental_start_date).days
     if rental_days < 0:
         error_msg = "Invalid rental period: End date is before start date"
-        logger.warning(f"Error adding rental: {error_msg}")
+        logger.warning("Error adding rental: %s", error_msg)
         return {"message": error_msg}, 400
-    
-    total_price = price_per_day * rental_days
-
-    rental = Rental(
-        user_id=form.user_id,
-        car_id=form.car_id,
-        rental_start_date=form.rental_start_date,
-        rental_end_date=form.rental_end_date,
-        total_price=total_price
-    )
 
-    try:
+    total_price = pricing.price(session, car, form.rental_start_date, form.rental_end_date)
+
+    def reserve_car(session):
+        # Taking the write lock before the overlap check makes the check and the insert atomic across workers.
+        lock_car(session, form.car_id)
+        if has_overlap(session, form.car_id, form.rental_start_date, form.rental_end_date):
+            return None
+
+        rental = Rental(
+            user_id=form.user_id,
+            car_id=form.car_id,
+            rental_start_date=form.rental_start_date,
+            rental_end_date=form.rental_end_date,
+            total_price=total_price
+        )
         session.add(rental)
-        session.commit()
-        logger.debug(f"Rental added: '{rental.id}'")
-        return present_rental(rental), 200
+        session.flush()
+        rental = present_rental(rental)
+        record_rentals(session, [rental])
+        record_changes(session, "rental", "insert", [rental])
+        return rental
+
+    try:
+        rental = run_write(remember_response("add_rental", header.idempotency_key, form, reserve_car))
+        if rental is None:
+            # A concurrent request with the same key may have booked this very period.
+            replay = replay_response("add_rental", header.idempotency_key, form)
+            if replay is not None:
+                return replay
+            error_msg = "Car is already rented for the requested period"
+            logger.warning("Error adding rental for car ID '%s': %s", form.car_id, error_msg)
+            return {"message": error_msg}, 409
+        # The car's availability status and the user's rentals have changed.
+        cache.invalidate(f"car:{form.car_id}", f"user:{form.user_id}", "rentals", "reports")
+        occupancy.add(form.car_id, form.rental_start_date, form.rental_end_date)
+        logger.debug("Rental added: '%s'", rental['id'])
+        return rental, 200
     except IntegrityError as e:
-        error_msg = "Rental with the same user and car already exists"
-        logger.warning(f"Error adding rental '{rental.id}': {error_msg}, Exception: {str(e)}")
+        replay = replay_response("add_rental", header.idempotency_key, form)
+        if replay is not None:
+            return replay
+        error_msg = "Rental conflicts with an existing record"
+        logger.warning("Error adding rental for car ID '%s': %s, Exception: %s", form.car_id, error_msg, e)
         return {"message": error_msg}, 409
+    except OperationalError as e:
+        error_msg = "Database is busy, try again"
+        logger.warning("Error adding rental for car ID '%s': %s, Exception: %s", form.car_id, error_msg, e)
+        return {"message": error_msg}, 503
     except Exception as e:
         error_msg = "Failed to add rental"
-        logger.warning(f"Error adding rental '{rental.id}': {error_msg}, Exception: {str(e)}")
+        logger.warning("Error adding rental for car ID '%s': %s, Exception: %s", form.car_id, error_msg, e)
         return {"message": error_msg}, 400
 
 
-@app.get('/rentals', tags=[rental_tag], responses={"200": RentalListSchema, "404": ErrorSchema})
-def get_rentals():
-    """Retrieves all rentals from the database.
+@app.post('/rentals/bulk', tags=[rental_tag], responses={"200": BulkResultSchema, "400": ErrorSchema})
+def add_rentals_bulk():
+    """Adds many rentals to the database from a JSON array or an NDJSON upload of RentalSchema rows.
 
-    This endpoint returns a list of all rentals stored in the database. If no rentals are found, an empty list is returned.
+    The rentals are checked and inserted in batches, one transaction each, with the same rules as add_rental:
+    the car must exist, the period must be valid and it must not overlap another rental of the car, including
+    the other rentals of the upload. It returns the result of every row.
     """
-    logger.debug("Retrieving all rentals")
+    parsed = read_bulk_forms(RentalSchema)
+    if parsed is None:
+        error_msg = "Body must be a JSON array or NDJSON"
+        logger.warning("Error adding rentals in bulk: %s", error_msg)
+        return {"message": error_msg}, 400
+    forms, results = parsed
+    logger.debug("Adding %s rentals in bulk", len(forms))
+
+    def book_rentals(session, items):
+        # Taking the write lock before the overlap checks makes the checks and the inserts atomic, as in add_rental.
+        car_ids = sorted({form.car_id for form, _ in items})
+        for car_id in car_ids:
+            lock_car(session, car_id)
+
+        booked, rows, periods = [], [], {}
+        for form, total_price in items:
+            start, end = form.rental_start_date, form.rental_end_date
+            car_periods = periods.setdefault(form.car_id, [])
+            if any(s < end and e > start for s, e in car_periods) or has_overlap(session, form.car_id, start, end):
+                booked.append(False)
+                continue
+            car_periods.append((start, end))
+            booked.append(True)
+            rows.append({**form.model_dump(), "total_price": total_price})
+
+        ids = insert_rows(session, Rental, rows)
+        rows = [{**row, "id": rental_id} for row, rental_id in zip(rows, ids)]
+        record_rentals(session, rows)
+        record_changes(session, "rental", "insert", rows)
+        ids = iter(ids)
+        return [next(ids) if is_booked else False for is_booked in booked]
+
     session = Session()
-    rentals = session.query(Rental).all()
+    for batch in batches(forms):
+        car_ids = sorted({form.car_id for _, form in batch})
+        cars = {car.id: car for car in session.query(Car.id, Car.price_per_day, Car.make, Car.model)
+                .filter(Car.id.in_(car_ids))}
+        rates = pricing.rate_table(session)
+
+        accepted, items = [], []
+        for index, form in batch:
+            start, end = form.rental_start_date, form.rental_end_date
+            if form.car_id not in cars:
+                results.append({"index": index, "status": 400, "message": "Car not found"})
+                continue
+            if end < start:
+                error_msg = "Invalid rental period: End date is before start date"
+                results.append({"index": index, "status": 400, "message": error_msg})
+                continue
+            car = cars[form.car_id]
+            accepted.append((index, form))
+            items.append((form, rates.price(car.price_per_day, car.make, car.model, start, end)))
+        # The read transaction of the checks above ends here, before the writes.
+        session.commit()
+
+        # The overlaps are checked again in the write transaction of each insert, including when the rows are
+        # inserted one by one after a batch violated a constraint.
+        for (index, form), rental_id in zip(accepted, bulk_write(run_write, book_rentals, items)):
+            if rental_id is None:
+                error_msg = "Rental conflicts with an existing record"
+                results.append({"index": index, "status": 409, "message": error_msg})
+            elif rental_id is False:
+                error_msg = "Car is already rented for the requested period"
+                results.append({"index": index, "status": 409, "message": error_msg})
+            else:
+                results.append({"index": index, "status": 200, "id": rental_id})
+                cache.invalidate(f"car:{form.car_id}", f"user:{form.user_id}")
+                occupancy.add(form.car_id, form.rental_start_date, form.rental_end_date)
 
+    cache.invalidate("rentals", "reports")
+    logger.debug("Bulk rentals processed: %s rows", len(results))
+    return present_bulk_results(results), 200
+
+
+@app.get('/rentals', tags=[rental_tag], responses={"200": RentalListSchema, "400": ErrorSchema, "404": ErrorSchema})
+def get_rentals(query: RentalFilterSchema):
+    """Retrieves a page of rentals from the database, filtered and sorted.
+
+    Rentals can be filtered by user, car and start date range, and sorted by ID, start date or total price.
+    Every filter is served by an index. Pages are selected with keyset pagination: pass the returned
+    `next_after_id` as `after_id` to fetch the next page. With `stream=true` the rentals are streamed as NDJSON
+    instead, read from the database in batches. With `fields`, only those fields of the rentals are read and
+    returned. If no rentals are found, an empty list is returned.
+    """
+    logger.debug("Retrieving rentals after ID: %s", query.after_id)
+    session = Session()
+    fields = selected_fields(query.fields, RENTAL_LIST_FIELDS)
+    sort = sort_column(Rental, query.sort)
+    if missing_cursor(session, Rental.id, query.after_id, *sort):
+        logger.warning("Error retrieving rentals: %s", MISSING_CURSOR_MESSAGE)
+        return {"message": MISSING_CURSOR_MESSAGE}, 400
+    rentals_query = keyset_query(
+        filter_rentals(list_query(session, "rental_list", RENTAL_LIST_COLUMNS, fields), query), Rental.id,
+        query.after_id, *sort
+    )
+    if query.stream:
+        logger.debug("Streaming rentals")
+        return stream_rows(
+            session, rentals_query, query.limit, lambda rows: present_rentals(rows, fields=fields), "rentals"
+        )
+
+    rentals, next_after_id = fetch_page(rentals_query, query.limit)
     if not rentals:
-        return {"rentals": []}, 200
+        return {"rentals": [], "next_after_id": None}, 200
     else:
-        logger.debug(f"{len(rentals)} rentals found")
-        return present_rentals(rentals), 200
+        logger.debug("%s rentals found", len(rentals))
+        return present_rentals(rentals, next_after_id, fields), 200
 
 
 @app.get('/rental', tags=[rental_tag], responses={"200": RentalViewSchema, "404": ErrorSchema})
@@ -270,16 +1019,16 @@ def get_rental(query: RentalSearchSchema):
     This endpoint returns the details of a rental with the specified ID. If the rental is not found, it returns a 404 error.
     """
     rental_id = query.id
-    logger.debug(f"Retrieving rental with ID: {rental_id}")
+    logger.debug("Retrieving rental with ID: %s", rental_id)
     session = Session()
-    rental = session.query(Rental).filter(Rental.id == rental_id).first()
+    rental = with_profile(session.query(Rental), "rental_detail").filter(Rental.id == rental_id).first()
 
     if not rental:
         error_msg = "Rental not found"
-        logger.warning(f"Error retrieving rental with ID '{rental_id}': {error_msg}")
+        logger.warning("Error retrieving rental with ID '%s': %s", rental_id, error_msg)
         return {"message": error_msg}, 404
     else:
-        logger.debug(f"Rental found with ID: '{rental_id}'")
+        logger.debug("Rental found with ID: '%s'", rental_id)
         return present_rental(rental), 200
 
 
@@ -287,19 +1036,315 @@ def get_rental(query: RentalSearchSchema):
 def delete_rental(query: RentalSearchSchema):
     """Deletes a rental from the database by its ID.
 
-    It returns a message indicating whether the deletion was successful.
+    The rental is soft deleted: it no longer blocks its period, counts in the reports or is served, and it is
+    moved to the archive by the archiver. It returns a message indicating whether the deletion was successful.
     """
     rental_id = query.id
-    logger.debug(f"Deleting rental with ID: {rental_id}")
+    logger.debug("Deleting rental with ID: %s", rental_id)
 
-    session = Session()
-    count = session.query(Rental).filter(Rental.id == rental_id).delete()
-    session.commit()
+    def remove_rental(session):
+        rental = session.query(
+            Rental.car_id, Rental.user_id, Rental.rental_start_date, Rental.rental_end_date, Rental.total_price
+        ).filter(Rental.id == rental_id).first()
+        if rental:
+            soft_delete(session, Rental, Rental.id == rental_id)
+            record_rentals(session, [rental._asdict()], sign=-1)
+            record_changes(session, "rental", "delete", [{"id": rental_id}])
+        return rental
 
-    if count:
-        logger.debug(f"Deleted rental with ID: {rental_id}")
+    rental = run_write(remove_rental)
+
+    if rental:
+        cache.invalidate(
+            f"car:{rental.car_id}", f"user:{rental.user_id}", f"rental:{rental_id}", "rentals", "reports"
+        )
+        occupancy.remove(rental.car_id, rental.rental_start_date, rental.rental_end_date)
+        logger.debug("Deleted rental with ID: %s", rental_id)
         return {"message": "Rental deleted successfully", "id": rental_id}, 200
     else:
         error_msg = "Rental not found"
-        logger.warning(f"Error deleting rental with ID '{rental_id}': {error_msg}")
+        logger.warning("Error deleting rental with ID '%s': %s", rental_id, error_msg)
+        return {"message": error_msg}, 404
+
+
+@app.get('/pricing/rules', tags=[pricing_tag], responses={"200": PricingRuleListSchema})
+def get_pricing_rules():
+    """Retrieves every pricing rule, ordered by ID.
+    """
+    session = Session()
+    rules = session.query(PricingRule).order_by(PricingRule.id).all()
+    logger.debug("%s pricing rules found", len(rules))
+    return present_pricing_rules(rules), 200
+
+
+@app.post('/pricing/rule', tags=[pricing_tag], responses={"200": PricingRuleViewSchema, "400": ErrorSchema, "503": ErrorSchema})
+def add_pricing_rule(form: PricingRuleSchema):
+    """Adds a pricing rule.
+
+    A season needs a start date and an end date, a long stay needs a minimum number of days, and a model rule
+    needs a make. The new rule applies to the quotes and rentals priced from then on.
+    """
+    logger.debug("Adding %s pricing rule", form.kind)
+    if form.kind == "season" and (form.start_date is None or form.end_date is None or form.end_date <= form.start_date):
+        error_msg = "A season needs a start date before its end date"
+    elif form.kind == "long_stay" and form.min_days is None:
+        error_msg = "A long stay rule needs a minimum number of days"
+    elif form.kind == "model" and not form.make:
+        error_msg = "A model rule needs a make"
+    else:
+        error_msg = None
+    if error_msg:
+        logger.warning("Error adding pricing rule: %s", error_msg)
+        return {"message": error_msg}, 400
+
+    def insert_rule(session):
+        rule = PricingRule(**form.model_dump())
+        session.add(rule)
+        session.flush()
+        session.refresh(rule)
+        return present_pricing_rule(rule)
+
+    try:
+        rule = run_write(insert_rule)
+        logger.debug("Pricing rule added: '%s'", rule['id'])
+        return rule, 200
+    except OperationalError as e:
+        error_msg = "Database is busy, try again"
+        logger.warning("Error adding pricing rule: %s, Exception: %s", error_msg, e)
+        return {"message": error_msg}, 503
+    except Exception as e:
+        error_msg = "Failed to add pricing rule"
+        logger.warning("Error adding pricing rule: %s, Exception: %s", error_msg, e)
+        return {"message": error_msg}, 400
+
+
+@app.delete('/pricing/rule', tags=[pricing_tag], responses={"200": PricingRuleDeleteSchema, "404": ErrorSchema})
+def delete_pricing_rule(query: PricingRuleSearchSchema):
+    """Deletes a pricing rule by its ID.
+
+    It returns a message indicating whether the deletion was successful.
+    """
+    rule_id = query.id
+    logger.debug("Deleting pricing rule with ID: %s", rule_id)
+
+    count = run_write(lambda session: session.query(PricingRule).filter(PricingRule.id == rule_id).delete())
+
+    if count:
+        logger.debug("Deleted pricing rule with ID: %s", rule_id)
+        return {"message": "Pricing rule deleted successfully", "id": rule_id}, 200
+    else:
+        error_msg = "Pricing rule not found"
+        logger.warning("Error deleting pricing rule with ID '%s': %s", rule_id, error_msg)
         return {"message": error_msg}, 404
+
+
+@app.post('/quotes', tags=[pricing_tag], responses={"200": QuoteListSchema})
+def get_quotes(body: QuoteRequestSchema):
+    """Quotes the total price of many (car, rental period) combinations in one call, e.g. for a search page.
+
+    The cars are loaded with one query and every period is priced against the same precomputed rate table, in
+    a constant number of lookups whatever its length. Periods whose car does not exist or whose end is before
+    their start get a message instead of a price. Nothing is booked.
+    """
+    logger.debug("Quoting %s periods", len(body.items))
+    session = Session()
+    car_ids = sorted({item.car_id for item in body.items})
+    cars = {car.id: car for car in session.query(Car.id, Car.price_per_day, Car.make, Car.model)
+            .filter(Car.id.in_(car_ids))}
+    prices = pricing.quote(session, cars, [(item.car_id, item.start, item.end) for item in body.items])
+    return present_quotes(body.items, prices), 200
+
+
+@app.get('/reports/cars', tags=[report_tag], responses={"200": CarReportListSchema, "400": ErrorSchema})
+def get_car_reports(query: CarReportQuerySchema):
+    """Retrieves a page of the revenue report by car: the rentals, revenue and booked days of each car.
+
+    The report is read from a summary table maintained by the rental writes, so its cost does not depend on the
+    size of the rental history. Pages are selected with keyset pagination, like in /cars.
+    """
+    logger.debug("Retrieving the car report after ID: %s", query.after_id)
+    session = Session()
+    sort = sort_column(CarReport, query.sort)
+    if missing_cursor(session, CarReport.car_id, query.after_id, *sort):
+        logger.warning("Error retrieving the car report: %s", MISSING_CURSOR_MESSAGE)
+        return {"message": MISSING_CURSOR_MESSAGE}, 400
+
+    def load_page():
+        reports_query = keyset_query(session.query(CarReport), CarReport.car_id, query.after_id, *sort)
+        reports, next_after_id = fetch_page(reports_query, query.limit, key="car_id")
+        return present_car_reports(reports, next_after_id)
+
+    page = cache.get_or_load("reports", load_page, "cars", *sorted(query.model_dump().items()))
+    return page, 200
+
+
+@app.get('/reports/users', tags=[report_tag], responses={"200": UserReportListSchema, "400": ErrorSchema})
+def get_user_reports(query: UserReportQuerySchema):
+    """Retrieves a page of the revenue report by user: the rentals and revenue of each user.
+
+    The report is read from a summary table maintained by the rental writes, so its cost does not depend on the
+    size of the rental history. Pages are selected with keyset pagination, like in /users.
+    """
+    logger.debug("Retrieving the user report after ID: %s", query.after_id)
+    session = Session()
+    sort = sort_column(UserReport, query.sort)
+    if missing_cursor(session, UserReport.user_id, query.after_id, *sort):
+        logger.warning("Error retrieving the user report: %s", MISSING_CURSOR_MESSAGE)
+        return {"message": MISSING_CURSOR_MESSAGE}, 400
+
+    def load_page():
+        reports_query = keyset_query(session.query(UserReport), UserReport.user_id, query.after_id, *sort)
+        reports, next_after_id = fetch_page(reports_query, query.limit, key="user_id")
+        return present_user_reports(reports, next_after_id)
+
+    page = cache.get_or_load("reports", load_page, "users", *sorted(query.model_dump().items()))
+    return page, 200
+
+
+@app.get('/reports/periods', tags=[report_tag], responses={"200": PeriodReportSchema, "400": ErrorSchema})
+def get_period_report(query: PeriodReportQuerySchema):
+    """Retrieves the revenue and fleet utilization between two dates, by day, week or month.
+
+    Revenue is attributed to the period in which a rental starts. Utilization is the share of the car-days of a
+    period that were booked, counted for the current fleet. The sums are computed in SQL over a summary table with
+    a row per day, so their cost depends on the number of days, not on the size of the rental history.
+    """
+    logger.debug("Retrieving the %s report from %s to %s", query.period, query.start_date, query.end_date)
+    if query.end_date < query.start_date:
+        error_msg = "Invalid report period: End date is before start date"
+        logger.warning("Error retrieving the period report: %s", error_msg)
+        return {"message": error_msg}, 400
+
+    starts = [period_start(query.start_date, query.period)]
+    while next_period(starts[-1], query.period) <= query.end_date and len(starts) <= MAX_PAGE_LIMIT:
+        starts.append(next_period(starts[-1], query.period))
+    if len(starts) > MAX_PAGE_LIMIT:
+        error_msg = f"The report cannot have more than {MAX_PAGE_LIMIT} periods"
+        logger.warning("Error retrieving the period report: %s", error_msg)
+        return {"message": error_msg}, 400
+
+    session = Session()
+
+    def load_report():
+        fleet_size = session.query(func.count(Car.id)).scalar()
+        sums = revenue_by_period(session, query.period, query.start_date, query.end_date)
+        periods, total = [], {"rentals": 0, "revenue": Decimal("0.00"), "booked_days": 0, "available_days": 0}
+        for start in starts:
+            # The first and last periods are cut at the dates of the report.
+            first = max(start, query.start_date)
+            last = min(next_period(start, query.period), query.end_date + timedelta(days=1))
+            row = sums.get(start)
+            summary = present_period_summary(
+                start, row.rentals if row else 0, row.revenue if row else Decimal("0.00"), row.booked_days if row else 0,
+                fleet_size * (last - first).days
+            )
+            periods.append(summary)
+            for name in total:
+                total[name] += summary[name]
+        return {
+            "period": query.period,
+            "start_date": query.start_date,
+            "end_date": query.end_date,
+            "fleet_size": fleet_size,
+            "periods": periods,
+            "total": present_period_summary(query.start_date, **total)
+        }
+
+    report = cache.get_or_load("reports", load_report, "periods", *sorted(query.model_dump().items()))
+    return report, 200
+
+
+def purged_message(since, last_seq):
+    """Returns the error of a consumer whose next changes were removed from the log by the retention limits."""
+    return f"The changes after {since} were removed from the log: reload the data, then follow from {last_seq}"
+
+
+@app.get('/changes', tags=[change_tag], responses={"200": ChangeListSchema, "410": ErrorSchema})
+def get_changes(query: ChangeQuerySchema):
+    """Retrieves a batch of the change feed: the inserts and deletes of users, cars and rentals after `since`.
+
+    Changes are numbered in commit order. A consumer syncs incrementally by passing the returned `next_since` as
+    `since`, until a batch is empty; a new consumer loads the data once and follows from the returned `last_seq`.
+    When the changes after `since` were removed by the retention limits, it returns 410 and the consumer starts
+    over.
+    """
+    logger.debug("Retrieving changes after seq: %s", query.since)
+    session = Session()
+    first_seq, last_seq = log_bounds(session)
+    if is_purged(first_seq, query.since):
+        error_msg = purged_message(query.since, last_seq)
+        logger.warning("Error retrieving changes: %s", error_msg)
+        return {"message": error_msg}, 410
+
+    changes = session.scalars(changes_after(query.since, query.limit)).all()
+    logger.debug("%s changes found", len(changes))
+    return present_changes(changes, query.since, last_seq), 200
+
+
+# An idle change stream sends a comment this often, so that proxies keep the connection open.
+STREAM_KEEPALIVE_SECONDS = 15
+
+
+@app.get('/changes/stream', tags=[change_tag], responses={"410": ErrorSchema})
+def stream_changes(query: ChangeStreamQuerySchema):
+    """Streams the change feed as server-sent events (text/event-stream), from `since` on.
+
+    Each change is a `change` event with its sequence number as ID and its JSON (as in /changes) as data, so an
+    EventSource that reconnects resumes after the last event it received. The log is polled every CHANGES_POLL_MS,
+    and the stream ends after CHANGES_STREAM_SECONDS for the client to reconnect. Each open stream holds a thread
+    of a WSGI worker; the ASGI mode (see asgi.py) serves many from one worker.
+    """
+    since = resume_after(request.headers.get("Last-Event-ID"), query.since)
+    logger.debug("Streaming changes after seq: %s", since)
+    with Session.session_factory() as session:
+        first_seq, last_seq = log_bounds(session)
+    if is_purged(first_seq, since):
+        error_msg = purged_message(since, last_seq)
+        logger.warning("Error streaming changes: %s", error_msg)
+        return {"message": error_msg}, 410
+
+    def generate():
+        after, deadline = since, time.monotonic() + config.CHANGES_STREAM_SECONDS
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            # A session per poll, so the stream holds no connection or read transaction while idle.
+            with Session.session_factory() as session:
+                changes = session.scalars(changes_after(after, STREAM_BATCH_SIZE)).all()
+            for change in changes:
+                yield present_change_event(change, lambda body: app.json.dumps(body, separators=(",", ":")))
+            if changes:
+                after, last_sent = changes[-1].seq, time.monotonic()
+                if len(changes) == STREAM_BATCH_SIZE:
+                    continue
+            elif time.monotonic() - last_sent >= STREAM_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            time.sleep(config.CHANGES_POLL_MS / 1000)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get('/cache/stats', tags=[monitoring_tag], responses={"200": CacheStatsSchema})
+def get_cache_stats():
+    """Retrieves the hit, miss and invalidation counters of the read-through cache.
+
+    The counters belong to the worker process that answers the request.
+    """
+    return cache.stats(), 200
+
+
+@app.get('/metrics', tags=[monitoring_tag])
+def get_metrics():
+    """Exposes the request metrics in the Prometheus text format.
+
+    It includes per-endpoint latency, SQL statement count and SQL time histograms, response sizes, the number of
+    responses by status and the cache counters. The metrics belong to the worker process that answers the request.
+    """
+    stats = cache.stats()
+    cache_counters = {
+        "cache_hits_total": ("Read-through cache hits.", stats["hits"]),
+        "cache_misses_total": ("Read-through cache misses.", stats["misses"]),
+        "cache_invalidations_total": ("Cache namespaces invalidated by writes.", stats["invalidations"]),
+    }
+    return Response(metrics.render(cache_counters), mimetype="text/plain; version=0.0.4")
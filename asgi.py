@@ -0,0 +1,411 @@
+"""
+The API served as an ASGI application: `WEB_CONCURRENCY=4 CACHE_BACKEND=redis uvicorn asgi:app`.
+
+The read endpoints of users, cars and rentals, which carry most of the traffic, are served by async handlers on an
+async engine (aiosqlite), so a worker process keeps serving other requests while their queries run. So is the
+stream of the change feed, which then waits between its polls without holding a thread. They use the same
+models, query builders, loader profiles, schemas, cache, ETags, response compression and rate limits as the
+handlers of app.py, and answer with the same payloads. Every other route is handed to the Flask app of app.py, run
+on a thread pool, so the API is complete in this mode too; `flask run` and gunicorn keep serving app.py as before.
+
+The ASGI mode needs the starlette, uvicorn and aiosqlite packages.
+"""
+import asyncio
+import time
+from datetime import date
+from contextlib import asynccontextmanager
+
+try:
+    from starlette.applications import Starlette
+    from starlette.responses import Response, StreamingResponse
+    from starlette.routing import Route, Mount
+    from model.aio import async_engine, AsyncSession
+except ImportError as e:
+    raise RuntimeError(f"The ASGI mode requires the starlette, uvicorn and aiosqlite packages ({e})")
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    # Deprecated in favour of a2wsgi, which is used when installed.
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_etags, quote_etag
+
+import config
+from app import app as flask_app, ETAG_NAMESPACES, STREAM_KEEPALIVE_SECONDS, MISSING_CURSOR_MESSAGE, purged_message, \
+    etag_parts
+from cache import cache
+from compression import compressor, COMPRESSIBLE_MIMETYPES
+from ratelimit import admit, client_key, load_shedder
+from logger import logger
+from model import User, Car, Rental, with_profile, cursor_row, keyset_query, sort_column, filter_cars, filter_rentals, \
+    available_condition, changes_after, log_bounds_query, is_purged
+from schemas import *
+
+
+def json_response(body, status: int = 200, headers: dict = None) -> Response:
+    """Encodes a response body like the Flask app does: with its JSON provider, compact, ending with a newline."""
+    content = flask_app.json.dumps(body, separators=(",", ":")) + "\n"
+    return Response(content, status, headers={"Access-Control-Allow-Origin": "*", **(headers or {})},
+                    media_type="application/json")
+
+
+def query_args(request) -> MultiDict:
+    """Returns the query string arguments of a request, with the API of Flask's request.args."""
+    return MultiDict(request.query_params.multi_items())
+
+
+def versioned(handler):
+    """Wraps a read handler with the conditional GET of its ETag namespace, like check_etag and set_etag in app.py.
+
+    The namespace is looked up by the name of the handler, which is the endpoint name of the Flask app.
+    """
+    namespace_of = ETAG_NAMESPACES[handler.__name__]
+
+    async def versioned_handler(request):
+        args = query_args(request)
+        namespace = None if streamed(args) else namespace_of(args)
+        path = f"{request.url.path}?{request.url.query}"
+        etag = cache.etag(namespace, *etag_parts(handler.__name__, path)) if namespace else None
+        if etag and parse_etags(request.headers.get("if-none-match")).contains_weak(etag):
+            return Response(status_code=304, headers={"ETag": quote_etag(etag)})
+        response = await handler(request)
+        if etag and response.status_code == 200:
+            response.headers["ETag"] = quote_etag(etag)
+        return response
+
+    versioned_handler.__name__ = handler.__name__
+    return versioned_handler
+
+
+def compressed(handler):
+    """Compresses the responses of a handler like install_compression does for the Flask app.
+
+    Streamed responses are sent as they are; the Flask app compresses the responses of the routes handed to it.
+    """
+
+    async def compressed_handler(request):
+        response = await handler(request)
+        if isinstance(response, StreamingResponse):
+            return response
+        if response.media_type in COMPRESSIBLE_MIMETYPES and compressor.encodings:
+            response.headers.append("Vary", "Accept-Encoding")
+        encoding = compressor.negotiate(request.headers.get("accept-encoding"), len(response.body),
+                                        response.media_type)
+        if encoding is None:
+            return response
+        response.body = compressor.compress(response.body, encoding)
+        response.headers["Content-Length"] = str(len(response.body))
+        response.headers["Content-Encoding"] = encoding
+        etag = response.headers.get("ETag")
+        if etag and not etag.startswith("W/"):
+            response.headers["ETag"] = "W/" + etag
+        return response
+
+    compressed_handler.__name__ = handler.__name__
+    return compressed_handler
+
+
+def admitted(handler):
+    """Rate limits and sheds the requests of a handler like install_rate_limits does for the Flask app.
+
+    A request finding every slot of its endpoint taken is rejected at once, without waiting for one, so that the
+    event loop is never blocked. The slot of a streamed response is released once the stream ends.
+    """
+    endpoint = handler.__name__
+
+    async def admitted_handler(request):
+        rejection = admit(client_key(request.headers, request.client.host if request.client else None), endpoint,
+                          wait=False)
+        if rejection is not None:
+            status, message, retry_after = rejection
+            return json_response({"message": message}, status, {"Retry-After": str(retry_after)})
+        try:
+            response = await handler(request)
+        except BaseException:
+            load_shedder.release(endpoint)
+            raise
+        if not isinstance(response, StreamingResponse):
+            load_shedder.release(endpoint)
+            return response
+
+        async def release_after(body):
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                load_shedder.release(endpoint)
+
+        response.body_iterator = release_after(response.body_iterator)
+        return response
+
+    admitted_handler.__name__ = handler.__name__
+    return admitted_handler
+
+
+def list_query(profile, columns, fields=None):
+    """Builds the base query of a listing, like list_query in app.py: row tuples on the JSON fast path, and with
+    the `fields` of a projection."""
+    if fields:
+        return select(*project_columns(columns, fields))
+    if config.JSON_FAST_PATH:
+        return select(*columns)
+    return with_profile(select(columns[0].class_), profile)
+
+
+async def fetch_page(session, query, limit, entities: bool = not config.JSON_FAST_PATH, key: str = "id"):
+    """Fetches one page of a keyset query, like fetch_page in app.py.
+
+    It returns ORM instances when `entities` is true, and row tuples otherwise.
+    """
+    limit = limit or DEFAULT_PAGE_LIMIT
+    result = await session.execute(query.limit(limit + 1))
+    rows = result.scalars().all() if entities else result.all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, getattr(rows[-1], key)
+    return rows, None
+
+
+async def missing_cursor(id_column, after_id, sort_column=None, descending=False) -> bool:
+    """Checks whether the cursor row of a sorted keyset query is gone, like missing_cursor in app.py."""
+    query = cursor_row(id_column, after_id, sort_column)
+    if query is None:
+        return False
+    async with AsyncSession() as session:
+        return (await session.execute(query)).first() is None
+
+
+def stream_rows(query, limit, present, key, entities: bool = not config.JSON_FAST_PATH):
+    """Streams the rows of a keyset query as NDJSON, read from the database in batches, like stream_rows in app.py.
+    """
+    if limit:
+        query = query.limit(limit)
+
+    async def generate():
+        async with AsyncSession() as session:
+            result = await session.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+            if entities:
+                result = result.scalars()
+            async for batch in result.partitions():
+                for item in present(batch)[key]:
+                    yield flask_app.json.dumps(item, separators=(",", ":")) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson",
+                             headers={"Access-Control-Allow-Origin": "*"})
+
+
+async def validation_error(request, e: ValidationError):
+    """Answers an invalid request like flask-openapi3 does: 422 with the errors of pydantic."""
+    return Response(e.json(), 422, media_type="application/json")
+
+
+async def get_users(request):
+    """Retrieves a page of users, ordered by ID (see get_users in app.py)."""
+    query = UserPageQuerySchema.model_validate(dict(request.query_params))
+    logger.debug("Retrieving users after ID: %s", query.after_id)
+    fields = selected_fields(query.fields, USER_LIST_FIELDS)
+    entities = not (config.JSON_FAST_PATH or fields)
+    users_query = keyset_query(list_query("user_list", USER_LIST_COLUMNS, fields), User.id, query.after_id)
+    if query.stream:
+        logger.debug("Streaming users")
+        return stream_rows(users_query, query.limit, lambda rows: present_users(rows, fields=fields), "users",
+                           entities)
+
+    async with AsyncSession() as session:
+        users, next_after_id = await fetch_page(session, users_query, query.limit, entities)
+    logger.debug("%s users found", len(users))
+    return json_response(present_users(users, next_after_id, fields))
+
+
+async def get_user(request):
+    """Retrieves a user by their ID (see get_user in app.py)."""
+    user_id = UserSearchSchema.model_validate(dict(request.query_params)).id
+    logger.debug("Retrieving user with ID: %s", user_id)
+
+    async def load_user():
+        async with AsyncSession() as session:
+            user_query = with_profile(select(User), "user_detail").filter(User.id == user_id)
+            user = (await session.scalars(user_query)).first()
+            return present_user(user) if user else None
+
+    user = await cache.get_or_load_async(f"user:{user_id}", load_user)
+    if not user:
+        error_msg = "User not found"
+        logger.warning("Error retrieving user with ID '%s': %s", user_id, error_msg)
+        return json_response({"message": error_msg}, 404)
+    logger.debug("User found with ID: '%s'", user_id)
+    return json_response(user)
+
+
+async def get_cars(request):
+    """Retrieves a page of cars, filtered and sorted (see get_cars in app.py)."""
+    query = CarFilterSchema.model_validate(dict(request.query_params))
+    logger.debug("Retrieving cars after ID: %s", query.after_id)
+    fields = selected_fields(query.fields, CAR_LIST_FIELDS)
+    entities = not (config.JSON_FAST_PATH or fields)
+    sort = sort_column(Car, query.sort)
+    if await missing_cursor(Car.id, query.after_id, *sort):
+        logger.warning("Error retrieving cars: %s", MISSING_CURSOR_MESSAGE)
+        return json_response({"message": MISSING_CURSOR_MESSAGE}, 400)
+    cars_query = keyset_query(
+        filter_cars(list_query("car_list", CAR_LIST_COLUMNS, fields), query), Car.id, query.after_id, *sort
+    )
+    if query.stream:
+        logger.debug("Streaming cars")
+        return stream_rows(cars_query, query.limit, lambda rows: present_cars(rows, fields=fields), "cars", entities)
+
+    async def load_page():
+        async with AsyncSession() as session:
+            cars, next_after_id = await fetch_page(session, cars_query, query.limit, entities)
+            return present_cars(cars, next_after_id, fields)
+
+    if query.available is None:
+        page = await cache.get_or_load_async("cars", load_page, *sorted(query.model_dump().items()))
+    else:
+        page = await load_page()
+    logger.debug("%s cars found", len(page['cars']))
+    return json_response(page)
+
+
+async def get_available_cars(request):
+    """Retrieves a page of the cars that are not rented between two dates (see get_available_cars in app.py)."""
+    query = CarAvailabilitySearchSchema.model_validate(dict(request.query_params))
+    logger.debug("Retrieving cars available from %s to %s", query.start, query.end)
+    if query.end < query.start:
+        error_msg = "Invalid rental period: End date is before start date"
+        logger.warning("Error retrieving available cars: %s", error_msg)
+        return json_response({"message": error_msg}, 400)
+
+    cars_query = keyset_query(
+        with_profile(select(Car).filter(available_condition(query.start, query.end)), "car_list"), Car.id,
+        query.after_id
+    )
+    if query.stream:
+        logger.debug("Streaming available cars")
+        return stream_rows(cars_query, query.limit, present_cars, "cars", entities=True)
+
+    async with AsyncSession() as session:
+        cars, next_after_id = await fetch_page(session, cars_query, query.limit, entities=True)
+        logger.debug("%s available cars found", len(cars))
+        return json_response(present_cars(cars, next_after_id))
+
+
+async def get_car(request):
+    """Retrieves a car by its ID (see get_car in app.py)."""
+    car_id = CarSearchSchema.model_validate(dict(request.query_params)).id
+    logger.debug("Retrieving car with ID: %s", car_id)
+
+    async def load_car():
+        async with AsyncSession() as session:
+            car = (await session.scalars(with_profile(select(Car), "car_detail").filter(Car.id == car_id))).first()
+            return present_car(car) if car else None
+
+    car = await cache.get_or_load_async(f"car:{car_id}", load_car, date.today())
+    if not car:
+        error_msg = "Car not found"
+        logger.warning("Error retrieving car with ID '%s': %s", car_id, error_msg)
+        return json_response({"message": error_msg}, 404)
+    logger.debug("Car found with ID: '%s'", car_id)
+    return json_response(car)
+
+
+async def get_rentals(request):
+    """Retrieves a page of rentals, filtered and sorted (see get_rentals in app.py)."""
+    query = RentalFilterSchema.model_validate(dict(request.query_params))
+    logger.debug("Retrieving rentals after ID: %s", query.after_id)
+    fields = selected_fields(query.fields, RENTAL_LIST_FIELDS)
+    entities = not (config.JSON_FAST_PATH or fields)
+    sort = sort_column(Rental, query.sort)
+    if await missing_cursor(Rental.id, query.after_id, *sort):
+        logger.warning("Error retrieving rentals: %s", MISSING_CURSOR_MESSAGE)
+        return json_response({"message": MISSING_CURSOR_MESSAGE}, 400)
+    rentals_query = keyset_query(
+        filter_rentals(list_query("rental_list", RENTAL_LIST_COLUMNS, fields), query), Rental.id, query.after_id, *sort
+    )
+    if query.stream:
+        logger.debug("Streaming rentals")
+        return stream_rows(rentals_query, query.limit, lambda rows: present_rentals(rows, fields=fields), "rentals",
+                           entities)
+
+    async with AsyncSession() as session:
+        rentals, next_after_id = await fetch_page(session, rentals_query, query.limit, entities)
+    logger.debug("%s rentals found", len(rentals))
+    return json_response(present_rentals(rentals, next_after_id, fields))
+
+
+async def get_rental(request):
+    """Retrieves a rental by its ID (see get_rental in app.py)."""
+    rental_id = RentalSearchSchema.model_validate(dict(request.query_params)).id
+    logger.debug("Retrieving rental with ID: %s", rental_id)
+    async with AsyncSession() as session:
+        rental = (
+            await session.scalars(with_profile(select(Rental), "rental_detail").filter(Rental.id == rental_id))
+        ).first()
+        if not rental:
+            error_msg = "Rental not found"
+            logger.warning("Error retrieving rental with ID '%s': %s", rental_id, error_msg)
+            return json_response({"message": error_msg}, 404)
+        logger.debug("Rental found with ID: '%s'", rental_id)
+        return json_response(present_rental(rental))
+
+
+async def stream_changes(request):
+    """Streams the change feed as server-sent events (see stream_changes in app.py)."""
+    query = ChangeStreamQuerySchema.model_validate(dict(request.query_params))
+    since = resume_after(request.headers.get("last-event-id"), query.since)
+    logger.debug("Streaming changes after seq: %s", since)
+    async with AsyncSession() as session:
+        first_seq, last_seq = (await session.execute(log_bounds_query())).one()
+    if is_purged(first_seq, since):
+        error_msg = purged_message(since, last_seq)
+        logger.warning("Error streaming changes: %s", error_msg)
+        return json_response({"message": error_msg}, 410)
+
+    async def generate():
+        after, deadline = since, time.monotonic() + config.CHANGES_STREAM_SECONDS
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            async with AsyncSession() as session:
+                changes = (await session.scalars(changes_after(after, STREAM_BATCH_SIZE))).all()
+            for change in changes:
+                yield present_change_event(change, lambda body: flask_app.json.dumps(body, separators=(",", ":")))
+            if changes:
+                after, last_sent = changes[-1].seq, time.monotonic()
+                if len(changes) == STREAM_BATCH_SIZE:
+                    continue
+            elif time.monotonic() - last_sent >= STREAM_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(config.CHANGES_POLL_MS / 1000)
+
+    return StreamingResponse(generate(), media_type="text/event-stream", headers={
+        "Access-Control-Allow-Origin": "*", "Cache-Control": "no-cache", "X-Accel-Buffering": "no"
+    })
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await async_engine.dispose()
+
+
+app = Starlette(
+    routes=[
+        Route("/users", admitted(compressed(versioned(get_users))), methods=["GET"]),
+        Route("/user", admitted(compressed(versioned(get_user))), methods=["GET"]),
+        Route("/cars", admitted(compressed(versioned(get_cars))), methods=["GET"]),
+        Route("/cars/available", admitted(compressed(get_available_cars)), methods=["GET"]),
+        Route("/car", admitted(compressed(versioned(get_car))), methods=["GET"]),
+        Route("/rentals", admitted(compressed(versioned(get_rentals))), methods=["GET"]),
+        Route("/rental", admitted(compressed(versioned(get_rental))), methods=["GET"]),
+        Route("/changes/stream", admitted(stream_changes), methods=["GET"]),
+        # Every other route (and method), served by the Flask app on a thread pool.
+        Mount("/", app=WSGIMiddleware(flask_app)),
+    ],
+    exception_handlers={ValidationError: validation_error},
+    lifespan=lifespan,
+)
@@ -0,0 +1,445 @@
+"""
+Benchmarks every route of the API against a seeded database, and saves the results as JSON.
+
+A temporary SQLite database is seeded with a synthetic fleet, users and rental history (see benchmark.seed), and
+copied for each mode, so every mode starts from the same data. Each route is then driven in two modes:
+
+- client: sequentially and in-process, with the Flask test client. It measures the cost of the handler alone.
+- load: over HTTP, by several load generator processes, against the app served by a separate server process
+  (the threaded Werkzeug server of `flask run`, gunicorn, or uvicorn for the ASGI mode). It measures the route
+  under concurrency.
+
+For each route it reports the p50, p95, p99 and mean latency, the throughput, the responses by status and the peak
+RSS of the process (or processes) serving the route while it was driven. The settings of config set in the
+environment (e.g. JSON_FAST_PATH, SQLITE_PROFILE) apply to the API and are recorded with the results. Passing a
+previous result file with --compare prints the change of the p95 latency and of the throughput of every route.
+
+Usage:
+    python -m benchmark.api [--rentals 100000] [--cars 1000] [--users 10000] [--modes client,load]
+                            [--requests 200] [--concurrency 4] [--server flask|gunicorn|uvicorn] [--workers 4]
+                            [--output FILE] [--compare FILE]
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode
+
+from benchmark.seed import MAKES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Writes are dated after the seeded rental history, so that new rentals rarely overlap it.
+FUTURE_DATE = date(2400, 1, 1)
+
+
+def form(**fields):
+    return urlencode(fields).encode(), "application/x-www-form-urlencoded"
+
+
+def json_body(rows):
+    return json.dumps(rows).encode(), "application/json"
+
+
+def random_day(rng, start: date, days: int) -> date:
+    return start + timedelta(days=rng.randrange(days))
+
+
+def calendar_period(rng) -> str:
+    """Returns the query arguments of a month of the occupancy calendar, starting within the next 300 days."""
+    start = random_day(rng, date.today(), 300)
+    return f"start={start}&end={start + timedelta(days=30)}"
+
+
+def search_terms(rng) -> str:
+    """Returns a type-ahead search of a seeded car: the first letters of its make and, half the time, of its model."""
+    make = rng.choice(sorted(MAKES))
+    terms = make[:rng.randint(1, 4)]
+    if rng.random() < 0.5:
+        terms += "+" + rng.choice(MAKES[make])[:rng.randint(1, 3)]
+    return terms
+
+
+def rental_fields(rng, sizes: dict) -> dict:
+    start = random_day(rng, FUTURE_DATE, 100000)
+    return {
+        "user_id": rng.randint(1, sizes["users"]),
+        "car_id": rng.randint(1, sizes["cars"]),
+        "rental_start_date": start.isoformat(),
+        "rental_end_date": (start + timedelta(days=rng.randint(1, 14))).isoformat(),
+    }
+
+
+def get(path: str):
+    return "GET", path, None, None
+
+
+def post(path: str, body):
+    return ("POST", path) + body
+
+
+def delete(path: str):
+    return "DELETE", path, None, None
+
+
+# The request of each route, by endpoint: built from a random generator, the seeded sizes and a tag unique to the
+# request. Writes come last, and deletes after them, so the reads run against the seeded data.
+SCENARIOS = [
+    ("home", lambda rng, n, tag: get("/")),
+    ("get_users", lambda rng, n, tag: get(f"/users?after_id={rng.randint(0, n['users'])}&limit=100")),
+    ("get_user", lambda rng, n, tag: get(f"/user?id={rng.randint(1, n['users'])}")),
+    ("get_cars", lambda rng, n, tag: get(f"/cars?make={rng.choice(sorted(MAKES))}&sort=-price_per_day&limit=100")),
+    ("get_available_cars", lambda rng, n, tag: get(
+        f"/cars/available?start={random_day(rng, date(2010, 1, 1), 7300)}&end={random_day(rng, date(2030, 1, 1), 14)}"
+        f"&limit=100"
+    )),
+    ("get_car", lambda rng, n, tag: get(f"/car?id={rng.randint(1, n['cars'])}")),
+    ("get_car_calendar", lambda rng, n, tag: get(
+        f"/car/calendar?id={rng.randint(1, n['cars'])}&{calendar_period(rng)}"
+    )),
+    ("get_fleet_calendar", lambda rng, n, tag: get(f"/calendar?{calendar_period(rng)}&limit=100")),
+    ("search_cars_by_name", lambda rng, n, tag: get(f"/cars/search?q={search_terms(rng)}&limit=20")),
+    ("get_rentals", lambda rng, n, tag: get(f"/rentals?user_id={rng.randint(1, n['users'])}&limit=100")),
+    ("get_rental", lambda rng, n, tag: get(f"/rental?id={rng.randint(1, max(n['rentals'], 1))}")),
+    ("get_car_reports", lambda rng, n, tag: get(f"/reports/cars?sort=-revenue&limit=100")),
+    ("get_user_reports", lambda rng, n, tag: get(f"/reports/users?after_id={rng.randint(0, n['users'])}&limit=100")),
+    ("get_period_report", lambda rng, n, tag: get(
+        f"/reports/periods?start_date={random_day(rng, date(2010, 1, 1), 3650)}"
+        f"&end_date={random_day(rng, date(2021, 1, 1), 365)}&period=month"
+    )),
+    ("get_changes", lambda rng, n, tag: get("/changes?since=0&limit=100")),
+    ("get_cache_stats", lambda rng, n, tag: get("/cache/stats")),
+    ("get_metrics", lambda rng, n, tag: get("/metrics")),
+    ("login", lambda rng, n, tag: post("/login", form(
+        email=f"user{rng.randrange(n['users'])}@example.com", password="secret"
+    ))),
+    ("add_user", lambda rng, n, tag: post("/user", form(
+        name=f"Bench {tag}", email=f"bench-{tag}@example.com", password="secret", driver_license_number=f"B-{tag}"
+    ))),
+    ("add_users_bulk", lambda rng, n, tag: post("/users/bulk", json_body([
+        {"name": f"Bench {tag}-{i}", "email": f"bench-{tag}-{i}@example.com", "password": "secret",
+         "driver_license_number": f"B-{tag}-{i}"} for i in range(100)
+    ]))),
+    ("add_car", lambda rng, n, tag: post("/car", form(
+        make="Toyota", model="Corolla", year=rng.randint(2005, 2025), price_per_day=rng.randint(20, 150)
+    ))),
+    ("add_cars_bulk", lambda rng, n, tag: post("/cars/bulk", json_body([
+        {"make": "Ford", "model": "Ka", "year": rng.randint(2005, 2025), "price_per_day": rng.randint(20, 150)}
+        for _ in range(100)
+    ]))),
+    ("add_rental", lambda rng, n, tag: post("/rental", form(**rental_fields(rng, n)))),
+    ("add_rentals_bulk", lambda rng, n, tag: post("/rentals/bulk", json_body(
+        [rental_fields(rng, n) for _ in range(100)]
+    ))),
+    ("delete_rental", lambda rng, n, tag: delete(f"/rental?id={rng.randint(1, max(n['rentals'], 1))}")),
+    ("delete_car", lambda rng, n, tag: delete(f"/car?id={rng.randint(1, n['cars'])}")),
+    ("delete_user", lambda rng, n, tag: delete(f"/user?id={rng.randint(1, n['users'])}")),
+]
+BUILDERS = dict(SCENARIOS)
+
+
+def uncovered_endpoints(app) -> list:
+    """Returns the routes of the app that have no scenario, leaving out the documentation routes."""
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()}
+    return sorted(e for e in endpoints if e not in BUILDERS and not e.startswith("openapi") and e != "static")
+
+
+def process_tree(pid: int) -> list:
+    """Returns a process and its descendants (the workers of gunicorn), read from /proc."""
+    pids, index = [pid], 0
+    while index < len(pids):
+        try:
+            with open(f"/proc/{pids[index]}/task/{pids[index]}/children") as children:
+                pids += [int(child) for child in children.read().split()]
+        except OSError:
+            pass
+        index += 1
+    return pids
+
+
+def reset_peak_rss(pid: int):
+    """Resets the peak RSS (VmHWM) of a process and its descendants, where the kernel allows it."""
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/clear_refs", "w") as clear_refs:
+                clear_refs.write("5")
+        except OSError:
+            pass
+
+
+def peak_rss_kb(pid: int):
+    """Returns the sum of the peak RSS of a process and its descendants, in kB, or None without /proc."""
+    total = None
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/status") as status:
+                for line in status:
+                    if line.startswith("VmHWM:"):
+                        total = (total or 0) + int(line.split()[1])
+        except OSError:
+            pass
+    if total is None and pid == os.getpid():
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return total
+
+
+def summarize(latencies: list, elapsed: float, statuses: Counter, rss_kb) -> dict:
+    """Returns the latency percentiles (nearest rank), throughput, statuses and peak RSS of a route."""
+    latencies = sorted(latencies)
+
+    def percentile(q: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 3) if latencies else 0.0
+
+    return {
+        "requests": len(latencies),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "peak_rss_kb": rss_kb,
+    }
+
+
+def run_client(sizes: dict, requests: int) -> dict:
+    """Drives every route with the Flask test client, in this process. DB_PATH must point to the copy to use."""
+    from app import app
+
+    client = app.test_client()
+    rng = random.Random(1)
+    results = {}
+    for endpoint, build in SCENARIOS:
+        reset_peak_rss(os.getpid())
+        latencies, statuses = [], Counter()
+        started = time.perf_counter()
+        for i in range(requests):
+            method, path, body, content_type = build(rng, sizes, f"client-{i}")
+            start = time.perf_counter()
+            response = client.open(path, method=method, data=body, content_type=content_type)
+            response.get_data()
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+        results[endpoint] = summarize(latencies, time.perf_counter() - started, statuses, peak_rss_kb(os.getpid()))
+    results["uncovered"] = uncovered_endpoints(app)
+    return results
+
+
+def drive(task) -> tuple:
+    """Sends the requests of one load generator process to the server, over a keep-alive connection."""
+    port, endpoint, requests, sizes, worker = task
+    build = BUILDERS[endpoint]
+    rng = random.Random(worker)
+    latencies, statuses = [], Counter()
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    for i in range(requests):
+        method, path, body, content_type = build(rng, sizes, f"load-{os.getpid()}-{i}")
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body, {"Content-Type": content_type} if content_type else {})
+            response = connection.getresponse()
+            response.read()
+            statuses[response.status] += 1
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            statuses[0] += 1
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+    return latencies, statuses
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(port: int, server, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("The server exited before it was ready")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/cache/stats")
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("The server did not start in time")
+
+
+def server_command(server: str, port: int, workers: int) -> list:
+    """Returns the command serving the app: the WSGI app with flask or gunicorn, or the ASGI app with uvicorn."""
+    if server == "gunicorn":
+        return ["gunicorn", "--workers", str(workers), "--threads", "4", "--bind", f"127.0.0.1:{port}", "app:app"]
+    if server == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "--workers", str(workers), "--port", str(port), "--log-level",
+                "warning", "asgi:app"]
+    return [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port), "--with-threads"]
+
+
+def server_env(server: str, workers: int, env: dict) -> dict:
+    """Returns the environment of the server: the worker processes of gunicorn or uvicorn are given to the app too."""
+    return dict(env, WEB_CONCURRENCY=str(workers if server in ("gunicorn", "uvicorn") else 1))
+
+
+def run_load(sizes: dict, requests: int, concurrency: int, server: str, workers: int, env: dict) -> dict:
+    """Serves the app in a separate process and drives every route with `concurrency` load generator processes."""
+    port = free_port()
+    command = server_command(server, port, workers)
+    process = subprocess.Popen(command, cwd=ROOT, env=server_env(server, workers, env),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = {}
+    try:
+        wait_until_ready(port, process)
+        per_worker = max(requests // concurrency, 1)
+        with multiprocessing.Pool(concurrency) as pool:
+            for endpoint, _ in SCENARIOS:
+                reset_peak_rss(process.pid)
+                started = time.perf_counter()
+                parts = pool.map(drive, [(port, endpoint, per_worker, sizes, worker) for worker in range(concurrency)])
+                elapsed = time.perf_counter() - started
+                latencies, statuses = [], Counter()
+                for part_latencies, part_statuses in parts:
+                    latencies += part_latencies
+                    statuses.update(part_statuses)
+                results[endpoint] = summarize(latencies, elapsed, statuses, peak_rss_kb(process.pid))
+    finally:
+        process.terminate()
+        process.wait()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def settings() -> dict:
+    """Returns the settings of config that are set in the environment."""
+    import config
+    return {name: os.environ[name] for name in dir(config) if name.isupper() and name in os.environ}
+
+
+def compare(previous: dict, current: dict) -> list:
+    """Returns a line per route present in both results, with the change of its p95 latency and throughput."""
+    lines = []
+    for mode in ("client", "load"):
+        for endpoint, result in current.get(mode, {}).items():
+            before = previous.get(mode, {}).get(endpoint)
+            if not isinstance(result, dict) or not isinstance(before, dict):
+                continue
+            p95 = (result["p95_ms"] / before["p95_ms"] - 1) * 100 if before["p95_ms"] else 0.0
+            rps = (result["throughput_rps"] / before["throughput_rps"] - 1) * 100 if before["throughput_rps"] else 0.0
+            lines.append(f"{mode:6} {endpoint:20} p95 {before['p95_ms']:9.3f} -> {result['p95_ms']:9.3f} ms "
+                         f"({p95:+6.1f}%)  throughput {rps:+6.1f}%")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cars", type=int, default=1000, help="number of seeded cars")
+    parser.add_argument("--users", type=int, default=10000, help="number of seeded users")
+    parser.add_argument("--rentals", type=int, default=100000, help="number of seeded rentals (10k to 10M)")
+    parser.add_argument("--modes", default="client,load", help="comma-separated modes: client, load")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route and mode")
+    parser.add_argument("--concurrency", type=int, default=4, help="load generator processes")
+    parser.add_argument("--server", choices=["flask", "gunicorn", "uvicorn"], default="flask",
+                        help="server of the load mode (uvicorn serves the ASGI app of asgi.py)")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn or uvicorn worker processes")
+    parser.add_argument("--output", help="result file (default: benchmark/results/api-<timestamp>.json)")
+    parser.add_argument("--compare", help="a previous result file to compare with")
+    parser.add_argument("--run-client", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    sizes = {"cars": args.cars, "users": args.users, "rentals": args.rentals}
+
+    if args.run_client:
+        # Child process of the client mode: the database location is set in its environment.
+        with open(args.run_client, "w") as result:
+            json.dump(run_client(sizes, args.requests), result)
+        return
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    started_at = datetime.now()
+    report = {
+        "meta": {
+            "started_at": started_at.isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "sizes": sizes,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "server": args.server,
+            "settings": settings(),
+        }
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, LOG_PATH=os.path.join(directory, "log") + "/", LOG_LEVEL="ERROR")
+        seed_path = os.path.join(directory, "seed") + "/"
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "benchmark.seed", "--cars", str(args.cars), "--users", str(args.users),
+             "--rentals", str(args.rentals)],
+            cwd=ROOT, env=dict(env, DB_PATH=seed_path), stdout=subprocess.DEVNULL, check=True
+        )
+        report["meta"]["seed_seconds"] = round(time.perf_counter() - start, 1)
+
+        for mode in modes:
+            mode_path = os.path.join(directory, mode) + "/"
+            shutil.copytree(seed_path, mode_path)
+            mode_env = dict(env, DB_PATH=mode_path)
+            if mode == "client":
+                result_path = os.path.join(directory, "client.json")
+                subprocess.run(
+                    [sys.executable, "-m", "benchmark.api", "--run-client", result_path, "--cars", str(args.cars),
+                     "--users", str(args.users), "--rentals", str(args.rentals), "--requests", str(args.requests)],
+                    cwd=ROOT, env=mode_env, stdout=subprocess.DEVNULL, check=True
+                )
+                with open(result_path) as result:
+                    report["client"] = json.load(result)
+            elif mode == "load":
+                report["load"] = run_load(sizes, args.requests, args.concurrency, args.server, args.workers, mode_env)
+            else:
+                parser.error(f"unknown mode: {mode}")
+
+    output = args.output or os.path.join(ROOT, "benchmark", "results", f"api-{started_at:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as result:
+        json.dump(report, result, indent=2)
+
+    for mode in modes:
+        for endpoint, result in report[mode].items():
+            if isinstance(result, dict):
+                print(f"{mode:6} {endpoint:20} p50 {result['p50_ms']:9.3f}  p95 {result['p95_ms']:9.3f}  "
+                      f"p99 {result['p99_ms']:9.3f} ms  {result['throughput_rps']:8.1f} req/s  "
+                      f"rss {result['peak_rss_kb']} kB  {result['statuses']}")
+    if report.get("client", {}).get("uncovered"):
+        print("Routes without a scenario:", ", ".join(report["client"]["uncovered"]))
+    if args.compare:
+        with open(args.compare) as previous:
+            print("\n".join(compare(json.load(previous), report)))
+    print("Results saved to", output)
+
+
+if __name__ == "__main__":
+    main()
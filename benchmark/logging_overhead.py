@@ -0,0 +1,69 @@
+"""
+Measures the logging overhead a request thread pays, with synchronous and asynchronous (LOG_ASYNC) handlers.
+
+Each mode runs in its own process, logging into a temporary directory. The previous setup (synchronous handlers
+rotating every 10 kB) is measured as "before". The calls timed are the ones a typical request makes: a disabled
+DEBUG call built eagerly with an f-string (as the handlers used to) or lazily with %-style arguments, and an
+enabled WARNING call that reaches the console and the rotating file handler.
+
+Usage:
+    python -m benchmark.logging_overhead [--calls 20000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+MEASURE = """
+import json, sys, time
+from logger import logger
+
+calls = {calls}
+car = {{"id": 1, "make": "Toyota", "model": "Corolla"}}
+
+def timed(log_call):
+    start = time.perf_counter()
+    for i in range(calls):
+        log_call(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+result = {{
+    "debug_fstring_us": timed(lambda i: logger.debug(f"Car found with ID: '{{i}}' {{car}}")),
+    "debug_lazy_us": timed(lambda i: logger.debug("Car found with ID: '%s' %s", i, car)),
+    "warning_us": timed(lambda i: logger.warning("Error retrieving car with ID '%s': %s", i, "Car not found")),
+}}
+sys.stderr.write(json.dumps(result))
+"""
+
+
+def run_mode(log_async: bool, max_bytes: int, calls: int) -> dict:
+    """Runs the measurement in a fresh process, with the console output discarded."""
+    with tempfile.TemporaryDirectory() as log_path:
+        env = dict(
+            os.environ, LOG_ASYNC="1" if log_async else "0", LOG_MAX_BYTES=str(max_bytes), LOG_PATH=log_path + "/"
+        )
+        completed = subprocess.run(
+            [sys.executable, "-c", MEASURE.format(calls=calls)], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            text=True, check=True
+        )
+        return json.loads(completed.stderr.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000, help="number of logging calls per measurement")
+    args = parser.parse_args()
+
+    results = {
+        # The previous setup: synchronous handlers, rotating the files every 10 kB.
+        "before": run_mode(False, 10000, args.calls),
+        "sync": run_mode(False, 10 * 1024 * 1024, args.calls),
+        "async": run_mode(True, 10 * 1024 * 1024, args.calls),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
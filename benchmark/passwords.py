@@ -0,0 +1,95 @@
+"""
+Measures the signup and login throughput of the API per core, with the passwords hashed on the hasher's pool.
+
+For each pool (threads or processes) and number of workers, a fresh process migrates a temporary SQLite database and
+sends POST /user, then POST /login, from more client threads than there are workers, through the Flask test client.
+Throughput per core is the throughput divided by the cores the pool can use (the fewer of its workers and the CPUs).
+The time of one hash on its own, with the configured scrypt parameters, is measured too.
+
+Usage:
+    python -m benchmark.passwords [--requests 200] [--workers 1,2,4] [--pools thread,process]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MEASURE = """
+import json, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from model import engine, upgrade
+upgrade(engine)
+from app import app
+
+requests = {requests}
+
+def throughput(send):
+    def call(i):
+        with app.test_client() as client:
+            return send(client, i).status_code
+    start = time.perf_counter()
+    with ThreadPoolExecutor({clients}) as executor:
+        statuses = list(executor.map(call, range(requests)))
+    return requests / (time.perf_counter() - start), sum(1 for status in statuses if status != 200)
+
+signup, signup_errors = throughput(lambda client, i: client.post("/user", data={{
+    "name": f"User {{i}}", "email": f"user{{i}}@example.com", "password": "secret", "driver_license_number": f"DL{{i}}"
+}}))
+login, login_errors = throughput(lambda client, i: client.post("/login", data={{
+    "email": f"user{{i}}@example.com", "password": "secret"
+}}))
+sys.stderr.write(json.dumps({{
+    "signup_per_s": signup, "login_per_s": login, "errors": signup_errors + login_errors
+}}))
+"""
+
+
+def hash_time(repeat: int = 20) -> float:
+    """Returns the time of one hash with the configured parameters, in milliseconds."""
+    from passwords import hash_password
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        hash_password("secret")
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run_pool(pool: str, workers: int, requests: int) -> dict:
+    """Runs the measurement in a fresh process, against a temporary database."""
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ, DB_PATH=directory + "/", LOG_PATH=directory + "/log/", LOG_LEVEL="ERROR",
+            PASSWORD_HASH_POOL=pool, PASSWORD_HASH_WORKERS=str(workers)
+        )
+        completed = subprocess.run(
+            [sys.executable, "-c", MEASURE.format(requests=requests, clients=workers * 2)], env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True
+        )
+        result = json.loads(completed.stderr.strip().splitlines()[-1])
+    cores = min(workers, os.cpu_count() or 1)
+    result.update(
+        pool=pool, workers=workers, cores=cores,
+        signup_per_s_per_core=result["signup_per_s"] / cores, login_per_s_per_core=result["login_per_s"] / cores
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="number of signups and of logins per run")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated numbers of pool workers")
+    parser.add_argument("--pools", default="thread,process", help="comma-separated pool kinds")
+    args = parser.parse_args()
+
+    results = {"hash_ms": hash_time(), "cpus": os.cpu_count(), "runs": []}
+    for pool in args.pools.split(","):
+        for workers in (int(value) for value in args.workers.split(",")):
+            results["runs"].append(run_pool(pool, workers, args.requests))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
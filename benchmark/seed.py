@@ -0,0 +1,119 @@
+"""
+Seeds a database with a synthetic fleet, users and rental history, for the benchmarks.
+
+The rows are inserted with raw executemany batches, bypassing the API. The rentals of each car follow each other
+without overlapping, like the rentals the API accepts, and the report summary tables and the car catalogue are rebuilt at the end.
+The database is the one configured by DB_PATH / DATABASE_URL, so it must point to a scratch location before
+model is imported.
+
+Usage:
+    DB_PATH=/tmp/bench/ python -m benchmark.seed [--cars 1000] [--users 10000] [--rentals 100000]
+"""
+import argparse
+import random
+from datetime import date, timedelta
+
+MAKES = {
+    "Toyota": ["Corolla", "Camry", "Yaris", "RAV4"],
+    "Ford": ["Focus", "Fiesta", "Ranger", "Ka"],
+    "Volkswagen": ["Gol", "Polo", "Golf", "T-Cross"],
+    "Chevrolet": ["Onix", "Cruze", "Tracker", "S10"],
+    "Fiat": ["Uno", "Argo", "Mobi", "Toro"],
+}
+FIRST_RENTAL_DATE = date(2010, 1, 1)
+INSERT_BATCH_SIZE = 50000
+
+
+def executemany(cursor, statement: str, rows):
+    """Runs an INSERT for the rows of an iterable, in batches of INSERT_BATCH_SIZE."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == INSERT_BATCH_SIZE:
+            cursor.executemany(statement, batch)
+            batch = []
+    if batch:
+        cursor.executemany(statement, batch)
+
+
+def car_rows(count: int, rng: random.Random):
+    makes = sorted(MAKES)
+    for i in range(count):
+        make = makes[i % len(makes)]
+        yield make, rng.choice(MAKES[make]), rng.randint(2005, 2025), rng.randint(20, 150)
+
+
+def user_rows(count: int, password_hash: str):
+    """Yields `count` users, all with the password "secret", hashed once and shared to keep seeding fast."""
+    for i in range(count):
+        yield f"User {i}", f"user{i}@example.com", password_hash, f"DL{i:09d}"
+
+
+def rental_rows(count: int, cars: int, users: int, rng: random.Random):
+    """
+    Yields `count` rentals spread over the cars. Each car's rentals last 1 to 14 days and are separated by 0 to
+    5 days, from a random day of 2010 on.
+    """
+    next_start = [FIRST_RENTAL_DATE + timedelta(days=rng.randrange(365)) for _ in range(cars)]
+    prices = [rng.randint(20, 150) for _ in range(cars)]
+    for i in range(count):
+        car = i % cars
+        start = next_start[car]
+        days = rng.randint(1, 14)
+        end = start + timedelta(days=days)
+        next_start[car] = end + timedelta(days=rng.randint(0, 5))
+        yield rng.randint(1, users), car + 1, start.isoformat(), end.isoformat(), float(prices[car] * days)
+
+
+def seed(cars: int, users: int, rentals: int, random_seed: int = 0) -> dict:
+    """
+    Migrates the configured database, inserts the rows and rebuilds the report summary tables and the car catalogue.
+
+    Returns:
+        dict: The number of rows of each table.
+    """
+    from model import engine, Session, rebuild_reports, rebuild_catalog, upgrade
+    from passwords import hash_password
+
+    upgrade(engine)
+    rng = random.Random(random_seed)
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        executemany(
+            cursor, "INSERT INTO car (make, model, year, price_per_day) VALUES (?, ?, ?, ?)",
+            car_rows(cars, rng)
+        )
+        executemany(
+            cursor, "INSERT INTO user (name, email, password, driver_license_number) VALUES (?, ?, ?, ?)",
+            user_rows(users, hash_password("secret"))
+        )
+        executemany(
+            cursor, "INSERT INTO rental (user_id, car_id, rental_start_date, rental_end_date, total_price) "
+                    "VALUES (?, ?, ?, ?, ?)",
+            rental_rows(rentals, cars, users, rng)
+        )
+        raw.commit()
+    finally:
+        raw.close()
+
+    session = Session()
+    rebuild_reports(session)
+    rebuild_catalog(session)
+    session.commit()
+    Session.remove()
+    return {"cars": cars, "users": users, "rentals": rentals}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cars", type=int, default=1000, help="number of cars")
+    parser.add_argument("--users", type=int, default=10000, help="number of users")
+    parser.add_argument("--rentals", type=int, default=100000, help="number of rentals")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator")
+    args = parser.parse_args()
+    print(seed(args.cars, args.users, args.rentals, args.seed))
+
+
+if __name__ == "__main__":
+    main()
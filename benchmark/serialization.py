@@ -0,0 +1,85 @@
+"""
+Compares the two ways a listing can be built and encoded: ORM instances presented and encoded with the standard
+library JSON encoder (the default), and the JSON fast path (JSON_FAST_PATH), which selects the presented columns as
+row tuples and encodes with orjson.
+
+For each size, a temporary SQLite database is seeded with that many rentals, then both paths build the full
+/rentals payload for all of them.
+
+Usage:
+    python -m benchmark.serialization [--sizes 10000,100000,1000000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+def measure(size: int) -> dict:
+    """Seeds a fresh database with `size` rentals and times both paths, in this process."""
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+
+    from benchmark.seed import seed
+    from model import Session, Rental, with_profile
+    from schemas import present_rentals, RENTAL_LIST_COLUMNS
+    from serialization import FastJSONProvider
+
+    seed(cars=1000, users=1000, rentals=size)
+    flask_app = Flask("benchmark")
+    results = {}
+    paths = {
+        "orm_stdlib": (lambda session: with_profile(session.query(Rental), "rental_list"), DefaultJSONProvider),
+        "columns_orjson": (lambda session: session.query(*RENTAL_LIST_COLUMNS), FastJSONProvider),
+    }
+    for name, (build_query, provider_class) in paths.items():
+        provider = provider_class(flask_app)
+        session = Session()
+        start = time.perf_counter()
+        rows = build_query(session).order_by(Rental.id).all()
+        loaded = time.perf_counter()
+        payload = present_rentals(rows, None)
+        with flask_app.app_context():
+            body = provider.response(payload).get_data()
+        done = time.perf_counter()
+        results[name] = {
+            "query_s": round(loaded - start, 3),
+            "present_and_encode_s": round(done - loaded, 3),
+            "total_s": round(done - start, 3),
+            "bytes": len(body),
+        }
+        session.close()
+        Session.remove()
+    results["speedup"] = round(results["orm_stdlib"]["total_s"] / results["columns_orjson"]["total_s"], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated numbers of rentals")
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size:
+        # Child process: the database location must be set before model is imported.
+        print(json.dumps(measure(args.size)))
+        return
+
+    import subprocess
+    report = {}
+    for size in [int(size) for size in args.sizes.split(",")]:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, DB_PATH=directory + "/", LOG_PATH=directory + "/log/")
+            completed = subprocess.run(
+                [sys.executable, "-m", "benchmark.serialization", "--size", str(size)], env=env,
+                capture_output=True, text=True, check=True
+            )
+            report[size] = json.loads(completed.stdout.strip().splitlines()[-1])
+            print(size, json.dumps(report[size]), file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Load tests the WSGI and the ASGI serving modes side by side, at high concurrency.
+
+A temporary SQLite database is seeded once (see benchmark.seed) and copied for each mode. The same number of worker
+processes then serves it: gunicorn with the threaded WSGI app of app.py, and uvicorn with the ASGI app of asgi.py.
+Each read route that asgi.py serves natively, and one route it hands to the Flask app, is driven by `--concurrency`
+keep-alive connections at once. They are spread over a few load generator processes, a thread per connection.
+The latency percentiles and throughput of both modes are printed next to each other and saved as JSON under
+benchmark/results/.
+
+Usage:
+    python -m benchmark.serving [--concurrency 64] [--requests 2000] [--workers 4] [--rentals 100000]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmark.api import ROOT, drive, free_port, wait_until_ready, summarize, reset_peak_rss, peak_rss_kb, \
+    server_command, server_env, git_commit, settings
+
+# The routes served by async handlers in asgi.py, and one served by the Flask app in both modes.
+ENDPOINTS = [
+    "get_users", "get_user", "get_cars", "get_available_cars", "get_car", "get_rentals", "get_rental",
+    "get_car_reports",
+]
+SERVERS = {"wsgi": "gunicorn", "asgi": "uvicorn"}
+
+
+def drive_connections(task) -> tuple:
+    """Drives `connections` keep-alive connections at once from one load generator process, a thread each."""
+    port, endpoint, requests, sizes, worker, connections = task
+    tasks = [(port, endpoint, requests, sizes, worker * connections + i) for i in range(connections)]
+    latencies, statuses = [], Counter()
+    with ThreadPoolExecutor(connections) as executor:
+        for part_latencies, part_statuses in executor.map(drive, tasks):
+            latencies += part_latencies
+            statuses.update(part_statuses)
+    return latencies, statuses
+
+
+def run_mode(server: str, sizes: dict, requests: int, concurrency: int, processes: int, workers: int,
+             env: dict) -> dict:
+    """Serves the app with a server and drives every route with `concurrency` connections at once."""
+    port = free_port()
+    process = subprocess.Popen(
+        server_command(server, port, workers), cwd=ROOT, env=server_env(server, workers, env),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    connections = max(concurrency // processes, 1)
+    per_connection = max(requests // (connections * processes), 1)
+    results = {}
+    try:
+        wait_until_ready(port, process)
+        with multiprocessing.Pool(processes) as pool:
+            for endpoint in ENDPOINTS:
+                reset_peak_rss(process.pid)
+                started = time.perf_counter()
+                parts = pool.map(drive_connections, [
+                    (port, endpoint, per_connection, sizes, worker, connections) for worker in range(processes)
+                ])
+                elapsed = time.perf_counter() - started
+                latencies, statuses = [], Counter()
+                for part_latencies, part_statuses in parts:
+                    latencies += part_latencies
+                    statuses.update(part_statuses)
+                results[endpoint] = summarize(latencies, elapsed, statuses, peak_rss_kb(process.pid))
+    finally:
+        process.terminate()
+        process.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cars", type=int, default=1000, help="number of seeded cars")
+    parser.add_argument("--users", type=int, default=10000, help="number of seeded users")
+    parser.add_argument("--rentals", type=int, default=100000, help="number of seeded rentals")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per route and mode")
+    parser.add_argument("--concurrency", type=int, default=64, help="connections open at once")
+    parser.add_argument("--processes", type=int, default=4, help="load generator processes")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes of each server")
+    parser.add_argument("--output", help="result file (default: benchmark/results/serving-<timestamp>.json)")
+    args = parser.parse_args()
+    sizes = {"cars": args.cars, "users": args.users, "rentals": args.rentals}
+
+    started_at = datetime.now()
+    report = {
+        "meta": {
+            "started_at": started_at.isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "cpus": os.cpu_count(),
+            "sizes": sizes,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "settings": settings(),
+        }
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, LOG_PATH=os.path.join(directory, "log") + "/", LOG_LEVEL="ERROR")
+        seed_path = os.path.join(directory, "seed") + "/"
+        subprocess.run(
+            [sys.executable, "-m", "benchmark.seed", "--cars", str(args.cars), "--users", str(args.users),
+             "--rentals", str(args.rentals)],
+            cwd=ROOT, env=dict(env, DB_PATH=seed_path), stdout=subprocess.DEVNULL, check=True
+        )
+        for mode, server in SERVERS.items():
+            mode_path = os.path.join(directory, mode) + "/"
+            shutil.copytree(seed_path, mode_path)
+            report[mode] = run_mode(
+                server, sizes, args.requests, args.concurrency, args.processes, args.workers,
+                dict(env, DB_PATH=mode_path)
+            )
+
+    output = args.output or os.path.join(ROOT, "benchmark", "results", f"serving-{started_at:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as result:
+        json.dump(report, result, indent=2)
+
+    print(f"{'':20} {'wsgi p50':>9} {'p95':>9} {'p99':>9} {'req/s':>8}   {'asgi p50':>9} {'p95':>9} {'p99':>9} "
+          f"{'req/s':>8}")
+    for endpoint in ENDPOINTS:
+        line = f"{endpoint:20}"
+        for mode in SERVERS:
+            result = report[mode][endpoint]
+            line += (f" {result['p50_ms']:9.3f} {result['p95_ms']:9.3f} {result['p99_ms']:9.3f} "
+                     f"{result['throughput_rps']:8.1f}  ")
+        print(line)
+    print("Results saved to", output)
+
+
+if __name__ == "__main__":
+    main()
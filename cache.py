@@ -0,0 +1,266 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+
+class LRUCache:
+    """
+    In-process cache backend: a least-recently-used dictionary whose entries expire after a TTL.
+
+    Its entries are private to the worker process, so with several worker processes the shared backend must be
+    used instead, otherwise a write handled by one worker would not invalidate the entries of the others.
+    """
+
+    # Whether the entries are seen by every worker process.
+    shared = False
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 60):
+        """
+        Initialize a LRUCache instance.
+
+        Args:
+            max_entries (int): The maximum number of entries; the least recently used is evicted beyond it.
+            ttl (float): The default lifetime of an entry, in seconds.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        """Returns the value of a key, or None when it is missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl=None):
+        """Stores the value of a key. A ttl of 0 stores it without expiry."""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: str):
+        """Removes a key, if present."""
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class InMemoryClient:
+    """
+    Stand-in for a Redis client, implementing the few commands SharedCache uses.
+
+    It lets the shared backend be used (and tested) without a Redis server, within a single process.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get(self, name: str):
+        with self.lock:
+            entry = self.values.get(name)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.values[name]
+                return None
+            return value
+
+    def set(self, name: str, value: bytes, ex=None):
+        with self.lock:
+            self.values[name] = (time.monotonic() + ex if ex else None, value)
+        return True
+
+    def delete(self, *names: str):
+        with self.lock:
+            return sum(1 for name in names if self.values.pop(name, None) is not None)
+
+
+class SharedCache:
+    """
+    Cache backend stored in a Redis-compatible server, shared by all the worker processes.
+
+    Values are pickled, so the presented dicts keep their Decimal and date values.
+    """
+
+    def __init__(self, client, prefix: str = "car-rental:", ttl: float = 60):
+        """
+        Initialize a SharedCache instance.
+
+        Args:
+            client: A Redis client, or an InMemoryClient.
+            prefix (str): Prepended to every key, to share a server with other applications.
+            ttl (float): The default lifetime of an entry, in seconds.
+        """
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        # The in-process stand-in is only shared by the threads of one process.
+        self.shared = not isinstance(client, InMemoryClient)
+
+    def get(self, key: str):
+        data = self.client.get(self.prefix + key)
+        return pickle.loads(data) if data is not None else None
+
+    def set(self, key: str, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=int(ttl) or None)
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+
+class ReadThroughCache:
+    """
+    Read-through cache of presented responses, in front of a backend (LRUCache or SharedCache).
+
+    Entries are grouped in namespaces ("car:1", "cars", "user:1"). Each namespace has a generation, stored in the
+    backend and part of the key of its entries. Invalidating a namespace replaces its generation, which makes all
+    its entries unreachable at once, including the pages of a listing. Since a reader reads the generation before
+    loading, a value loaded before a write commits is always stored under the generation the write replaces.
+    """
+
+    def __init__(self, backend):
+        """
+        Initialize a ReadThroughCache instance.
+
+        Args:
+            backend: The backend storing the entries, or None to disable caching.
+        """
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def generation(self, namespace: str) -> int:
+        """Returns the current generation of a namespace, starting a new one if it has none."""
+        generation = self.backend.get(f"gen:{namespace}")
+        if generation is None:
+            generation = time.time_ns()
+            self.backend.set(f"gen:{namespace}", generation, ttl=0)
+        return generation
+
+    def get_or_load(self, namespace: str, loader, *parts):
+        """
+        Returns the cached value of an entry of a namespace, or loads and caches it on a miss.
+
+        Args:
+            namespace (str): The namespace of the entry.
+            loader (callable): Loads the value. A None value (e.g. not found) is returned but not cached.
+            parts: What identifies the entry within the namespace, e.g. the page parameters.
+        """
+        if self.backend is None:
+            return loader()
+
+        key = ":".join([namespace, str(self.generation(namespace))] + [str(part) for part in parts])
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = loader()
+        if value is not None:
+            self.backend.set(key, value)
+        return value
+
+    async def get_or_load_async(self, namespace: str, loader, *parts):
+        """
+        Like get_or_load, for the async handlers: the loader is a coroutine function, awaited on a miss.
+
+        The backend is still called synchronously, which is immediate for the in-process backends.
+        """
+        if self.backend is None:
+            return await loader()
+
+        key = ":".join([namespace, str(self.generation(namespace))] + [str(part) for part in parts])
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = await loader()
+        if value is not None:
+            self.backend.set(key, value)
+        return value
+
+    def etag(self, namespace: str, *parts):
+        """
+        Returns a strong ETag for a response built from a namespace, or None when the backend is not shared by
+        every worker process (or caching is disabled).
+
+        The tag only depends on the generation of the namespace and on the parts (e.g. the request path), so it
+        is known without querying the database and changes whenever the namespace is invalidated. A generation
+        kept in one process is only replaced by the writes of that process: the other workers would keep
+        answering 304 to the tag of a changed resource, so no tag is issued from a per-process backend.
+        """
+        if self.backend is None or not self.backend.shared:
+            return None
+        key = ":".join([namespace, str(self.generation(namespace))] + [str(part) for part in parts])
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def invalidate(self, *namespaces: str):
+        """Makes every entry of the namespaces unreachable. It must be called after the write is committed."""
+        if self.backend is None:
+            return
+        for namespace in namespaces:
+            self.backend.set(f"gen:{namespace}", time.time_ns(), ttl=0)
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Returns the hit, miss and invalidation counters of this worker process."""
+        lookups = self.hits + self.misses
+        return {
+            "backend": config.CACHE_BACKEND,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+def build_backend():
+    """
+    Builds the cache backend chosen by config.CACHE_BACKEND: "lru", "memory" (the shared backend on an
+    InMemoryClient), "redis" or "none". The in-process backends are refused when config.WEB_CONCURRENCY says
+    several worker processes serve the API, since the writes of one would not invalidate the entries of the others.
+    """
+    if config.CACHE_BACKEND in ("lru", "memory") and config.WEB_CONCURRENCY > 1:
+        raise RuntimeError(
+            f"CACHE_BACKEND={config.CACHE_BACKEND} keeps the cache in each of the {config.WEB_CONCURRENCY} worker "
+            "processes (WEB_CONCURRENCY), which would serve stale responses: use CACHE_BACKEND=redis or none"
+        )
+    if config.CACHE_BACKEND == "lru":
+        return LRUCache(max_entries=config.CACHE_MAX_ENTRIES, ttl=config.CACHE_TTL_SECONDS)
+    if config.CACHE_BACKEND == "memory":
+        return SharedCache(InMemoryClient(), ttl=config.CACHE_TTL_SECONDS)
+    if config.CACHE_BACKEND == "redis":
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package")
+        return SharedCache(redis.Redis.from_url(config.CACHE_REDIS_URL), ttl=config.CACHE_TTL_SECONDS)
+    return None
+
+
+cache = ReadThroughCache(build_backend())
@@ -0,0 +1,95 @@
+import gzip
+from typing import Optional
+
+from flask import request
+from werkzeug.http import parse_accept_header
+
+import config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# The encoder of each content coding, at a level that favours speed: JSON compresses well at low levels already,
+# and the response is compressed on the request thread.
+ENCODERS = {"gzip": lambda data: gzip.compress(data, compresslevel=5, mtime=0)}
+if brotli is not None:
+    ENCODERS["br"] = lambda data: brotli.compress(data, quality=4, mode=brotli.MODE_TEXT)
+if zstandard is not None:
+    # A ZstdCompressor is not thread-safe, and cheap to create.
+    ENCODERS["zstd"] = lambda data: zstandard.ZstdCompressor(level=3).compress(data)
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "application/problem+json", "text/plain", "text/html", "text/css",
+                          "application/javascript")
+
+
+class Compressor:
+    """
+    Compresses response bodies with the content coding negotiated from the Accept-Encoding header of the request.
+
+    The coding is the one the client prefers by quality among the enabled ones, ties going to the first in
+    `encodings`. Bodies smaller than `min_bytes` are sent as they are: the headers and the CPU time would cost more
+    than the bytes saved.
+    """
+
+    def __init__(self, encodings: str = "zstd,br,gzip", min_bytes: int = 1024):
+        """
+        Initialize a Compressor instance.
+
+        Args:
+            encodings (str): The enabled content codings, comma-separated, by server preference. The codings whose
+                package is not installed are left out; an empty list disables compression.
+            min_bytes (int): The size from which a body is compressed.
+        """
+        self.encodings = [name for name in (name.strip() for name in encodings.split(",")) if name in ENCODERS]
+        self.min_bytes = min_bytes
+
+    def negotiate(self, accept_encoding: Optional[str], size: int, mimetype: Optional[str]) -> Optional[str]:
+        """Returns the content coding of a body, or None when it is sent as it is."""
+        if not self.encodings or not accept_encoding or size < self.min_bytes or \
+                mimetype not in COMPRESSIBLE_MIMETYPES:
+            return None
+        return parse_accept_header(accept_encoding).best_match(self.encodings)
+
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        """Compresses a body with a content coding returned by negotiate."""
+        return ENCODERS[encoding](data)
+
+
+def install_compression(app, compressor: Compressor):
+    """
+    Compresses the responses of the app, once every other after_request function of the app has run.
+
+    Streamed responses (NDJSON, server-sent events) are sent as they are, so their lines reach the client as soon
+    as they are written. The ETag of a compressed response is made weak, as its bytes depend on the coding: the
+    conditional GETs compare ETags weakly, so it still matches the tag of the uncompressed response.
+    """
+
+    # after_request functions run in the reverse order of their registration, so this one, registered before the
+    # handlers of the app, runs after theirs.
+    @app.after_request
+    def compress_response(response):
+        if not compressor.encodings or response.direct_passthrough or response.is_streamed or \
+                "Content-Encoding" in response.headers:
+            return response
+        if response.mimetype in COMPRESSIBLE_MIMETYPES:
+            response.vary.add("Accept-Encoding")
+        data = response.get_data()
+        encoding = compressor.negotiate(request.headers.get("Accept-Encoding"), len(data), response.mimetype)
+        if encoding is None:
+            return response
+        response.set_data(compressor.compress(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+compressor = Compressor(encodings=config.COMPRESSION_ENCODINGS, min_bytes=config.COMPRESSION_MIN_BYTES)
@@ -0,0 +1,164 @@
+import os
+
+
+def env_int(name: str, default=None):
+    """Reads an integer setting from the environment, or returns the default when it is not set."""
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    """Reads a boolean setting from the environment ("1", "true", "yes" or "on"), or returns the default."""
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Database
+DB_PATH = os.environ.get("DB_PATH", "database/")
+DATABASE_URL = os.environ.get("DATABASE_URL", f"sqlite:///{DB_PATH}/db.sqlite3")
+DB_ECHO = env_bool("DB_ECHO")
+
+# Schema migrations (python -m model.migrations upgrade): backfills update this many rows per transaction, and pause
+# between batches so the API keeps its share of the write lock.
+MIGRATION_BATCH_SIZE = env_int("MIGRATION_BATCH_SIZE", 1000)
+MIGRATION_PAUSE_MS = env_int("MIGRATION_PAUSE_MS", 50)
+
+# Connection pool. Unset values keep the SQLAlchemy defaults of the pool class chosen for the URL.
+DB_POOL_SIZE = env_int("DB_POOL_SIZE")
+DB_MAX_OVERFLOW = env_int("DB_MAX_OVERFLOW")
+DB_POOL_TIMEOUT = env_int("DB_POOL_TIMEOUT")
+DB_POOL_RECYCLE = env_int("DB_POOL_RECYCLE")
+DB_POOL_PRE_PING = env_bool("DB_POOL_PRE_PING")
+
+# SQLite profile. "production" switches to WAL with the pragmas below, "default" keeps SQLite's own defaults.
+SQLITE_PROFILE = os.environ.get("SQLITE_PROFILE", "default")
+SQLITE_BUSY_TIMEOUT_MS = env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+SQLITE_MMAP_SIZE = env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+SQLITE_CACHE_SIZE_KB = env_int("SQLITE_CACHE_SIZE_KB", 64 * 1024)
+
+# Single-writer queue: when enabled, the write handlers hand their work to one thread per worker process,
+# which commits the writes that arrive together in a single transaction.
+DB_WRITE_QUEUE = env_bool("DB_WRITE_QUEUE")
+DB_WRITE_QUEUE_BATCH = env_int("DB_WRITE_QUEUE_BATCH", 64)
+DB_WRITE_QUEUE_WAIT_MS = env_int("DB_WRITE_QUEUE_WAIT_MS", 2)
+# How long a write waits for the writer thread before it is withdrawn and answered with 503.
+DB_WRITE_QUEUE_TIMEOUT_MS = env_int("DB_WRITE_QUEUE_TIMEOUT_MS", 5000)
+
+# The number of worker processes serving the API. gunicorn and uvicorn both take it from WEB_CONCURRENCY when it is
+# set, so pass it there (e.g. `WEB_CONCURRENCY=4 uvicorn asgi:app`) rather than with --workers: the per-process
+# caches below check it.
+WEB_CONCURRENCY = env_int("WEB_CONCURRENCY", 1)
+
+# Read-through cache of car and user responses: "lru" (in-process, for a single worker process), "memory"
+# (the shared backend on an in-process stand-in), "redis" (shared by all worker processes) or "none". With several
+# worker processes, a write handled by one of them would leave the others serving stale entries from an in-process
+# backend, so the default is then "none", and "lru" or "memory" are refused: use "redis".
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "lru" if WEB_CONCURRENCY <= 1 else "none")
+CACHE_TTL_SECONDS = env_int("CACHE_TTL_SECONDS", 60)
+CACHE_MAX_ENTRIES = env_int("CACHE_MAX_ENTRIES", 10000)
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Logging. With LOG_ASYNC the handlers run on a background thread, fed by a queue, instead of on the request thread.
+LOG_PATH = os.environ.get("LOG_PATH", "log/")
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_ASYNC = env_bool("LOG_ASYNC", True)
+LOG_MAX_BYTES = env_int("LOG_MAX_BYTES", 10 * 1024 * 1024)
+LOG_BACKUP_COUNT = env_int("LOG_BACKUP_COUNT", 10)
+
+# Requests slower than this many milliseconds are logged with the SQL they ran; 0 disables the slow request log.
+METRICS_SLOW_REQUEST_MS = env_int("METRICS_SLOW_REQUEST_MS", 0)
+
+# JSON fast path: listings select only the presented columns as row tuples instead of ORM instances, and responses
+# are encoded with orjson instead of the standard library encoder. orjson is optional (`pip install orjson`): without
+# it only the listings change. Off by default, when the listings load ORM instances (except with `fields`).
+JSON_FAST_PATH = env_bool("JSON_FAST_PATH")
+
+# Rate limiting: each client gets a token bucket per endpoint, refilled at the limit of the endpoint in
+# RATE_LIMIT_ROUTES ("get_rentals=2:10,get_cars=20:40"), or at RATE_LIMIT_DEFAULT for the others. A limit is written
+# "rate:burst": requests per second, and how many may be sent at once; an empty one is no limit. A request finding its
+# bucket empty is answered with 429. Clients are told apart by their address. Behind proxies, they are told apart by
+# the RATE_LIMIT_CLIENT_HEADER header (e.g. X-Forwarded-For). The header is only honoured on requests coming from an
+# address of RATE_LIMIT_TRUSTED_PROXIES, a comma-separated list of addresses or networks (e.g. "10.0.0.0/8"). Each of
+# the RATE_LIMIT_PROXY_COUNT proxies appends an entry to the header, so the client is the entry that many from the
+# right; the entries to its left were written by the client and can be forged. The buckets are kept per worker
+# process ("local", at most RATE_LIMIT_MAX_CLIENTS of them), in Redis to hold the limits across worker processes
+# ("redis"), or nowhere ("none").
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "local")
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL", CACHE_REDIS_URL)
+RATE_LIMIT_DEFAULT = os.environ.get("RATE_LIMIT_DEFAULT", "")
+RATE_LIMIT_ROUTES = os.environ.get("RATE_LIMIT_ROUTES", "")
+RATE_LIMIT_CLIENT_HEADER = os.environ.get("RATE_LIMIT_CLIENT_HEADER", "")
+RATE_LIMIT_TRUSTED_PROXIES = os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", "")
+RATE_LIMIT_PROXY_COUNT = env_int("RATE_LIMIT_PROXY_COUNT", 1)
+RATE_LIMIT_MAX_CLIENTS = env_int("RATE_LIMIT_MAX_CLIENTS", 100000)
+
+# Load shedding: at most the given number of requests of each endpoint of SHED_ROUTES ("get_rentals=8") run at once
+# per worker process. A request waiting longer than SHED_MAX_WAIT_MS for its turn is answered with 503.
+SHED_ROUTES = os.environ.get("SHED_ROUTES", "")
+SHED_MAX_WAIT_MS = env_int("SHED_MAX_WAIT_MS", 100)
+
+# Response compression: the responses of at least COMPRESSION_MIN_BYTES bytes are compressed with the coding of
+# COMPRESSION_ENCODINGS the client prefers, ties going to the first listed. zstd and br need the optional zstandard
+# and brotli packages, and are left out when they are not installed. An empty list disables compression.
+COMPRESSION_ENCODINGS = os.environ.get("COMPRESSION_ENCODINGS", "zstd,br,gzip")
+COMPRESSION_MIN_BYTES = env_int("COMPRESSION_MIN_BYTES", 1024)
+
+# Idempotency keys: the responses of POST /user, /car and /rental sent with an Idempotency-Key header are kept this
+# many seconds, and replayed to retries. A background sweeper deletes the expired keys every
+# IDEMPOTENCY_SWEEP_SECONDS, and the keys expiring first beyond IDEMPOTENCY_MAX_KEYS.
+IDEMPOTENCY_TTL_SECONDS = env_int("IDEMPOTENCY_TTL_SECONDS", 24 * 60 * 60)
+IDEMPOTENCY_MAX_KEYS = env_int("IDEMPOTENCY_MAX_KEYS", 100000)
+IDEMPOTENCY_SWEEP_SECONDS = env_int("IDEMPOTENCY_SWEEP_SECONDS", 60)
+
+# Pricing: the rate table of the pricing rules covers this many days before and after today; quotes of periods
+# outside it are summed segment by segment between the season boundaries.
+PRICING_PAST_DAYS = env_int("PRICING_PAST_DAYS", 365)
+PRICING_FUTURE_DAYS = env_int("PRICING_FUTURE_DAYS", 730)
+
+# Rental periods: a rental or a quote lasts at most RENTAL_MAX_DAYS days, and its dates are at most
+# RENTAL_HORIZON_DAYS days before or after today. Longer or farther periods are rejected when the request is validated.
+RENTAL_MAX_DAYS = env_int("RENTAL_MAX_DAYS", 366)
+RENTAL_HORIZON_DAYS = env_int("RENTAL_HORIZON_DAYS", 3660)
+
+# Occupancy calendar: the day-by-day occupancy of the fleet is kept in memory from OCCUPANCY_PAST_DAYS days before
+# today to OCCUPANCY_FUTURE_DAYS days after it. The rentals deleted by other workers are looked up from
+# OCCUPANCY_SYNC_MARGIN_SECONDS before the previous lookup, to cover the transactions still open at that time.
+# A calendar request spans at most CALENDAR_MAX_DAYS days.
+OCCUPANCY_PAST_DAYS = env_int("OCCUPANCY_PAST_DAYS", 365)
+OCCUPANCY_FUTURE_DAYS = env_int("OCCUPANCY_FUTURE_DAYS", 730)
+OCCUPANCY_SYNC_MARGIN_SECONDS = env_int("OCCUPANCY_SYNC_MARGIN_SECONDS", 60)
+CALENDAR_MAX_DAYS = env_int("CALENDAR_MAX_DAYS", 366)
+
+# Archival: a background thread moves the rentals that ended (or were deleted) more than ARCHIVE_AFTER_DAYS days ago
+# from the rental table to rental_archive, ARCHIVE_BATCH_SIZE rentals per transaction with a pause between
+# batches, every ARCHIVE_INTERVAL_SECONDS. Archived rentals are no longer served by the API. 0 disables it.
+ARCHIVE_AFTER_DAYS = env_int("ARCHIVE_AFTER_DAYS", 0)
+ARCHIVE_INTERVAL_SECONDS = env_int("ARCHIVE_INTERVAL_SECONDS", 3600)
+ARCHIVE_BATCH_SIZE = env_int("ARCHIVE_BATCH_SIZE", 500)
+ARCHIVE_PAUSE_MS = env_int("ARCHIVE_PAUSE_MS", 50)
+
+# Change feed: the inserts and deletes of users, cars and rentals are appended to the change table in the transaction
+# of the write, and served by GET /changes and GET /changes/stream. A background sweeper deletes the changes older
+# than CHANGES_RETENTION_DAYS days, and the oldest ones beyond CHANGES_MAX_ROWS, every CHANGES_SWEEP_SECONDS (0
+# disables each limit). With CHANGES_COMPACT, deleting a row drops the data of its earlier changes. A stream polls
+# the log every CHANGES_POLL_MS and ends after CHANGES_STREAM_SECONDS, for the client to reconnect from its last event.
+CHANGES_RETENTION_DAYS = env_int("CHANGES_RETENTION_DAYS", 7)
+CHANGES_MAX_ROWS = env_int("CHANGES_MAX_ROWS", 0)
+CHANGES_SWEEP_SECONDS = env_int("CHANGES_SWEEP_SECONDS", 3600)
+CHANGES_COMPACT = env_bool("CHANGES_COMPACT", True)
+CHANGES_POLL_MS = env_int("CHANGES_POLL_MS", 500)
+CHANGES_STREAM_SECONDS = env_int("CHANGES_STREAM_SECONDS", 300)
+
+# Passwords are hashed with scrypt; raising the cost parameters rehashes each password at its owner's next login.
+# The hashes run on a pool of PASSWORD_HASH_WORKERS threads (or processes, with PASSWORD_HASH_POOL=process) per worker
+# process; at most PASSWORD_HASH_MAX_PENDING run or wait at once, and a request waiting longer than
+# PASSWORD_HASH_MAX_WAIT_MS for a slot is answered with 503.
+PASSWORD_SCRYPT_N = env_int("PASSWORD_SCRYPT_N", 2 ** 14)
+PASSWORD_SCRYPT_R = env_int("PASSWORD_SCRYPT_R", 8)
+PASSWORD_SCRYPT_P = env_int("PASSWORD_SCRYPT_P", 1)
+PASSWORD_HASH_POOL = os.environ.get("PASSWORD_HASH_POOL", "thread")
+PASSWORD_HASH_WORKERS = env_int("PASSWORD_HASH_WORKERS", os.cpu_count() or 1)
+PASSWORD_HASH_MAX_PENDING = env_int("PASSWORD_HASH_MAX_PENDING", 64)
+PASSWORD_HASH_MAX_WAIT_MS = env_int("PASSWORD_HASH_MAX_WAIT_MS", 1000)
@@ -1,8 +1,13 @@
+import atexit
 import logging
 import os
+import queue
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
 
-LOG_PATH = "log/"
+import config
+
+LOG_PATH = config.LOG_PATH
 
 if not os.path.exists(LOG_PATH):
     os.makedirs(LOG_PATH)
@@ -28,16 +33,16 @@ dictConfig({
             "class": "logging.handlers.RotatingFileHandler",
             "formatter": "detailed",
             "filename": os.path.join(LOG_PATH, "gunicorn.error.log"),
-            "maxBytes": 10000,
-            "backupCount": 10,
+            "maxBytes": config.LOG_MAX_BYTES,
+            "backupCount": config.LOG_BACKUP_COUNT,
             "delay": True,
         },
         "detailed_file": {
             "class": "logging.handlers.RotatingFileHandler",
             "formatter": "detailed",
             "filename": os.path.join(LOG_PATH, "gunicorn.detailed.log"),
-            "maxBytes": 10000,
-            "backupCount": 10,
+            "maxBytes": config.LOG_MAX_BYTES,
+            "backupCount": config.LOG_BACKUP_COUNT,
             "delay": True,
         },
     },
@@ -50,8 +55,36 @@ dictConfig({
     },
     "root": {
         "handlers": ["console", "detailed_file"],
-        "level": "INFO",
+        "level": config.LOG_LEVEL,
     },
 })
 
+
+
+def make_async(logger_to_wrap: logging.Logger) -> QueueListener:
+    """
+    Moves the handlers of a logger to a background thread.
+
+    The logger gets a single QueueHandler, which only enqueues the record on the calling thread; a QueueListener
+    thread formats the records and writes them (console, rotating files, including the rotation itself) with
+    the original handlers.
+
+    Returns:
+        QueueListener: The started listener, to be stopped at exit so that queued records are flushed.
+    """
+    handlers = list(logger_to_wrap.handlers)
+    records = queue.SimpleQueue()
+    for handler in handlers:
+        logger_to_wrap.removeHandler(handler)
+    logger_to_wrap.addHandler(QueueHandler(records))
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+if config.LOG_ASYNC:
+    make_async(logging.getLogger())
+    make_async(logging.getLogger("gunicorn.error"))
+
 logger = logging.getLogger(__name__)
@@ -0,0 +1,149 @@
+import bisect
+import threading
+import time
+
+from flask import g, request
+from sqlalchemy import event
+
+import config
+from logger import logger
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """
+    A Prometheus-style histogram: the number of observations at or below each bucket bound, their sum and count.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> list:
+        """Returns the exposition lines of the histogram, with cumulative buckets."""
+        lines, cumulative = [], 0
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class RequestMetrics:
+    """
+    Per-endpoint request metrics of a worker process: latency, SQL statements and SQL time per request, response
+    sizes, and the number of responses by status.
+    """
+
+    HISTOGRAMS = {
+        "http_request_duration_seconds": ("Request latency, per endpoint.", LATENCY_BUCKETS),
+        "http_request_sql_statements": ("SQL statements executed per request, per endpoint.", SQL_STATEMENT_BUCKETS),
+        "http_request_sql_duration_seconds": ("Time spent in SQL per request, per endpoint.", LATENCY_BUCKETS),
+        "http_response_size_bytes": ("Response body size, per endpoint.", SIZE_BUCKETS),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {name: {} for name in self.HISTOGRAMS}
+        self.responses = {}
+
+    def observe(self, name: str, endpoint: str, value: float):
+        with self.lock:
+            histogram = self.histograms[name].get(endpoint)
+            if histogram is None:
+                histogram = self.histograms[name][endpoint] = Histogram(self.HISTOGRAMS[name][1])
+            histogram.observe(value)
+
+    def count_response(self, endpoint: str, status: int):
+        with self.lock:
+            self.responses[(endpoint, status)] = self.responses.get((endpoint, status), 0) + 1
+
+    def render(self, extra_counters: dict = None) -> str:
+        """
+        Returns all the metrics in the Prometheus text exposition format.
+
+        Args:
+            extra_counters (dict): Other counters to expose, by name: (help, value).
+        """
+        lines = []
+        with self.lock:
+            for name, (help_text, _) in self.HISTOGRAMS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for endpoint, histogram in sorted(self.histograms[name].items()):
+                    lines += histogram.render(name, f'endpoint="{endpoint}"')
+            lines += ["# HELP http_responses_total Responses, per endpoint and status.",
+                      "# TYPE http_responses_total counter"]
+            for (endpoint, status), count in sorted(self.responses.items()):
+                lines.append(f'http_responses_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+        for name, (help_text, value) in (extra_counters or {}).items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+metrics = RequestMetrics()
+current = threading.local()
+
+
+def install_metrics(app, engine):
+    """
+    Records the metrics of every request of the app, and the SQL its handler runs on the engine.
+
+    SQL statements are attributed to the request of the thread that executes them. Requests slower than
+    config.METRICS_SLOW_REQUEST_MS (0 disables it) are logged with the SQL they ran.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_statement(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("statement_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_statement(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["statement_start"].pop()
+        stats = getattr(current, "stats", None)
+        if stats is not None:
+            stats["statements"] += 1
+            stats["sql_time"] += elapsed
+            if config.METRICS_SLOW_REQUEST_MS:
+                stats["sql"].append((elapsed, statement))
+
+    @app.before_request
+    def start_request():
+        g.request_start = time.perf_counter()
+        current.stats = {"statements": 0, "sql_time": 0.0, "sql": []}
+
+    @app.after_request
+    def record_request(response):
+        stats = getattr(current, "stats", None)
+        start = g.pop("request_start", None)
+        if stats is None or start is None:
+            return response
+        current.stats = None
+
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or "unmatched"
+        metrics.observe("http_request_duration_seconds", endpoint, elapsed)
+        metrics.observe("http_request_sql_statements", endpoint, stats["statements"])
+        metrics.observe("http_request_sql_duration_seconds", endpoint, stats["sql_time"])
+        # Streamed responses have no known size; their latency covers the time to the first byte.
+        if not response.is_streamed:
+            metrics.observe("http_response_size_bytes", endpoint, response.calculate_content_length() or 0)
+        metrics.count_response(endpoint, response.status_code)
+
+        if config.METRICS_SLOW_REQUEST_MS and elapsed * 1000 >= config.METRICS_SLOW_REQUEST_MS:
+            statements = "; ".join(f"[{duration * 1000:.1f} ms] {sql}" for duration, sql in stats["sql"])
+            logger.warning(
+                "Slow request %s %s: %.1f ms, %d SQL statements in %.1f ms: %s", request.method, request.full_path,
+                elapsed * 1000, stats["statements"], stats["sql_time"] * 1000, statements
+            )
+        return response
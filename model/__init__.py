@@ -1,26 +1,102 @@
-import os
-
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy_utils import database_exists, create_database
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+import config
 
 from model.base import Base
 from model.car import Car
 from model.user import User
 from model.rental import Rental
+from model.loaders import with_profile
+from model.booking import has_overlap, available_cars, available_condition, lock_car
+from model.bulk import bulk_insert, bulk_write, insert_rows, batches
+from model.search import cursor_row, keyset_query, sort_column, filter_cars, filter_rentals
+from model.sqlite import apply_pragmas, production_pragmas
+from model.writer import WriteQueue, WriteQueueTimeout, run_in_transaction
+from model.report import CarReport, UserReport, DayReport, record_rentals, rebuild_reports, revenue_by_period, \
+    period_start, next_period
+from model.pricing import PricingRule
+from model.idempotency import IdempotencyKey, KeySweeper, find_response, store_response, sweep_keys
+from model.softdelete import SoftDeleteMixin, soft_delete
+from model.archive import RentalArchive, Archiver, archive_rentals
+from model.catalog import CarModel, record_cars, rebuild_catalog, search_cars
+from model.changelog import Change, ChangeSweeper, record_changes, changes_after, log_bounds, log_bounds_query, \
+    is_purged, sweep_changes
+from model.migrations import SchemaMigration, upgrade, pending_migrations
+
+
+def engine_options() -> dict:
+    """
+    Builds the keyword arguments of create_engine from the settings in config.
+
+    Pool settings that are not configured are left out, so the pool class SQLAlchemy picks for the URL keeps
+    its own defaults.
+    """
+    options = {"echo": config.DB_ECHO, "pool_pre_ping": config.DB_POOL_PRE_PING}
+    pool_settings = {
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+    }
+    options.update({name: value for name, value in pool_settings.items() if value is not None})
+    return options
+
+
+# Creating the engine does not connect. The schema is created and upgraded by the migrations (see model.migrations),
+# not when model is imported, so a worker process starts without touching the database.
+engine = create_engine(config.DATABASE_URL, **engine_options())
+
+if config.SQLITE_PROFILE == "production":
+    apply_pragmas(engine, production_pragmas())
+
+# One session per thread. The API removes it at the end of every request (see teardown_appcontext in app.py),
+# which closes it, returns its connection to the pool and drops its identity map.
+Session = scoped_session(sessionmaker(bind=engine))
 
-db_path = "database/"
+write_queue = None
+if config.DB_WRITE_QUEUE:
+    write_queue = WriteQueue(
+        sessionmaker(bind=engine),
+        max_batch=config.DB_WRITE_QUEUE_BATCH,
+        max_wait=config.DB_WRITE_QUEUE_WAIT_MS / 1000,
+        timeout=config.DB_WRITE_QUEUE_TIMEOUT_MS / 1000
+    )
 
-if not os.path.exists(db_path):
-    os.makedirs(db_path)
+# Deletes the expired idempotency keys; started by the first write request that sends a key.
+key_sweeper = KeySweeper(
+    sessionmaker(bind=engine), interval=config.IDEMPOTENCY_SWEEP_SECONDS, max_keys=config.IDEMPOTENCY_MAX_KEYS
+)
 
-db_url = f'sqlite:///{db_path}/db.sqlite3'
+# Moves the old rentals to the archive; started by the first request when ARCHIVE_AFTER_DAYS is set.
+archiver = None
+if config.ARCHIVE_AFTER_DAYS:
+    archiver = Archiver(
+        sessionmaker(bind=engine),
+        after_days=config.ARCHIVE_AFTER_DAYS,
+        interval=config.ARCHIVE_INTERVAL_SECONDS,
+        batch_size=config.ARCHIVE_BATCH_SIZE,
+        pause=config.ARCHIVE_PAUSE_MS / 1000
+    )
 
-engine = create_engine(db_url, echo=False)
+# Deletes the changes past the retention limits of the change feed; started by the first request when one is set.
+change_sweeper = None
+if config.CHANGES_RETENTION_DAYS or config.CHANGES_MAX_ROWS:
+    change_sweeper = ChangeSweeper(
+        sessionmaker(bind=engine),
+        interval=config.CHANGES_SWEEP_SECONDS,
+        retention_days=config.CHANGES_RETENTION_DAYS,
+        max_changes=config.CHANGES_MAX_ROWS
+    )
 
-Session = sessionmaker(bind=engine)
 
-if not database_exists(engine.url):
-    create_database(engine.url)
+def run_write(job):
+    """
+    Runs a write job (see model.writer.run_in_transaction) and returns its result.
 
-Base.metadata.create_all(engine)
+    With the write queue enabled the job is committed by the writer thread, together with the other writes that
+    arrive at the same time; otherwise it is committed on its own in the session of the request.
+    """
+    if write_queue is not None:
+        return write_queue.run(job)
+    return run_in_transaction(Session(), job)
@@ -0,0 +1,28 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+import config
+
+from model import engine_options
+from model.sqlite import apply_pragmas, production_pragmas
+
+# The async driver of each database backend. The drivers are optional dependencies, only needed by the ASGI mode
+# (see asgi.py), so this module is not imported by model.
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_database_url(url: str):
+    """Returns a database URL with the async driver of its backend: aiosqlite for SQLite, asyncpg for PostgreSQL."""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+# Configured like the engine of model, with the same pool settings and SQLite pragmas, on the same database.
+async_engine = create_async_engine(async_database_url(config.DATABASE_URL), **engine_options())
+
+if config.SQLITE_PROFILE == "production":
+    apply_pragmas(async_engine.sync_engine, production_pragmas())
+
+# Sessions of the async handlers, one per request. The objects stay readable after a commit, since presenting
+# them must not trigger a (synchronous) refresh.
+AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
@@ -0,0 +1,182 @@
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import Column, Integer, Date, DateTime, Numeric, Index, insert, delete, select, literal, or_
+
+from model.base import Base
+from model.changelog import record_changes
+from model.rental import Rental
+
+logger = logging.getLogger(__name__)
+
+
+class RentalArchive(Base):
+    """
+    The rentals moved out of the rental table by the archiver, with the columns they had and when they moved.
+
+    Archived rentals no longer slow down the queries of the live table; they still count in the report summary
+    tables, which the archiver leaves untouched.
+    """
+    __tablename__ = 'rental_archive'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    car_id = Column(Integer, nullable=False)
+    rental_start_date = Column(Date, nullable=False)
+    rental_end_date = Column(Date, nullable=False)
+    total_price = Column(Numeric(10, 2), nullable=False)
+    date_added = Column(DateTime)
+    deleted_at = Column(DateTime)
+    archived_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Finds the rentals archived since a given time, for the occupancy calendar of the other workers.
+        Index("ix_rental_archive_archived_at", "archived_at"),
+    )
+
+
+ARCHIVED_COLUMNS = (
+    "id", "user_id", "car_id", "rental_start_date", "rental_end_date", "total_price", "date_added", "deleted_at"
+)
+
+
+def archive_batch(session, cutoff: date, batch_size: int) -> list:
+    """
+    Moves up to `batch_size` rentals that ended before the cutoff, or were deleted before it, to the archive, in
+    the current transaction. The live ones leave the API, so a delete change is recorded for each of them; the
+    deleted ones had theirs when they were deleted.
+
+    The copy is the first statement of the transaction, so it takes the write lock before the batch is selected;
+    the delete then selects the same batch, and concurrent archivers never move a rental twice.
+
+    Returns:
+        List[Row]: The id, user_id, car_id, rental_start_date, rental_end_date and deleted_at of each archived
+        rental.
+    """
+    batch = (
+        select(Rental.id)
+        .where(or_(Rental.rental_end_date < cutoff, Rental.deleted_at < datetime.combine(cutoff, datetime.min.time())))
+        .order_by(Rental.id)
+        .limit(batch_size)
+        .scalar_subquery()
+    )
+    columns = [getattr(Rental, name) for name in ARCHIVED_COLUMNS]
+    session.execute(
+        insert(RentalArchive).from_select(
+            list(ARCHIVED_COLUMNS) + ["archived_at"],
+            select(*columns, literal(datetime.now(), DateTime)).where(Rental.id.in_(batch))
+        )
+    )
+    rentals = session.execute(
+        select(Rental.id, Rental.user_id, Rental.car_id, Rental.rental_start_date, Rental.rental_end_date,
+               Rental.deleted_at)
+        .where(Rental.id.in_(batch))
+        .execution_options(include_deleted=True)
+    ).all()
+    session.execute(
+        delete(Rental).where(Rental.id.in_([rental.id for rental in rentals]))
+        .execution_options(synchronize_session=False)
+    )
+    record_changes(session, "rental", "delete", [{"id": rental.id} for rental in rentals if rental.deleted_at is None])
+    return rentals
+
+
+def archive_rentals(session_factory, after_days: int, batch_size: int = 500, pause: float = 0.05,
+                    today: Optional[date] = None, on_archived=None) -> int:
+    """
+    Archives every rental that ended, or was deleted, more than `after_days` days ago.
+
+    Each batch is committed in its own short transaction, and the archiver pauses between batches, so the
+    requests waiting for the write lock are never held up for long. Once a batch is committed, `on_archived` is
+    called with its rentals (see archive_batch), e.g. to drop the cached responses that showed them.
+
+    Returns:
+        int: The number of archived rentals.
+    """
+    cutoff = (today or date.today()) - timedelta(days=after_days)
+    total = 0
+    while True:
+        session = session_factory()
+        try:
+            rentals = archive_batch(session, cutoff, batch_size)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        if rentals and on_archived is not None:
+            on_archived(rentals)
+        total += len(rentals)
+        if len(rentals) < batch_size:
+            return total
+        time.sleep(pause)
+
+
+class Archiver:
+    """
+    Runs archive_rentals on a background thread, every `interval` seconds.
+
+    Like the write queue, the thread is started lazily, so that each forked worker process gets its own. The
+    batches of several workers never overlap (see archive_batch).
+    """
+
+    def __init__(self, session_factory, after_days: int, interval: float = 3600, batch_size: int = 500,
+                 pause: float = 0.05, on_archived=None):
+        """
+        Initialize an Archiver instance.
+
+        Args:
+            session_factory (sessionmaker): Creates the sessions of the archiver thread.
+            after_days (int): How many days after their end (or deletion) rentals are archived.
+            interval (float): The time between two runs, in seconds.
+            batch_size (int): The number of rentals moved per transaction.
+            pause (float): The time between two batches, in seconds.
+            on_archived (callable): Called with the rentals of each committed batch (see archive_rentals); the API
+                sets it, as the caches it updates are not part of model.
+        """
+        self.session_factory = session_factory
+        self.after_days = after_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.on_archived = on_archived
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    def start(self):
+        """
+        Starts the archiver thread of the current process, if it is not running yet.
+        """
+        if self.pid == os.getpid() and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self.loop, name="rental-archiver", daemon=True)
+                self.thread.start()
+
+    def run(self) -> int:
+        """
+        Archives the rentals due for archival now, and returns how many were archived.
+        """
+        return archive_rentals(self.session_factory, self.after_days, self.batch_size, self.pause,
+                               on_archived=self.on_archived)
+
+    def loop(self):
+        """
+        Archives the rentals, forever. A failed run (e.g. the database is busy) is retried at the next interval.
+        """
+        while True:
+            try:
+                archived = self.run()
+                if archived:
+                    logger.info("Archived %s rentals", archived)
+            except Exception as e:
+                logger.warning("Error archiving rentals: %s", e)
+            time.sleep(self.interval)
@@ -0,0 +1,67 @@
+from datetime import date
+
+from sqlalchemy import and_, exists, not_, update
+
+from model.car import Car
+from model.rental import Rental
+
+
+def overlap_condition(car_id, start: date, end: date):
+    """
+    Builds the condition matching the rentals of a car that overlap a rental period.
+
+    Periods are half-open: a car returned on a given day can be rented again from that same day. Soft deleted
+    rentals do not count. The condition is served by the ix_rental_live_car_period partial index.
+
+    Args:
+        car_id: The ID of the car, or a column to correlate with.
+        start (date): The start date of the period.
+        end (date): The end date of the period.
+    """
+    return and_(
+        Rental.car_id == car_id,
+        Rental.rental_end_date > start,
+        Rental.rental_start_date < end,
+        Rental.deleted_at.is_(None)
+    )
+
+
+def has_overlap(session, car_id: int, start: date, end: date) -> bool:
+    """
+    Checks whether a car has a rental overlapping the given period.
+    """
+    return session.query(exists().where(overlap_condition(car_id, start, end))).scalar()
+
+
+def available_condition(start: date, end: date):
+    """
+    Builds the condition matching the cars that have no rental overlapping the given period.
+
+    Each car is checked with a correlated NOT EXISTS that seeks the ix_rental_live_car_period index,
+    so the rental table is never scanned.
+    """
+    return not_(exists().where(overlap_condition(Car.id, start, end)))
+
+
+def available_cars(session, start: date, end: date):
+    """
+    Returns a query of the cars that have no rental overlapping the given period (see available_condition).
+    """
+    return session.query(Car).filter(available_condition(start, end))
+
+
+def lock_car(session, car_id: int) -> int:
+    """
+    Takes the write lock for the rentals of a car, for the rest of the transaction, with an UPDATE of the car that
+    changes nothing.
+
+    On SQLite the UPDATE takes the database write lock, and on PostgreSQL the lock of the car row. Running it before
+    the overlap check makes the check and the insert of a rental atomic, even across several workers.
+
+    Returns:
+        int: The number of locked cars, 0 when the car does not exist.
+    """
+    result = session.execute(
+        update(Car).where(Car.id == car_id).values(id=Car.id).execution_options(synchronize_session=False)
+    )
+    return result.rowcount
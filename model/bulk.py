@@ -0,0 +1,84 @@
+from functools import partial
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+BULK_BATCH_SIZE = 500
+
+
+def batches(rows, size: int = BULK_BATCH_SIZE):
+    """
+    Splits a list of rows into consecutive batches of at most `size` rows.
+    """
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def insert_rows(session, model, rows) -> list:
+    """
+    Inserts rows with a single executemany statement in the current transaction, without committing.
+
+    Returns:
+        List[int]: The ID of each inserted row, in the order of `rows`.
+    """
+    if not rows:
+        return []
+    statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+    return list(session.execute(statement, rows).scalars())
+
+
+def bulk_write(run, job, items):
+    """
+    Runs a write job over a batch of items in a single transaction.
+
+    If the batch violates a constraint, the job is run again for each item on its own, each in its own
+    transaction, so that only the conflicting items are rejected. The job runs again from the start, so whatever
+    it checks before writing is checked again.
+
+    Args:
+        run (callable): Runs a write job and commits it, e.g. model.run_write.
+        job (callable): Called with a session and a list of items; performs its writes without committing and
+            returns one result per item.
+        items (list): The items of the batch.
+
+    Returns:
+        list: The result of each item, in the order of `items`, or None for items rejected by a constraint.
+    """
+    if not items:
+        return []
+    try:
+        return run(partial(job, items=items))
+    except IntegrityError:
+        pass
+
+    results = []
+    for item in items:
+        try:
+            results.extend(run(partial(job, items=[item])))
+        except IntegrityError:
+            results.append(None)
+    return results
+
+
+def bulk_insert(run, model, rows, before_commit=None):
+    """
+    Inserts a batch of rows with a single executemany statement, in one transaction (see bulk_write).
+
+    Args:
+        run (callable): Runs a write job and commits it, e.g. model.run_write.
+        model: The mapped class of the rows (Car, User or Rental).
+        rows (List[dict]): The column values of each row.
+        before_commit (callable): Called with the session and the inserted rows, with their "id", before each
+            commit, to write what depends on them in the same transaction.
+
+    Returns:
+        List[Optional[int]]: The ID of each inserted row, in the order of `rows`, or None for rows rejected by
+        a constraint. The batch is committed.
+    """
+    def insert_batch(session, items):
+        ids = insert_rows(session, model, items)
+        if before_commit is not None:
+            before_commit(session, [{**row, "id": row_id} for row, row_id in zip(items, ids)])
+        return ids
+
+    return bulk_write(run, insert_batch, rows)
@@ -1,12 +1,14 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from typing import Optional
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Numeric
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Date, DateTime, Numeric, Index, bindparam, exists
+from sqlalchemy.orm import relationship, column_property
 
 from model import Base
+from model.rental import Rental
+from model.softdelete import SoftDeleteMixin, LIVE
 
-class Car(Base):
+class Car(SoftDeleteMixin, Base):
     __tablename__ = 'car'
 
     id = Column(Integer, primary_key=True, index=True)
@@ -14,18 +16,41 @@ class Car(Base):
     model = Column(String, nullable=False)
     year = Column(Integer, nullable=False)
     price_per_day = Column(Numeric(10, 2), nullable=False)
-    availability_status = Column(Boolean, default=True, nullable=False)
     date_added = Column(DateTime, default=datetime.now)
 
     rentals = relationship("Rental", back_populates="car")
 
+    # Whether none of the live rentals of the car covers today (see model.booking.overlap_condition). It is derived
+    # from the rentals when it is read, with the date of the query, so it never goes stale as days pass. One seek of
+    # the ix_rental_live_car_period index; deferred so it is only computed when a loader profile asks for it.
+    available_today = column_property(
+        ~exists().where(
+            Rental.car_id == id,
+            Rental.rental_end_date > bindparam("today", callable_=date.today, type_=Date, unique=True),
+            Rental.rental_start_date < bindparam(
+                "tomorrow", callable_=lambda: date.today() + timedelta(days=1), type_=Date, unique=True
+            ),
+            Rental.deleted_at.is_(None)
+        ).correlate_except(Rental),
+        deferred=True
+    )
+
+    # Secondary indexes of the filters of GET /cars (see model.search). The rowid (id) is implicitly the last
+    # column of each of them, so an equality filter also yields its rows in ID order for keyset pagination.
+    # They are partial: they only cover the live (not soft deleted) cars.
+    __table_args__ = (
+        Index("ix_car_live_make_model", "make", "model", sqlite_where=LIVE, postgresql_where=LIVE),
+        Index("ix_car_live_model", "model", sqlite_where=LIVE, postgresql_where=LIVE),
+        Index("ix_car_live_year", "year", sqlite_where=LIVE, postgresql_where=LIVE),
+        Index("ix_car_live_price_per_day", "price_per_day", sqlite_where=LIVE, postgresql_where=LIVE),
+    )
+
     def __init__(
         self, 
         make: str, 
         model: str, 
         year: int, 
         price_per_day: float, 
-        availability_status: bool = True, 
         date_added: Optional[datetime] = None
     ):
         """
@@ -36,13 +61,11 @@ class Car(Base):
             model (str): The model of the car (e.g., Camry, Focus).
             year (int): The year the car was manufactured.
             price_per_day (float): The rental price per day in currency units.
-            availability_status (bool): The availability status of the car for rental (default is True).
             date_added (Optional[datetime]): The date and time when the car was added to the database.
         """
         self.make = make
         self.model = model
         self.year = year
         self.price_per_day = price_per_day
-        self.availability_status = availability_status
         self.date_added = date_added if date_added else datetime.now()
         
\ No newline at end of file
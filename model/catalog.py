@@ -0,0 +1,157 @@
+import re
+from collections import Counter
+from typing import List, Optional
+
+from sqlalchemy import Column, Integer, String, UniqueConstraint, bindparam, func, select, text, tuple_, update
+
+from model.base import Base
+from model.car import Car
+from model.loaders import with_profile
+from model.report import upsert_counters
+
+# Search terms are runs of letters and digits; each one matches the words of the make or model it starts.
+SEARCH_TERM = re.compile(r"\w+")
+MAX_SEARCH_TERMS = 8
+
+# The FTS5 index of the catalogue, one row per make and model, with the rowid of its CarModel row. Words are
+# matched without case or diacritics, and prefixes of up to 3 characters have their own index, so type-ahead
+# queries of a letter or two stay as cheap as longer ones.
+CREATE_SEARCH_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS car_search USING fts5("
+    "make, model, tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')"
+)
+
+
+class CarModel(Base):
+    """
+    A make and model of the catalogue, with its number of live cars.
+
+    A catalogue of a million cars has a few thousand makes and models, so the search ranks them instead of the
+    cars, and the cars of the best ones are then read through the ix_car_live_make_model index. The rows are
+    maintained by record_cars, in the transaction that inserts or deletes the cars, and are kept at zero cars
+    rather than deleted; only the makes and models with cars are in the search index.
+    """
+    __tablename__ = 'car_model'
+
+    id = Column(Integer, primary_key=True)
+    make = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    cars = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("make", "model", name="uq_car_model_make_model"),
+    )
+
+
+def record_cars(session, cars, sign: int = 1):
+    """
+    Adds cars to the catalogue and its search index, or removes them with a sign of -1, in the current transaction.
+
+    A make and model enters the search index when its count rises from zero, and leaves it when its count falls to
+    zero. Counts never fall below zero, and removing cars of a make and model missing from the catalogue does
+    nothing.
+
+    Args:
+        session (Session): The session to write with.
+        cars (List[dict]): The make and model of each car.
+        sign (int): 1 when the cars were inserted, -1 when they were deleted.
+    """
+    counts = Counter((car["make"], car["model"]) for car in cars)
+    if not counts:
+        return
+    pair_column = tuple_(CarModel.make, CarModel.model)
+    existing = {
+        (row.make, row.model): row
+        for row in session.execute(
+            select(CarModel.id, CarModel.make, CarModel.model, CarModel.cars).where(pair_column.in_(list(counts)))
+        )
+    }
+
+    if sign < 0:
+        removed = [(existing[pair], count) for pair, count in counts.items() if pair in existing]
+        if not removed:
+            return
+        # An executemany of the table, not of the model: the ORM has no bulk UPDATE by a bound parameter.
+        table = CarModel.__table__
+        session.execute(
+            update(table).where(table.c.id == bindparam("model_id"))
+            .values(cars=func.max(table.c.cars - bindparam("count"), 0)),
+            [{"model_id": row.id, "count": count} for row, count in removed]
+        )
+        emptied = [{"id": row.id} for row, count in removed if 0 < row.cars <= count]
+        if emptied:
+            session.execute(text("DELETE FROM car_search WHERE rowid = :id"), emptied)
+        return
+
+    upsert_counters(session, CarModel, ["make", "model"], [
+        {"make": make, "model": model, "cars": count} for (make, model), count in counts.items()
+    ])
+
+    indexed_pairs = [pair for pair in counts if pair not in existing or existing[pair].cars <= 0]
+    if indexed_pairs:
+        rows = session.execute(
+            select(CarModel.id, CarModel.make, CarModel.model).where(pair_column.in_(indexed_pairs))
+        )
+        session.execute(
+            text("INSERT INTO car_search (rowid, make, model) VALUES (:id, :make, :model)"),
+            [row._asdict() for row in rows]
+        )
+
+
+def rebuild_catalog(session):
+    """
+    Recomputes the catalogue and its search index from the live cars, in the current transaction.
+
+    It reads the whole car table, so it is only run by the migrations that create or repair the catalogue.
+    """
+    session.execute(text("DELETE FROM car_search"))
+    session.query(CarModel).delete()
+    session.execute(text(
+        "INSERT INTO car_model (make, model, cars) "
+        "SELECT make, model, count(*) FROM car WHERE deleted_at IS NULL GROUP BY make, model"
+    ))
+    session.execute(text(
+        "INSERT INTO car_search (rowid, make, model) SELECT id, make, model FROM car_model WHERE cars > 0"
+    ))
+
+
+def match_query(q: str) -> Optional[str]:
+    """
+    Builds the FTS5 query of a search: every term must start a word of the make or the model, in any order.
+
+    Returns:
+        Optional[str]: The query, or None when the search has no terms.
+    """
+    terms = SEARCH_TERM.findall(q.lower())[:MAX_SEARCH_TERMS]
+    return " ".join(f'"{term}"*' for term in terms) or None
+
+
+def search_models(session, q: str, limit: int) -> list:
+    """
+    Returns the makes and models matching a search, best first: by BM25 relevance, then by number of cars.
+    """
+    query = match_query(q)
+    if query is None:
+        return []
+    return session.execute(text(
+        "SELECT car_model.make, car_model.model FROM car_search JOIN car_model ON car_model.id = car_search.rowid "
+        "WHERE car_search MATCH :query AND car_model.cars > 0 "
+        "ORDER BY car_search.rank, car_model.cars DESC LIMIT :limit"
+    ), {"query": query, "limit": limit}).all()
+
+
+def search_cars(session, q: str, limit: int) -> List[Car]:
+    """
+    Returns up to `limit` cars matching a search, the cars of the best make and model first, each by ID.
+
+    The cars of each make and model are read with a seek of ix_car_live_make_model, until the limit is reached,
+    so the cost does not depend on the size of the catalogue.
+    """
+    cars = []
+    for make, model in search_models(session, q, limit):
+        cars += with_profile(session.query(Car), "car_list").filter(
+            Car.make == make, Car.model == model, Car.deleted_at.is_(None)
+        ).order_by(Car.id).limit(limit - len(cars)).all()
+        if len(cars) >= limit:
+            break
+    return cars
@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, func, insert, select, update
+
+import config
+from model.base import Base
+
+logger = logging.getLogger(__name__)
+
+# The columns of each entity carried by its insert changes; the password of a user never leaves the user table.
+CHANGE_COLUMNS = {
+    "user": ("id", "name", "email", "driver_license_number"),
+    "car": ("id", "make", "model", "year", "price_per_day"),
+    "rental": ("id", "user_id", "car_id", "rental_start_date", "rental_end_date", "total_price"),
+}
+
+
+class Change(Base):
+    """
+    An insert or delete of a user, car or rental, in the append-only change log.
+
+    The change is written in the transaction of the write itself, so it is committed with it or not at all. Its
+    sequence number is assigned while the transaction holds the SQLite write lock, so the changes are numbered in
+    commit order, without gaps, and a consumer that has read up to a number never misses a change committed later
+    with a lower one. Changes are only removed from the start of the log (see sweep_changes).
+    """
+    __tablename__ = 'change'
+
+    seq = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)
+    # The JSON values of the CHANGE_COLUMNS of an inserted row; None for deletes, and for the inserts compacted
+    # by a later delete of their row.
+    data = Column(Text)
+    changed_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Serves the compaction of the changes of a deleted row.
+        Index("ix_change_entity", "entity", "entity_id"),
+        # Serves the retention of the sweeper.
+        Index("ix_change_changed_at", "changed_at"),
+    )
+
+
+def record_changes(session, entity: str, op: str, rows, compact: bool = config.CHANGES_COMPACT):
+    """
+    Appends the inserts or deletes of rows of an entity to the change log, in the current transaction.
+
+    With `compact`, a delete also drops the data of the earlier changes of its row, which a consumer reading them
+    after the delete no longer needs, while keeping their sequence numbers.
+
+    Args:
+        session (Session): The session to write with.
+        entity (str): "user", "car" or "rental".
+        op (str): "insert" or "delete".
+        rows (List[dict]): The column values of each inserted row, or the id of each deleted one.
+        compact (bool): Whether deletes compact the earlier changes of their rows.
+    """
+    if not rows:
+        return
+    if op == "delete" and compact:
+        session.execute(
+            update(Change)
+            .where(Change.entity == entity, Change.entity_id.in_([row["id"] for row in rows]), Change.data.isnot(None))
+            .values(data=None)
+        )
+    now = datetime.now()
+    session.execute(insert(Change), [{
+        "entity": entity,
+        "entity_id": row["id"],
+        "op": op,
+        "data": json.dumps({name: row.get(name) for name in CHANGE_COLUMNS[entity]}, default=str)
+        if op == "insert" else None,
+        "changed_at": now,
+    } for row in rows])
+
+
+def changes_after(since: int, limit: int):
+    """Builds the query of the first `limit` changes after a sequence number, served by the primary key."""
+    return select(Change).where(Change.seq > since).order_by(Change.seq).limit(limit)
+
+
+def log_bounds_query():
+    """Builds the query of the first and last sequence numbers of the log, both None when it is empty."""
+    return select(func.min(Change.seq), func.max(Change.seq))
+
+
+def log_bounds(session) -> tuple:
+    """Returns the first and last sequence numbers of the log, or (None, None) when it is empty."""
+    return tuple(session.execute(log_bounds_query()).one())
+
+
+def is_purged(first_seq: Optional[int], since: int) -> bool:
+    """Checks whether changes after a sequence number were removed from the log, so a consumer there must resync."""
+    return first_seq is not None and since < first_seq - 1
+
+
+def sweep_changes(session, retention_days: int, max_changes: int, now: Optional[datetime] = None) -> int:
+    """
+    Deletes the changes older than `retention_days` days and, beyond `max_changes`, the oldest ones, in the
+    current transaction. A limit of 0 disables it. The last change is always kept, so numbers are never reused.
+
+    Returns:
+        int: The number of deleted changes.
+    """
+    now = now or datetime.now()
+    last_seq = session.query(func.max(Change.seq)).scalar()
+    if last_seq is None:
+        return 0
+    cutoff_seq = 0
+    if retention_days:
+        cutoff_seq = session.query(func.max(Change.seq)).filter(
+            Change.changed_at < now - timedelta(days=retention_days)
+        ).scalar() or 0
+    if max_changes:
+        cutoff_seq = max(cutoff_seq, last_seq - max_changes)
+    cutoff_seq = min(cutoff_seq, last_seq - 1)
+    if cutoff_seq <= 0:
+        return 0
+    return session.query(Change).filter(Change.seq <= cutoff_seq).delete(synchronize_session=False)
+
+
+class ChangeSweeper:
+    """
+    Deletes the changes past the retention limits on a background thread, every `interval` seconds.
+
+    Like the write queue, the thread is started lazily, so that each forked worker process gets its own. Sweeps
+    of several workers delete the same rows, which is harmless.
+    """
+
+    def __init__(self, session_factory, interval: float = 3600, retention_days: int = 7, max_changes: int = 0):
+        """
+        Initialize a ChangeSweeper instance.
+
+        Args:
+            session_factory (sessionmaker): Creates the session of the sweeper thread.
+            interval (float): The time between two sweeps, in seconds.
+            retention_days (int): The days a change is kept, or 0 to keep them regardless of age.
+            max_changes (int): The maximum number of changes kept, or 0 for no maximum.
+        """
+        self.session_factory = session_factory
+        self.interval = interval
+        self.retention_days = retention_days
+        self.max_changes = max_changes
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    def start(self):
+        """
+        Starts the sweeper thread of the current process, if it is not running yet.
+        """
+        if self.pid == os.getpid() and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self.loop, name="change-sweeper", daemon=True)
+                self.thread.start()
+
+    def sweep(self) -> int:
+        """
+        Runs one sweep in its own transaction and returns the number of deleted changes.
+        """
+        session = self.session_factory()
+        try:
+            deleted = sweep_changes(session, self.retention_days, self.max_changes)
+            session.commit()
+            return deleted
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def loop(self):
+        """
+        Sweeps the changes, forever. A failed sweep (e.g. the database is busy) is retried at the next interval.
+        """
+        while True:
+            try:
+                deleted = self.sweep()
+                if deleted:
+                    logger.info("Deleted %s changes", deleted)
+            except Exception as e:
+                logger.warning("Error sweeping changes: %s", e)
+            time.sleep(self.interval)
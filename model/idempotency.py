@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import Column, String, Text, DateTime, Index, func
+
+from model.base import Base
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyKey(Base):
+    """
+    The response of a write request sent with an Idempotency-Key header, kept until it expires.
+
+    The record is inserted in the transaction of the write itself, so a write and its record are committed
+    together or not at all, and its primary key lets only one of two concurrent requests with the same key commit.
+    """
+    __tablename__ = 'idempotency_key'
+
+    scope = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    request_hash = Column(String, nullable=False)
+    response = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Serves the sweeper, which deletes the expired keys and then the ones expiring first.
+        Index("ix_idempotency_key_expires_at", "expires_at"),
+    )
+
+
+def find_response(session, scope: str, key: str, now: Optional[datetime] = None) -> Optional[IdempotencyKey]:
+    """
+    Returns the stored response of a key of an endpoint, or None when there is none or it has expired.
+    """
+    now = now or datetime.now()
+    return session.query(IdempotencyKey).filter(
+        IdempotencyKey.scope == scope, IdempotencyKey.key == key, IdempotencyKey.expires_at > now
+    ).first()
+
+
+def store_response(session, scope: str, key: str, request_hash: str, response: str, ttl: int):
+    """
+    Stores the response of a key of an endpoint in the current transaction, replacing an expired one.
+
+    Raises:
+        IntegrityError: When another request with the same key committed first.
+    """
+    now = datetime.now()
+    session.query(IdempotencyKey).filter(
+        IdempotencyKey.scope == scope, IdempotencyKey.key == key, IdempotencyKey.expires_at <= now
+    ).delete(synchronize_session=False)
+    session.add(IdempotencyKey(
+        scope=scope, key=key, request_hash=request_hash, response=response, expires_at=now + timedelta(seconds=ttl)
+    ))
+    session.flush()
+
+
+def sweep_keys(session, max_keys: int, now: Optional[datetime] = None) -> int:
+    """
+    Deletes the expired keys and, beyond `max_keys`, the keys expiring first, in the current transaction.
+
+    Returns:
+        int: The number of deleted keys.
+    """
+    now = now or datetime.now()
+    deleted = session.query(IdempotencyKey).filter(IdempotencyKey.expires_at <= now).delete(synchronize_session=False)
+    if session.query(func.count()).select_from(IdempotencyKey).scalar() > max_keys:
+        cutoff = session.query(IdempotencyKey.expires_at).order_by(IdempotencyKey.expires_at.desc()) \
+            .offset(max_keys).limit(1).scalar()
+        deleted += session.query(IdempotencyKey).filter(IdempotencyKey.expires_at <= cutoff) \
+            .delete(synchronize_session=False)
+    return deleted
+
+
+class KeySweeper:
+    """
+    Deletes expired idempotency keys on a background thread, every `interval` seconds.
+
+    Like the write queue, the thread is started lazily, so that each forked worker process gets its own. Sweeps
+    of several workers delete the same rows, which is harmless.
+    """
+
+    def __init__(self, session_factory, interval: float = 60, max_keys: int = 100000):
+        """
+        Initialize a KeySweeper instance.
+
+        Args:
+            session_factory (sessionmaker): Creates the session of the sweeper thread.
+            interval (float): The time between two sweeps, in seconds.
+            max_keys (int): The maximum number of keys kept; the ones expiring first are deleted beyond it.
+        """
+        self.session_factory = session_factory
+        self.interval = interval
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    def start(self):
+        """
+        Starts the sweeper thread of the current process, if it is not running yet.
+        """
+        with self.lock:
+            if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self.loop, name="idempotency-sweeper", daemon=True)
+                self.thread.start()
+
+    def sweep(self) -> int:
+        """
+        Runs one sweep in its own transaction and returns the number of deleted keys.
+        """
+        session = self.session_factory()
+        try:
+            deleted = sweep_keys(session, self.max_keys)
+            session.commit()
+            return deleted
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def loop(self):
+        """
+        Sweeps the keys, forever. A failed sweep (e.g. the database is busy) is retried at the next interval.
+        """
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning("Error sweeping idempotency keys: %s", e)
@@ -0,0 +1,48 @@
+from sqlalchemy.orm import selectinload, raiseload, undefer
+
+from model.car import Car
+from model.user import User
+from model.rental import Rental
+
+# Loader strategies used by each endpoint. Relationships an endpoint does not present are set to raiseload,
+# so an accidental lazy load (one extra query per row) fails loudly instead of silently slowing the endpoint.
+LOADER_PROFILES = {
+    "user_detail": (
+        undefer(User.total_rentals),
+        selectinload(User.rentals).load_only(
+            Rental.user_id, Rental.car_id, Rental.rental_start_date, Rental.rental_end_date
+        ),
+    ),
+    "user_list": (
+        raiseload(User.rentals),
+    ),
+    "car_detail": (
+        undefer(Car.available_today),
+        raiseload(Car.rentals),
+    ),
+    "car_list": (
+        raiseload(Car.rentals),
+    ),
+    "rental_detail": (
+        raiseload(Rental.user),
+        raiseload(Rental.car),
+    ),
+    "rental_list": (
+        raiseload(Rental.user),
+        raiseload(Rental.car),
+    ),
+}
+
+
+def with_profile(query, profile: str):
+    """
+    Applies the loader strategies of a profile to a query.
+
+    Args:
+        query (Query): The query to load with the profile.
+        profile (str): The name of the profile, a key of LOADER_PROFILES.
+
+    Returns:
+        Query: The query with the loader options applied.
+    """
+    return query.options(*LOADER_PROFILES[profile])
@@ -0,0 +1,344 @@
+"""
+Versioned schema migrations.
+
+Each migration is a module of this package named v<version>_<name>.py (e.g. v0001_baseline.py) with an
+upgrade(op) function, which changes the schema through the Operations it is given. The migrations are applied in
+order of version by `python -m model.migrations upgrade`, and each applied version is recorded in the
+schema_migration table, so a database is only ever upgraded from where it stands.
+
+The baseline creates the tables and indexes that existed before migrations, and each later migration creates its
+own. Tables are created from their models, so one created by the baseline already has the columns a later migration
+adds to it; the operations are idempotent, and skip the tables, columns and indexes that already exist. Long
+operations (index builds, backfills) run in their own short transactions, so the API keeps serving while a migration
+runs.
+"""
+import importlib
+import logging
+import os
+import pkgutil
+import re
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import Column, Integer, String, DateTime, MetaData, UniqueConstraint, inspect, select, update, \
+    bindparam, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy_utils import database_exists, create_database
+
+from model.base import Base
+
+logger = logging.getLogger(__name__)
+
+MODULE_NAME = re.compile(r"^v(\d+)_(\w+)$")
+
+
+class SchemaMigration(Base):
+    """A migration applied to the database."""
+    __tablename__ = 'schema_migration'
+
+    version = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)
+    applied_at = Column(DateTime, nullable=False, default=datetime.now)
+
+
+class Migration:
+    """A migration module of this package."""
+
+    def __init__(self, version: int, name: str, module):
+        self.version = version
+        self.name = name
+        self.module = module
+
+    @property
+    def description(self) -> str:
+        """The first line of the docstring of the migration module."""
+        return (self.module.__doc__ or self.name).strip().splitlines()[0]
+
+
+def migrations() -> List[Migration]:
+    """Returns every migration of this package, ordered by version."""
+    found = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = MODULE_NAME.match(module_info.name)
+        if match:
+            module = importlib.import_module(f"{__name__}.{module_info.name}")
+            found.append(Migration(int(match.group(1)), match.group(2), module))
+    found.sort(key=lambda migration: migration.version)
+    return found
+
+
+class Operations:
+    """
+    The schema operations available to a migration.
+
+    Every operation commits on its own; none of them runs inside a transaction held for the whole migration, which
+    would hold the write lock for as long as the migration runs.
+    """
+
+    def __init__(self, engine, batch_size: int = 1000, pause: float = 0.05):
+        """
+        Initialize an Operations instance.
+
+        Args:
+            engine (Engine): The engine of the database to migrate.
+            batch_size (int): The number of rows updated per transaction by a backfill.
+            pause (float): The time between two batches of a backfill, in seconds.
+        """
+        self.engine = engine
+        self.batch_size = batch_size
+        self.pause = pause
+
+    def has_table(self, table_name: str) -> bool:
+        """Returns whether a table exists."""
+        return inspect(self.engine).has_table(table_name)
+
+    def has_column(self, table_name: str, column_name: str) -> bool:
+        """Returns whether a table has a column."""
+        return any(column["name"] == column_name for column in inspect(self.engine).get_columns(table_name))
+
+    def execute(self, statement, parameters=None):
+        """Runs a statement (SQL text or a SQLAlchemy statement) in its own transaction."""
+        if isinstance(statement, str):
+            statement = text(statement)
+        with self.engine.begin() as connection:
+            return connection.execute(statement, parameters)
+
+    def create_tables(self, *models, indexes: bool = True):
+        """
+        Creates the tables of the models (or tables; every model when none is given) that do not exist yet, with
+        their indexes unless `indexes` is false, for a migration that builds only some of them (see create_indexes).
+        """
+        tables = [getattr(model, "__table__", model) for model in models] or None
+        if indexes:
+            Base.metadata.create_all(self.engine, tables=tables)
+            return
+        for table in Base.metadata.sorted_tables:
+            if (tables is None or table in tables) and not self.has_table(table.name):
+                self.execute(CreateTable(table))
+
+    def has_index(self, table_name: str, index_name: str) -> bool:
+        """Returns whether a table has an index."""
+        return any(index["name"] == index_name for index in inspect(self.engine).get_indexes(table_name))
+
+    def add_column(self, model, column_name: str):
+        """
+        Adds a column declared on a model (or table) to its table, if the table does not have it yet.
+
+        The column must be nullable or have a server default: adding it then only changes the table definition,
+        whatever the size of the table, and the existing rows can be filled later with backfill.
+        """
+        table = getattr(model, "__table__", model)
+        if self.has_column(table.name, column_name):
+            return
+        column = table.c[column_name]
+        definition = f'"{column.name}" {column.type.compile(self.engine.dialect)}'
+        if column.server_default is not None:
+            definition += f" DEFAULT {column.server_default.arg}"
+        logger.info("Adding column %s.%s", table.name, column_name)
+        self.execute(f'ALTER TABLE "{table.name}" ADD COLUMN {definition}')
+
+    def create_index(self, index):
+        """
+        Builds an index declared on a model, if it does not exist yet.
+
+        On PostgreSQL the index is built concurrently, so writes to the table go on during the build. SQLite has
+        no such option: the build holds the write lock, while readers go on under WAL, and writers wait for it up
+        to the busy timeout.
+        """
+        if self.has_index(index.table.name, index.name):
+            return
+        concurrently = self.engine.dialect.name == "postgresql"
+        logger.info("Building index %s", index.name)
+        with self.engine.connect() as connection:
+            if concurrently:
+                # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+                connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+                index.dialect_options["postgresql"]["concurrently"] = True
+            try:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+                connection.commit()
+            finally:
+                if concurrently:
+                    index.dialect_options["postgresql"]["concurrently"] = False
+
+    def create_indexes(self, *models, names=None):
+        """
+        Builds the indexes declared on the models (or tables; every model when none is given) that do not exist
+        yet, only those of `names` when it is given.
+        """
+        tables = [getattr(model, "__table__", model) for model in models] or Base.metadata.sorted_tables
+        for table in tables:
+            for index in table.indexes:
+                if names is None or index.name in names:
+                    self.create_index(index)
+
+    def drop_index(self, index_name: str):
+        """Drops an index, if it exists."""
+        self.execute(f'DROP INDEX IF EXISTS "{index_name}"')
+
+    def drop_column(self, table_name: str, column_name: str):
+        """
+        Drops a column that is no longer declared on its model, if the table still has it. The indexes on the column
+        must be dropped first. SQLite rewrites the table to drop the column, holding the write lock meanwhile.
+        """
+        if not self.has_column(table_name, column_name):
+            return
+        logger.info("Dropping column %s.%s", table_name, column_name)
+        self.execute(f'ALTER TABLE "{table_name}" DROP COLUMN "{column_name}"')
+
+    def drop_unique_constraints(self, model):
+        """
+        Drops the unique constraints of a table that its model (or table) no longer declares.
+
+        SQLite cannot drop a constraint, so the table is rebuilt from its model instead (see rebuild_table).
+        """
+        table = getattr(model, "__table__", model)
+        declared = {
+            tuple(column.name for column in constraint.columns)
+            for constraint in table.constraints if isinstance(constraint, UniqueConstraint)
+        }
+        obsolete = [
+            constraint for constraint in inspect(self.engine).get_unique_constraints(table.name)
+            if tuple(constraint["column_names"]) not in declared
+        ]
+        if not obsolete:
+            return
+        if self.engine.dialect.name == "sqlite":
+            self.rebuild_table(table)
+            return
+        for constraint in obsolete:
+            logger.info("Dropping constraint %s", constraint["name"])
+            self.execute(f'ALTER TABLE "{table.name}" DROP CONSTRAINT "{constraint["name"]}"')
+
+    def rebuild_table(self, model):
+        """
+        Rebuilds a SQLite table from its model (or table), for the changes SQLite cannot make in place.
+
+        The rows are copied into a new table created from the model, which then replaces the old one, and the indexes
+        of the model are built on it. The columns the model no longer declares are dropped. It runs in a single
+        transaction, which holds the write lock while the rows are copied.
+        """
+        table = getattr(model, "__table__", model)
+        metadata = MetaData()
+        for other in Base.metadata.sorted_tables:
+            other.to_metadata(metadata)
+        rebuilt = table.to_metadata(metadata, name=f"{table.name}_rebuilt")
+        columns = ", ".join(
+            f'"{column["name"]}"' for column in inspect(self.engine).get_columns(table.name)
+            if column["name"] in table.c
+        )
+        logger.info("Rebuilding table %s", table.name)
+        with self.engine.begin() as connection:
+            # The driver would only begin the transaction at the INSERT, leaving the DDL outside of it.
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            connection.execute(CreateTable(rebuilt))
+            connection.exec_driver_sql(
+                f'INSERT INTO "{rebuilt.name}" ({columns}) SELECT {columns} FROM "{table.name}"'
+            )
+            connection.exec_driver_sql(f'DROP TABLE "{table.name}"')
+            connection.exec_driver_sql(f'ALTER TABLE "{rebuilt.name}" RENAME TO "{table.name}"')
+            for index in table.indexes:
+                connection.execute(CreateIndex(index))
+
+    def backfill(self, model, values, where=None) -> int:
+        """
+        Updates the rows of a table in batches of `batch_size` rows, one short transaction each, pausing between
+        batches.
+
+        The rows are walked by ID, so each batch starts where the previous one ended, and the migration can be
+        run again after an interruption when `where` excludes the rows already filled. The values computed in Python
+        are computed before the write transaction of their batch begins, so it stays short.
+
+        Args:
+            model: The model (or table) to update.
+            values (dict or callable): The new values of the columns, as SQL expressions; or, for values computed in
+                Python, a function taking the rows of a batch and returning the new values of each row.
+            where: An optional condition on the rows to update.
+
+        Returns:
+            int: The number of updated rows.
+        """
+        table = getattr(model, "__table__", model)
+        key = table.c.id
+        total, last = 0, None
+        while True:
+            query = select(table).order_by(key).limit(self.batch_size)
+            if last is not None:
+                query = query.where(key > last)
+            if where is not None:
+                query = query.where(where)
+            with self.engine.connect() as connection:
+                rows = connection.execute(query).all()
+            if not rows:
+                return total
+            # The condition is checked again by the update, so the rows changed since they were read are skipped.
+            condition = [where] if where is not None else []
+            changes = values(rows) if callable(values) else None
+            with self.engine.begin() as connection:
+                if changes is not None:
+                    statement = update(table).where(key == bindparam("row_id"), *condition).values(
+                        {name: bindparam(f"new_{name}") for name in changes[0]}
+                    )
+                    connection.execute(statement, [
+                        {"row_id": row.id, **{f"new_{name}": value for name, value in change.items()}}
+                        for row, change in zip(rows, changes)
+                    ])
+                else:
+                    connection.execute(update(table).where(key.in_([row.id for row in rows]), *condition).values(values))
+            total += len(rows)
+            last = rows[-1].id
+            logger.info("Backfilled %s rows of %s", total, table.name)
+            time.sleep(self.pause)
+
+
+def prepare_database(engine):
+    """Creates the database, and the directory of a SQLite database, if they do not exist."""
+    if engine.dialect.name == "sqlite" and engine.url.database:
+        directory = os.path.dirname(engine.url.database)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+    if not database_exists(engine.url):
+        create_database(engine.url)
+
+
+def applied_versions(engine) -> set:
+    """Returns the versions of the migrations applied to the database."""
+    if not inspect(engine).has_table(SchemaMigration.__tablename__):
+        return set()
+    with engine.connect() as connection:
+        return set(connection.execute(select(SchemaMigration.version)).scalars())
+
+
+def pending_migrations(engine) -> List[Migration]:
+    """Returns the migrations not applied to the database yet, ordered by version."""
+    applied = applied_versions(engine)
+    return [migration for migration in migrations() if migration.version not in applied]
+
+
+def upgrade(engine, target: Optional[int] = None, batch_size: int = 1000, pause: float = 0.05) -> List[Migration]:
+    """
+    Applies the pending migrations, up to the `target` version (every pending migration when it is None).
+
+    A migration is recorded once it has completed; if it fails, it is run again by the next upgrade.
+
+    Returns:
+        List[Migration]: The applied migrations.
+    """
+    prepare_database(engine)
+    SchemaMigration.__table__.create(engine, checkfirst=True)
+    operations = Operations(engine, batch_size=batch_size, pause=pause)
+    applied = []
+    for migration in pending_migrations(engine):
+        if target is not None and migration.version > target:
+            break
+        logger.info("Applying migration %04d %s", migration.version, migration.name)
+        migration.module.upgrade(operations)
+        with engine.begin() as connection:
+            connection.execute(
+                SchemaMigration.__table__.insert().values(
+                    version=migration.version, name=migration.name, applied_at=datetime.now()
+                )
+            )
+        applied.append(migration)
+    return applied
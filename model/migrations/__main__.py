@@ -0,0 +1,43 @@
+"""
+Applies the schema migrations to the configured database, or shows which are applied.
+
+Usage:
+    python -m model.migrations upgrade [--to VERSION] [--batch-size 1000] [--pause-ms 50]
+    python -m model.migrations status
+
+The migrations can be applied while the API is serving: index builds and backfills commit in short transactions.
+"""
+import argparse
+import logging
+
+import config
+from model import engine
+from model.migrations import migrations, applied_versions, upgrade
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = commands.add_parser("upgrade", help="apply the pending migrations")
+    upgrade_parser.add_argument("--to", type=int, default=None, help="the last version to apply")
+    upgrade_parser.add_argument("--batch-size", type=int, default=config.MIGRATION_BATCH_SIZE,
+                                help="rows updated per transaction by a backfill")
+    upgrade_parser.add_argument("--pause-ms", type=int, default=config.MIGRATION_PAUSE_MS,
+                                help="pause between two batches of a backfill, in milliseconds")
+    commands.add_parser("status", help="list the migrations and whether they are applied")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.command == "upgrade":
+        applied = upgrade(engine, target=args.to, batch_size=args.batch_size, pause=args.pause_ms / 1000)
+        print(f"Applied {len(applied)} migrations")
+    else:
+        applied = applied_versions(engine)
+        for migration in migrations():
+            state = "applied" if migration.version in applied else "pending"
+            print(f"{migration.version:04d} {migration.name:<30} {state:<8} {migration.description}")
+
+
+if __name__ == "__main__":
+    main()
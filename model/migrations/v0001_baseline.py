@@ -0,0 +1,63 @@
+"""
+Creates the schema of the models, or brings a database created before migrations existed up to it.
+
+Before migrations, the schema was created by `create_all` when model was imported, and later the missing nullable
+columns and indexes were added the same way; this migration repeats those steps once, so it leaves any of those
+databases in the current state.
+
+The tables, columns and indexes are those that existed when migrations were introduced, listed by name: the objects
+added since then are created by the migrations that introduced them.
+"""
+
+BASELINE_TABLES = (
+    "user", "car", "rental", "rental_archive", "report_car", "report_user", "report_day", "pricing_rule",
+    "idempotency_key",
+)
+
+# The nullable columns of the baseline tables, which the databases created before them were missing.
+BASELINE_COLUMNS = {
+    "user": ("name", "email", "password", "driver_license_number", "date_added", "deleted_at"),
+    "car": ("date_added", "deleted_at"),
+    "rental": ("date_added", "deleted_at"),
+    "rental_archive": ("date_added", "deleted_at"),
+    "pricing_rule": ("start_date", "end_date", "min_days", "make", "model", "date_added"),
+}
+
+BASELINE_INDEXES = (
+    "ix_user_id",
+    "ix_car_id", "ix_car_live_model", "ix_car_live_make_model", "ix_car_live_year", "ix_car_live_price_per_day",
+    "ix_rental_id", "ix_rental_live_car_period", "ix_rental_live_user_id", "ix_rental_live_start_date",
+    "ix_rental_live_total_price",
+    "ix_idempotency_key_expires_at",
+)
+
+# Indexes replaced by the partial indexes of the live rows.
+OBSOLETE_INDEXES = (
+    "ix_rental_car_period", "ix_rental_user_id", "ix_rental_start_date", "ix_rental_total_price",
+    "ix_car_make_model", "ix_car_model", "ix_car_year", "ix_car_price_per_day", "ix_car_availability_status",
+)
+
+
+def upgrade(op):
+    from sqlalchemy.orm import Session
+
+    from model.base import Base
+    from model.report import DayReport, rebuild_reports
+
+    tables = [Base.metadata.tables[name] for name in BASELINE_TABLES]
+    reports_missing = not op.has_table(DayReport.__tablename__)
+    op.create_tables(*tables, indexes=False)
+
+    for table_name, column_names in BASELINE_COLUMNS.items():
+        for column_name in column_names:
+            op.add_column(Base.metadata.tables[table_name], column_name)
+    for name in OBSOLETE_INDEXES:
+        op.drop_index(name)
+    op.create_indexes(*tables, names=BASELINE_INDEXES)
+
+    # The summary tables are filled from the existing rentals once, when they are created; from then on they are
+    # maintained by the writes.
+    if reports_missing:
+        with Session(bind=op.engine) as session:
+            rebuild_reports(session)
+            session.commit()
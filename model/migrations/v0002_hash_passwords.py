@@ -0,0 +1,16 @@
+"""
+Hashes the passwords stored in plain text.
+
+The hashes are computed on the password hasher's pool, a batch at a time, before the batch is written.
+"""
+
+
+def upgrade(op):
+    from model.user import User
+    from passwords import SCHEME, hasher
+
+    def hash_batch(rows):
+        hashes = hasher.hash_many([row.password for row in rows])
+        return [{"password": encoded} for encoded in hashes]
+
+    op.backfill(User, hash_batch, where=User.password.notlike(f"{SCHEME}$%"))
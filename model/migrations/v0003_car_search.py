@@ -0,0 +1,20 @@
+"""
+Creates the catalogue of makes and models and its FTS5 search index, filled from the existing cars.
+
+FTS5 is part of the SQLite builds of Python; this migration is SQLite only.
+"""
+
+
+def upgrade(op):
+    from sqlalchemy import text
+    from sqlalchemy.orm import Session
+
+    from model.catalog import CarModel, CREATE_SEARCH_TABLE, rebuild_catalog
+
+    op.create_tables(CarModel)
+    op.execute(text(CREATE_SEARCH_TABLE))
+
+    # Filled whether or not the tables existed: a database created by an older baseline has them, empty.
+    with Session(bind=op.engine) as session:
+        rebuild_catalog(session)
+        session.commit()
@@ -0,0 +1,9 @@
+"""
+Indexes the deleted rentals by deletion time, for the occupancy calendar and the archiver.
+"""
+
+
+def upgrade(op):
+    from model.rental import Rental
+
+    op.create_indexes(Rental, names=("ix_rental_deleted_at",))
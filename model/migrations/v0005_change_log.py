@@ -0,0 +1,9 @@
+"""
+Creates the change log of the change feed. It starts empty: consumers load the tables once, then follow the feed.
+"""
+
+
+def upgrade(op):
+    from model.changelog import Change
+
+    op.create_tables(Change)
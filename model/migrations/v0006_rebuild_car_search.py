@@ -0,0 +1,16 @@
+"""
+Rebuilds the catalogue of makes and models and its search index from the live cars.
+
+Databases migrated by an earlier version 3 kept an empty catalogue when the baseline had created its table, and
+deleting cars then stored negative counts, which hid their makes and models from the search; this recomputes both.
+"""
+
+
+def upgrade(op):
+    from sqlalchemy.orm import Session
+
+    from model.catalog import rebuild_catalog
+
+    with Session(bind=op.engine) as session:
+        rebuild_catalog(session)
+        session.commit()
@@ -0,0 +1,9 @@
+"""
+Indexes the archived rentals by archival time, for the occupancy calendar of the workers that did not archive them.
+"""
+
+
+def upgrade(op):
+    from model.archive import RentalArchive
+
+    op.create_indexes(RentalArchive, names=("ix_rental_archive_archived_at",))
@@ -0,0 +1,8 @@
+"""
+Drops the stored availability status of the cars, which nothing reads: the API derives it from the rentals.
+"""
+
+
+def upgrade(op):
+    op.drop_index("ix_car_live_availability_status")
+    op.drop_column("car", "availability_status")
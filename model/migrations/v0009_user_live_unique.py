@@ -0,0 +1,12 @@
+"""
+Makes the email and the driver license number of a user unique among the live users only.
+
+A deleted user kept them reserved, so the same person could never register again.
+"""
+
+
+def upgrade(op):
+    from model.user import User
+
+    op.drop_unique_constraints(User)
+    op.create_indexes(User, names=("ix_user_live_email", "ix_user_live_driver_license_number"))
@@ -0,0 +1,73 @@
+from datetime import datetime, date
+from typing import Optional
+
+from sqlalchemy import Column, Integer, String, Date, DateTime, Numeric, func
+
+from model.base import Base
+
+class PricingRule(Base):
+    """
+    A rule of the pricing engine (see pricing.py). Each rule multiplies the price of a rental:
+
+    - season: every day from start_date up to the day before end_date (periods are half-open, like rentals).
+    - weekend: every Saturday and Sunday.
+    - long_stay: the whole rental, when it lasts at least min_days. Only the rule with the largest min_days
+      reached applies.
+    - model: the whole rental of a car of a make, or of a make and model.
+
+    A multiplier below 1 is a discount, above 1 a surcharge.
+    """
+    __tablename__ = 'pricing_rule'
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    multiplier = Column(Numeric(6, 4), nullable=False)
+    start_date = Column(Date)
+    end_date = Column(Date)
+    min_days = Column(Integer)
+    make = Column(String)
+    model = Column(String)
+    date_added = Column(DateTime, default=datetime.now)
+
+    def __init__(
+        self,
+        kind: str,
+        multiplier: float,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        min_days: Optional[int] = None,
+        make: Optional[str] = None,
+        model: Optional[str] = None
+    ):
+        """
+        Initialize a PricingRule instance.
+
+        Args:
+            kind (str): The kind of rule: season, weekend, long_stay or model.
+            multiplier (float): The factor applied to the price.
+            start_date (Optional[date]): The first day of a season.
+            end_date (Optional[date]): The day after the last day of a season.
+            min_days (Optional[int]): The minimum length, in days, of a long stay.
+            make (Optional[str]): The make of the cars of a model rule.
+            model (Optional[str]): The model of the cars of a model rule, or None for every model of the make.
+        """
+        self.kind = kind
+        self.multiplier = multiplier
+        self.start_date = start_date
+        self.end_date = end_date
+        self.min_days = min_days
+        self.make = make
+        self.model = model
+
+
+def rules_version(session) -> tuple:
+    """
+    Returns the version of the pricing rules stored in the database: their count, and the latest time and ID added.
+
+    Rules are only ever added and deleted, so any change moves it: a deletion lowers the count, an insertion raises
+    the latest time added (even when SQLite reuses the ID of a deleted rule). It is one aggregate over the few rows
+    of the table, cheap enough to check on every quote.
+    """
+    return tuple(
+        session.query(func.count(PricingRule.id), func.max(PricingRule.date_added), func.max(PricingRule.id)).one()
+    )
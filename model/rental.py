@@ -1,12 +1,13 @@
 from datetime import datetime, date
 from typing import Optional
 
-from sqlalchemy import Column, Integer, Date, DateTime, Numeric, ForeignKey
+from sqlalchemy import Column, Integer, Date, DateTime, Numeric, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from model.base import Base
+from model.softdelete import SoftDeleteMixin, LIVE, DELETED
 
-class Rental(Base):
+class Rental(SoftDeleteMixin, Base):
     __tablename__ = 'rental'
 
     id = Column(Integer, primary_key=True, index=True)
@@ -20,6 +21,22 @@ class Rental(Base):
     user = relationship("User", back_populates="rentals")
     car = relationship("Car", back_populates="rentals")
 
+    # The indexes are partial: they only cover the live (not soft deleted) rentals.
+    __table_args__ = (
+        # Serves the overlap check of model.booking: the equality on car_id seeks the car, and the range on
+        # rental_end_date skips its past rentals, so the check stays fast as the rental history grows.
+        Index("ix_rental_live_car_period", "car_id", "rental_end_date", "rental_start_date",
+              sqlite_where=LIVE, postgresql_where=LIVE),
+        # Secondary indexes of the filters and sorts of GET /rentals (see model.search); car_id is served by the
+        # index above.
+        Index("ix_rental_live_user_id", "user_id", sqlite_where=LIVE, postgresql_where=LIVE),
+        Index("ix_rental_live_start_date", "rental_start_date", sqlite_where=LIVE, postgresql_where=LIVE),
+        Index("ix_rental_live_total_price", "total_price", sqlite_where=LIVE, postgresql_where=LIVE),
+        # Finds the rentals deleted since a given time, for the occupancy calendar (see occupancy.py) and the
+        # archiver, without scanning the live ones.
+        Index("ix_rental_deleted_at", "deleted_at", sqlite_where=DELETED, postgresql_where=DELETED),
+    )
+
     def __init__(
         self, 
         user_id: int, 
@@ -0,0 +1,176 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import Column, Integer, Date, Numeric, func
+
+from model.base import Base
+from model.rental import Rental
+from model.archive import RentalArchive
+
+# The summary tables below are maintained incrementally by record_rentals, in the transaction that inserts or
+# deletes the rentals, so the reports read a row per car, user or day instead of scanning the rental history.
+
+
+class CarReport(Base):
+    """Rentals, revenue and booked days of a car, over its whole history."""
+    __tablename__ = 'report_car'
+
+    car_id = Column(Integer, primary_key=True)
+    rentals = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+    booked_days = Column(Integer, nullable=False, default=0)
+
+
+class UserReport(Base):
+    """Rentals and revenue of a user, over their whole history."""
+    __tablename__ = 'report_user'
+
+    user_id = Column(Integer, primary_key=True)
+    rentals = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+
+
+class DayReport(Base):
+    """
+    Rentals starting on a day and their revenue, and the number of cars booked on that day.
+
+    Revenue is attributed to the start date of a rental. A rental books its car from its start date up to the
+    day before its end date, since periods are half-open (see model.booking).
+    """
+    __tablename__ = 'report_day'
+
+    day = Column(Date, primary_key=True)
+    rentals = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+    booked_cars = Column(Integer, nullable=False, default=0)
+
+
+def upsert_counters(session, model, keys, rows):
+    """
+    Adds the counters of each row to the summary row with the same key, creating it when it does not exist.
+
+    Args:
+        session (Session): The session to write with.
+        model: The summary table (CarReport, UserReport or DayReport).
+        keys (List[str]): The primary key columns.
+        rows (List[dict]): The key and counter values of each row.
+    """
+    if not rows:
+        return
+    if session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    statement = insert(model)
+    counters = [name for name in rows[0] if name not in keys]
+    statement = statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: getattr(model, name) + getattr(statement.excluded, name) for name in counters}
+    )
+    session.execute(statement, rows)
+
+
+def record_rentals(session, rentals, sign: int = 1):
+    """
+    Adds rentals to the summary tables, or removes them with a sign of -1, in the current transaction.
+
+    The counters of the rentals are merged per car, user and day first, so a batch costs one upsert per
+    summary row it touches.
+
+    Args:
+        session (Session): The session to write with.
+        rentals (List[dict]): The user_id, car_id, rental_start_date, rental_end_date and total_price of each
+            rental.
+        sign (int): 1 when the rentals were inserted, -1 when they were deleted.
+    """
+    cars = defaultdict(lambda: {"rentals": 0, "revenue": 0, "booked_days": 0})
+    users = defaultdict(lambda: {"rentals": 0, "revenue": 0})
+    days = defaultdict(lambda: {"rentals": 0, "revenue": 0, "booked_cars": 0})
+
+    for rental in rentals:
+        start, end = rental["rental_start_date"], rental["rental_end_date"]
+        booked_days = max((end - start).days, 0)
+        for summary in (cars[rental["car_id"]], users[rental["user_id"]], days[start]):
+            summary["rentals"] += sign
+            summary["revenue"] += sign * rental["total_price"]
+        cars[rental["car_id"]]["booked_days"] += sign * booked_days
+        for offset in range(booked_days):
+            days[start + timedelta(days=offset)]["booked_cars"] += sign
+
+    upsert_counters(session, CarReport, ["car_id"], [{"car_id": key, **value} for key, value in cars.items()])
+    upsert_counters(session, UserReport, ["user_id"], [{"user_id": key, **value} for key, value in users.items()])
+    upsert_counters(session, DayReport, ["day"], [{"day": key, **value} for key, value in days.items()])
+
+
+def rebuild_reports(session, batch_size: int = 500):
+    """
+    Recomputes the summary tables from the live and archived rentals that are not deleted, in the current
+    transaction.
+
+    It reads the whole rental history, so it is only run when the summary tables are first created.
+    """
+    for model in (CarReport, UserReport, DayReport):
+        session.query(model).delete()
+    batch = []
+    for model in (Rental, RentalArchive):
+        columns = (model.user_id, model.car_id, model.rental_start_date, model.rental_end_date, model.total_price)
+        for row in session.query(*columns).filter(model.deleted_at.is_(None)).yield_per(batch_size):
+            batch.append(row._asdict())
+            if len(batch) == batch_size:
+                record_rentals(session, batch)
+                batch = []
+    record_rentals(session, batch)
+
+
+def period_start(day: date, period: str) -> date:
+    """Returns the first day of the day, week (starting on Monday) or month containing a day."""
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_period(start: date, period: str) -> date:
+    """Returns the first day of the period following the one starting on `start`."""
+    if period == "week":
+        return start + timedelta(days=7)
+    if period == "month":
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def period_column(period: str):
+    """
+    Returns the SQL expression of the first day of the period of a DayReport row, matching period_start.
+
+    It uses the date modifiers of SQLite.
+    """
+    if period == "week":
+        return func.date(DayReport.day, "weekday 0", "-6 days", type_=Date)
+    if period == "month":
+        return func.date(DayReport.day, "start of month", type_=Date)
+    return DayReport.day
+
+
+def revenue_by_period(session, period: str, start: date, end: date) -> dict:
+    """
+    Sums the rentals, revenue and booked car-days of the days between two dates (inclusive), per period.
+
+    Returns:
+        dict: The counters of each period that has rows, by the first day of the period.
+    """
+    bucket = period_column(period).label("period_start")
+    rows = (
+        session.query(
+            bucket,
+            func.sum(DayReport.rentals).label("rentals"),
+            func.sum(DayReport.revenue).label("revenue"),
+            func.sum(DayReport.booked_cars).label("booked_days")
+        )
+        .filter(DayReport.day >= start, DayReport.day <= end)
+        .group_by(bucket)
+        .all()
+    )
+    return {row.period_start: row for row in rows}
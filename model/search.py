@@ -0,0 +1,98 @@
+from sqlalchemy import func, select, tuple_
+
+from model.car import Car
+from model.rental import Rental
+
+
+def likely_narrow(condition):
+    """
+    Marks a range filter as matching few rows, with the unlikely() hint of SQLite.
+
+    Without statistics of the values, SQLite expects a one-sided range to match a quarter of the rows, and then
+    rather scans the table in ID order than reads the range from its index and sorts it. The hint makes it read the
+    index, whose cost is bounded by the rows that match instead of by the size of the table; an equality filter on
+    a more selective index is still preferred.
+    """
+    return func.unlikely(condition)
+
+
+def filter_cars(query, filters):
+    """
+    Applies the filters of a CarFilterSchema to a query of cars. Each filter is served by a secondary index of Car.
+    """
+    if filters.make is not None:
+        query = query.filter(Car.make == filters.make)
+    if filters.model is not None:
+        query = query.filter(Car.model == filters.model)
+    if filters.year is not None:
+        query = query.filter(Car.year == filters.year)
+    if filters.min_price is not None:
+        query = query.filter(likely_narrow(Car.price_per_day >= filters.min_price))
+    if filters.max_price is not None:
+        query = query.filter(likely_narrow(Car.price_per_day <= filters.max_price))
+    if filters.available is not None:
+        query = query.filter(Car.available_today == filters.available)
+    return query
+
+
+def filter_rentals(query, filters):
+    """
+    Applies the filters of a RentalFilterSchema to a query of rentals. Each filter is served by an index of Rental.
+    """
+    if filters.user_id is not None:
+        query = query.filter(Rental.user_id == filters.user_id)
+    if filters.car_id is not None:
+        query = query.filter(Rental.car_id == filters.car_id)
+    if filters.start_from is not None:
+        query = query.filter(likely_narrow(Rental.rental_start_date >= filters.start_from))
+    if filters.start_to is not None:
+        query = query.filter(likely_narrow(Rental.rental_start_date <= filters.start_to))
+    return query
+
+
+def sort_column(model, sort: str):
+    """
+    Returns the column and the direction of a sort parameter such as "price_per_day" or "-year".
+
+    Returns:
+        tuple: The column of the model and whether the order is descending.
+    """
+    descending = sort.startswith("-")
+    return getattr(model, sort.lstrip("-")), descending
+
+
+def cursor_row(id_column, after_id, sort_column=None):
+    """
+    Builds the query of the cursor row of a keyset query sorted by `sort_column`, whose sort value selects the next
+    page (see keyset_query), or returns None when the pages are selected by ID alone.
+
+    A soft deleted cursor row is still found, since its sort value is still read. A row that is gone, e.g. archived,
+    cannot continue the pagination, so the next page cannot be found.
+    """
+    if after_id is None or sort_column is None or sort_column is id_column:
+        return None
+    table = id_column.table
+    return select(table.c[id_column.key]).where(table.c[id_column.key] == after_id)
+
+
+def keyset_query(query, id_column, after_id, sort_column=None, descending=False):
+    """
+    Orders a query by a sort column and its primary key, and skips every row up to the `after_id` cursor.
+
+    Filtering on the (sort column, ID) pair of the cursor row instead of using OFFSET keeps every page equally
+    cheap, however deep it is. When the query is sorted by ID only, the cursor is compared with the ID directly.
+    The sort value of the cursor row is read from its table, so it is found even if the row was soft deleted since.
+    """
+    if sort_column is None or sort_column is id_column:
+        if after_id is not None:
+            query = query.filter(id_column < after_id if descending else id_column > after_id)
+        return query.order_by(id_column.desc() if descending else id_column)
+
+    if after_id is not None:
+        table = id_column.table
+        cursor_value = select(table.c[sort_column.key]).where(table.c[id_column.key] == after_id).scalar_subquery()
+        key, cursor = tuple_(sort_column, id_column), tuple_(cursor_value, after_id)
+        query = query.filter(key < cursor if descending else key > cursor)
+    if descending:
+        return query.order_by(sort_column.desc(), id_column.desc())
+    return query.order_by(sort_column, id_column)
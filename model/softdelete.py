@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, event, text, update
+from sqlalchemy.orm import Session, with_loader_criteria
+
+# The condition of the partial indexes, which only cover the live rows.
+LIVE = text("deleted_at IS NULL")
+# The condition of the partial indexes of the deleted rows, which are few since they are archived.
+DELETED = text("deleted_at IS NOT NULL")
+
+
+class SoftDeleteMixin:
+    """
+    Marks the rows of a table as deleted instead of removing them.
+
+    The ORM queries of every session skip the deleted rows, including the relationships they load, unless they are
+    run with the include_deleted execution option. Queries that must be served by a partial index still filter on
+    deleted_at explicitly, since SQLite only uses a partial index when the query states its condition.
+    """
+    deleted_at = Column(DateTime)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def skip_deleted(execute_state):
+    """Adds the deleted_at IS NULL criteria of the soft deleted tables to every ORM query."""
+    if (
+        execute_state.is_select
+        and not execute_state.is_column_load
+        and not execute_state.is_relationship_load
+        and not execute_state.execution_options.get("include_deleted", False)
+    ):
+        execute_state.statement = execute_state.statement.options(
+            with_loader_criteria(SoftDeleteMixin, lambda cls: cls.deleted_at.is_(None), include_aliases=True)
+        )
+
+
+def soft_delete(session, model, *criteria) -> int:
+    """
+    Marks the live rows of a model matching the criteria as deleted, in the current transaction.
+
+    Returns:
+        int: The number of rows marked as deleted.
+    """
+    result = session.execute(
+        update(model)
+        .where(model.deleted_at.is_(None), *criteria)
+        .values(deleted_at=datetime.now())
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
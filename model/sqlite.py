@@ -0,0 +1,40 @@
+from sqlalchemy import event
+
+import config
+
+
+def production_pragmas() -> dict:
+    """
+    Returns the pragmas of the production SQLite profile.
+
+    WAL lets readers work while a writer commits, synchronous=NORMAL is durable under WAL without an fsync on
+    every commit, and busy_timeout makes a writer wait for the lock instead of failing with "database is locked".
+    """
+    return {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": config.SQLITE_MMAP_SIZE,
+        # A negative cache_size is a size in KiB instead of a number of pages.
+        "cache_size": -config.SQLITE_CACHE_SIZE_KB,
+        "temp_store": "MEMORY",
+    }
+
+
+def apply_pragmas(engine, pragmas: dict):
+    """
+    Sets the pragmas on every new connection of a SQLite engine. Other engines are left untouched.
+
+    Args:
+        engine (Engine): The engine to configure.
+        pragmas (dict): The pragma names and their values.
+    """
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
@@ -1,23 +1,42 @@
 from datetime import datetime
 from typing import Union
 
-from sqlalchemy import Column, DateTime, Integer, String
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, DateTime, Integer, String, Index, func, select
+from sqlalchemy.orm import relationship, column_property
 
 from model.base import Base
 from model.rental import Rental
+from model.softdelete import SoftDeleteMixin, LIVE
 
-class User(Base):
+class User(SoftDeleteMixin, Base):
     __tablename__ = 'user'
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
-    email = Column(String, unique=True)
+    email = Column(String)
     password = Column(String)
-    driver_license_number = Column(String, unique=True)
+    driver_license_number = Column(String)
     date_added = Column(DateTime, default=datetime.now())
     
     rentals = relationship("Rental", back_populates="user")
+
+    # Counted with an aggregate subquery over the live rentals; deferred so it is only computed when a loader
+    # profile asks for it.
+    total_rentals = column_property(
+        select(func.count(Rental.id)).where(Rental.user_id == id, Rental.deleted_at.is_(None))
+        .correlate_except(Rental).scalar_subquery(),
+        deferred=True
+    )
+
+    # The email and the driver license number are unique among the live users only, so that a deleted user does not
+    # keep them from registering again.
+    __table_args__ = (
+        Index("ix_user_live_email", "email", unique=True, sqlite_where=LIVE, postgresql_where=LIVE),
+        Index(
+            "ix_user_live_driver_license_number", "driver_license_number", unique=True,
+            sqlite_where=LIVE, postgresql_where=LIVE
+        ),
+    )
     
     def __init__(
         self, 
@@ -32,9 +51,9 @@ class User(Base):
 
         Args:
             name (str): The name of the user.
-            email (str): The email address of the user. Must be unique.
-            password (str): The password for the user account.
-            driver_license_number (str): The driver's license number of the user. Must be unique.
+            email (str): The email address of the user. Must be unique among the live users.
+            password (str): The hash of the user's password (see passwords.hash_password), never the password.
+            driver_license_number (str): The driver's license number of the user. Must be unique among the live users.
             date_added (Union[DateTime, None], optional): The date the user was added. Defaults to None.
         """
         self.name = name
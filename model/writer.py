@@ -0,0 +1,186 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+QUEUE_TIMEOUT_MESSAGE = "The write queue is busy"
+
+
+def run_in_transaction(session, job):
+    """
+    Runs a write job in the session and commits it, or rolls it back if the job fails.
+
+    A job is a function that takes a session, performs its writes without committing and returns its result.
+    The result must not need the session any more (e.g. a presented dict), since the objects are expired
+    by the commit.
+    """
+    try:
+        result = job(session)
+        session.commit()
+        return result
+    except Exception:
+        session.rollback()
+        raise
+
+
+class WriteQueueTimeout(OperationalError):
+    """
+    Raised when a write job waited too long in the queue; it was withdrawn, so it is never run. It is an
+    OperationalError, so it is answered like a busy database: 503, try again.
+    """
+
+    def __init__(self, timeout: float):
+        super().__init__(None, None, FutureTimeoutError(f"{QUEUE_TIMEOUT_MESSAGE} (waited {timeout} s)"))
+
+
+class WriteQueue:
+    """
+    Funnels write jobs through a single thread that commits them in batches.
+
+    The jobs that arrive while a batch is collected (up to `max_batch` jobs, waiting at most `max_wait` seconds)
+    run in one transaction and share one commit, so concurrent writes cost a single fsync and never compete for
+    the SQLite write lock inside the process. If a job of the batch fails, the batch is rolled back and its jobs
+    are run again one transaction each, so only the failing job reports an error.
+
+    A job waits at most `timeout` seconds for the writer thread to take it; past that it is withdrawn and its
+    caller gets a WriteQueueTimeout. Should the writer thread die, the jobs waiting for it fail, and the next job
+    starts a new thread on the same queue.
+    """
+
+    def __init__(self, session_factory, max_batch: int = 64, max_wait: float = 0.002, timeout: float = 5.0):
+        """
+        Initialize a WriteQueue instance.
+
+        Args:
+            session_factory (sessionmaker): Creates the session of the writer thread.
+            max_batch (int): The maximum number of jobs committed together.
+            max_wait (float): How long, in seconds, a batch waits for more jobs once it has one.
+            timeout (float): How long, in seconds, a job waits in the queue before it is withdrawn.
+        """
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = os.getpid()
+
+    def run(self, job):
+        """
+        Runs a write job on the writer thread and waits for its result. Exceptions of the job are raised here.
+
+        Raises:
+            WriteQueueTimeout: The writer thread did not take the job within the timeout; the job is not run. Once
+                taken, the job is waited for until it is committed or rolled back, which SQLite bounds by its busy
+                timeout.
+        """
+        future = Future()
+        # Queued under the lock, so the job reaches a running thread, or one that fails it as it stops (see loop).
+        with self.lock:
+            self.start_thread()
+            self.jobs.put((job, future))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                raise WriteQueueTimeout(self.timeout)
+        return future.result()
+
+    def start(self):
+        """
+        Starts the writer thread of the current process, if it is not running yet.
+
+        The thread is started lazily, so that each forked worker process gets its own, with a queue of its own: the
+        jobs inherited from the parent process have no thread waiting for them. A thread that died is replaced on
+        the same queue, so the jobs queued meanwhile are still run.
+        """
+        with self.lock:
+            self.start_thread()
+
+    def start_thread(self):
+        """Starts the writer thread unless it is running; the caller holds the lock."""
+        if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+            if self.pid != os.getpid():
+                self.jobs = queue.Queue()
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.loop, name="write-queue", daemon=True)
+            self.thread.start()
+
+    def loop(self):
+        """
+        Collects the jobs into batches and commits them, forever.
+
+        The jobs withdrawn by their callers (see run) are dropped as they are taken. If the loop fails, the jobs of
+        the batch and those still queued fail with its error instead of waiting for a thread that is gone.
+        """
+        batch = []
+        try:
+            session = self.session_factory()
+            while True:
+                batch = self.take(self.jobs.get(), [])
+                deadline = time.monotonic() + self.max_wait
+                while len(batch) < self.max_batch:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch = self.take(self.jobs.get(timeout=timeout), batch)
+                    except queue.Empty:
+                        break
+                if batch:
+                    self.commit_batch(session, batch)
+                session.close()
+                batch = []
+        except BaseException as e:
+            logger.error("The write queue thread stopped: %s", e)
+            with self.lock:
+                # From here on, run starts a new thread for its job.
+                self.thread = None
+                self.fail_pending(batch, e)
+            raise
+
+    def take(self, item, batch: list) -> list:
+        """Adds a queued job to a batch, unless its caller withdrew it; the job can no longer be withdrawn."""
+        _, future = item
+        if future.set_running_or_notify_cancel():
+            batch.append(item)
+        return batch
+
+    def fail_pending(self, batch: list, error: BaseException):
+        """Fails the unresolved jobs of a batch and every job still queued with an error."""
+        pending = [future for _, future in batch if not future.done()]
+        while True:
+            try:
+                _, future = self.jobs.get_nowait()
+            except queue.Empty:
+                break
+            if future.set_running_or_notify_cancel():
+                pending.append(future)
+        for future in pending:
+            future.set_exception(error)
+
+    def commit_batch(self, session, batch):
+        """
+        Runs a batch of jobs in one transaction and resolves their futures.
+        """
+        try:
+            results = [job(session) for job, _ in batch]
+            session.commit()
+        except Exception:
+            session.rollback()
+            for job, future in batch:
+                try:
+                    future.set_result(run_in_transaction(session, job))
+                except Exception as e:
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
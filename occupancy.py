@@ -0,0 +1,158 @@
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select
+
+import config
+from model import Car, Rental, RentalArchive
+
+# Past this many changed cars, catching up rebuilds the whole calendar instead of the cars one by one.
+MAX_CHANGED_CARS = 1000
+
+
+class OccupancyCalendar:
+    """
+    The day-by-day occupancy of the fleet, kept in memory as one bitset per car.
+
+    The bitset of a car is an integer whose bit i is set when the car is rented on the i-th day of the window, from
+    `past_days` days before today to `future_days` days after it. The bits of a period are then a shift and a mask,
+    and a car is free over a period when they are all clear, so a calendar is answered without reading the rentals.
+    Cars without rentals in the window have no bitset.
+
+    The calendar is kept per worker process. It is built from the rental table on first use, and again when the
+    window moves, on the next day. The rentals written by this process are applied as soon as they are committed,
+    with add and remove. Those of other workers are caught up before every read: the cars of the rentals inserted
+    since the last one seen, or deleted or archived since the previous catch up, have their bitsets rebuilt. The
+    lookups are seeks of an index (the primary key, ix_rental_deleted_at and ix_rental_archive_archived_at), so a
+    read with nothing to catch up costs three small queries, and the rentals themselves are only read for the
+    changed cars.
+    """
+
+    def __init__(self, past_days: int = 365, future_days: int = 730, sync_margin: float = 60):
+        """
+        Initialize an OccupancyCalendar instance.
+
+        Args:
+            past_days (int): The days before today covered by the calendar.
+            future_days (int): The days after today covered by the calendar.
+            sync_margin (float): The seconds before the previous catch up from which deleted rentals are looked up.
+        """
+        self.past_days = past_days
+        self.future_days = future_days
+        self.sync_margin = timedelta(seconds=sync_margin)
+        self.lock = threading.Lock()
+        self.pid = None
+        self.first_day = None
+        self.end_day = None
+        self.bits = {}
+        self.last_id = 0
+        self.synced_at = None
+
+    def window(self, today: date = None) -> tuple:
+        """Returns the first day covered by the calendar and the day after the last one."""
+        today = today or date.today()
+        return today - timedelta(days=self.past_days), today + timedelta(days=self.future_days)
+
+    def span(self, start: date, end: date) -> int:
+        """Returns the bits of the days from start up to the day before end, clipped to the window."""
+        first = max((start - self.first_day).days, 0)
+        last = min((end - self.first_day).days, self.past_days + self.future_days)
+        if last <= first:
+            return 0
+        return ((1 << (last - first)) - 1) << first
+
+    def load(self, session, car_ids=None) -> dict:
+        """Reads the bitsets of the cars (all of them when None) from their live rentals in the window."""
+        query = session.query(Rental.car_id, Rental.rental_start_date, Rental.rental_end_date).filter(
+            Rental.deleted_at.is_(None), Rental.rental_end_date > self.first_day,
+            Rental.rental_start_date < self.end_day
+        )
+        # Filtering on the cars, even all of them, makes SQLite seek the rentals of each car in the window with the
+        # ix_rental_live_car_period index, which covers the query, instead of reading the rental history by date.
+        query = query.filter(Rental.car_id.in_(select(Car.id) if car_ids is None else car_ids))
+        bits = dict.fromkeys(car_ids or (), 0)
+        for car_id, start, end in query:
+            bits[car_id] = bits.get(car_id, 0) | self.span(start, end)
+        return bits
+
+    def rebuild(self, session):
+        """Builds the calendar of the current window from the rental table."""
+        synced_at = datetime.now()
+        self.first_day, self.end_day = self.window()
+        # Read first, so a rental inserted during the build is caught up later even if the build missed it.
+        last_id = session.query(func.max(Rental.id)).execution_options(include_deleted=True).scalar() or 0
+        self.bits = {car_id: bits for car_id, bits in self.load(session).items() if bits}
+        self.last_id = last_id
+        self.synced_at = synced_at
+        self.pid = os.getpid()
+
+    def catch_up(self, session):
+        """Rebuilds the bitsets of the cars whose rentals were inserted, deleted or archived since the last catch up."""
+        synced_at = datetime.now()
+        inserted = session.query(Rental.id, Rental.car_id).filter(Rental.id > self.last_id) \
+            .execution_options(include_deleted=True).all()
+        deleted = session.query(Rental.car_id).filter(
+            Rental.deleted_at.isnot(None), Rental.deleted_at >= self.synced_at - self.sync_margin
+        ).execution_options(include_deleted=True).all()
+        archived = session.query(RentalArchive.car_id).filter(
+            RentalArchive.archived_at >= self.synced_at - self.sync_margin
+        ).all()
+        car_ids = {row.car_id for row in inserted} | {row.car_id for row in deleted} | {row.car_id for row in archived}
+        if len(car_ids) > MAX_CHANGED_CARS:
+            self.rebuild(session)
+            return
+        if car_ids:
+            for car_id, bits in self.load(session, sorted(car_ids)).items():
+                if bits:
+                    self.bits[car_id] = bits
+                else:
+                    self.bits.pop(car_id, None)
+        self.last_id = max([self.last_id] + [row.id for row in inserted])
+        self.synced_at = synced_at
+
+    def refresh(self, session):
+        """Brings the calendar of this process up to date (see the class docstring)."""
+        with self.lock:
+            if self.pid != os.getpid() or self.first_day != self.window()[0]:
+                self.rebuild(session)
+            else:
+                self.catch_up(session)
+
+    def add(self, car_id: int, start: date, end: date):
+        """Marks the days of a committed rental as occupied, when this process has built the calendar."""
+        with self.lock:
+            if self.pid == os.getpid():
+                self.bits[car_id] = self.bits.get(car_id, 0) | self.span(start, end)
+
+    def remove(self, car_id: int, start: date, end: date):
+        """Marks the days of a deleted rental as free. Live rentals never overlap, so no other rental held them."""
+        with self.lock:
+            if self.pid == os.getpid() and car_id in self.bits:
+                self.bits[car_id] &= ~self.span(start, end)
+
+    def covers(self, start: date, end: date) -> bool:
+        """Checks whether a period is inside the window of the calendar."""
+        first_day, end_day = self.window()
+        return first_day <= start and end <= end_day
+
+    def occupancy(self, car_ids, start: date, end: date) -> dict:
+        """
+        Returns the occupancy of cars over a period inside the window, as of the last refresh: for each car ID, an
+        integer whose bit i is set when the car is rented on the i-th day of the period.
+        """
+        offset, mask = (start - self.first_day).days, (1 << (end - start).days) - 1
+        with self.lock:
+            return {car_id: (self.bits.get(car_id, 0) >> offset) & mask for car_id in car_ids}
+
+
+def occupancy_days(bits: int, days: int) -> str:
+    """Returns the occupancy of a period as a string of one character per day: "1" when rented, "0" when free."""
+    return format(bits, f"0{days}b")[::-1] if days else ""
+
+
+occupancy = OccupancyCalendar(
+    past_days=config.OCCUPANCY_PAST_DAYS,
+    future_days=config.OCCUPANCY_FUTURE_DAYS,
+    sync_margin=config.OCCUPANCY_SYNC_MARGIN_SECONDS
+)
@@ -0,0 +1,148 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import config
+
+SCHEME = "scrypt"
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def scrypt_parameters() -> tuple:
+    """Returns the configured scrypt cost parameters: n (CPU and memory cost), r (block size) and p (parallelism)."""
+    return config.PASSWORD_SCRYPT_N, config.PASSWORD_SCRYPT_R, config.PASSWORD_SCRYPT_P
+
+
+def derive(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    """Derives the key of a password with scrypt. It needs 128 * n * r bytes of memory."""
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 1024 * 1024, dklen=KEY_BYTES
+    )
+
+
+def hash_password(password: str) -> str:
+    """
+    Hashes a password with a random salt and the configured scrypt parameters.
+
+    Returns:
+        str: The hash, as "scrypt$n$r$p$salt$key" with the salt and key in base64, so it carries its parameters.
+    """
+    n, r, p = scrypt_parameters()
+    salt = os.urandom(SALT_BYTES)
+    key = derive(password, salt, n, r, p)
+    return "$".join(
+        (SCHEME, str(n), str(r), str(p), base64.b64encode(salt).decode(), base64.b64encode(key).decode())
+    )
+
+
+def verify_password(password: str, encoded: str) -> bool:
+    """
+    Checks a password against a stored hash, in constant time.
+
+    A stored value that is not a hash is a password stored in plain text before passwords were hashed; it is
+    compared as is, and needs_rehash asks for it to be hashed. Without a stored hash (an unknown user) a key is
+    still derived, so that the answer takes as long as for a wrong password.
+    """
+    if encoded is None:
+        derive(password, bytes(SALT_BYTES), *scrypt_parameters())
+        return False
+    if not encoded.startswith(SCHEME + "$"):
+        return hmac.compare_digest(password.encode(), encoded.encode())
+    _, n, r, p, salt, key = encoded.split("$")
+    derived = derive(password, base64.b64decode(salt), int(n), int(r), int(p))
+    return hmac.compare_digest(derived, base64.b64decode(key))
+
+
+def needs_rehash(encoded: str) -> bool:
+    """Returns whether a stored hash was made with other parameters than the configured ones, or is not a hash."""
+    if encoded is None or not encoded.startswith(SCHEME + "$"):
+        return True
+    _, n, r, p, _, _ = encoded.split("$")
+    return (int(n), int(r), int(p)) != scrypt_parameters()
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password hasher has too many pending jobs to take another one in time."""
+
+
+class PasswordHasher:
+    """
+    Runs the password hashes and checks on a bounded pool, off the request thread.
+
+    A hash costs tens of milliseconds of CPU by design. The pool caps how many run at once (`workers`), so the
+    other requests of the worker process keep their share of the CPU, and how many may wait (`max_pending`): a
+    request that cannot get a slot within `max_wait` seconds fails with PasswordHasherBusy instead of queueing
+    without bound. hashlib.scrypt releases the GIL, so a thread pool hashes in parallel; a process pool isolates
+    the hashing from the request threads entirely, at the cost of a process per worker.
+
+    Like the write queue, the pool is created lazily, so that each forked worker process gets its own.
+    """
+
+    def __init__(self, workers: int = 2, pool: str = "thread", max_pending: int = 64, max_wait: float = 1.0):
+        """
+        Initialize a PasswordHasher instance.
+
+        Args:
+            workers (int): The number of hashes computed at once.
+            pool (str): "thread" or "process".
+            max_pending (int): The number of hashes running or waiting at once.
+            max_wait (float): How long a request waits for a free slot, in seconds.
+        """
+        self.workers = workers
+        self.pool = pool
+        self.max_pending = max_pending
+        self.max_wait = max_wait
+        self.slots = None
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pid = None
+
+    def get_executor(self):
+        """Returns the pool of the current process, creating it (and its slots) if needed."""
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    pool_class = ProcessPoolExecutor if self.pool == "process" else ThreadPoolExecutor
+                    self.executor = pool_class(max_workers=self.workers)
+                    self.slots = threading.BoundedSemaphore(self.max_pending)
+                    self.pid = os.getpid()
+        return self.executor
+
+    def submit(self, function, *args):
+        """Runs a function on the pool once a slot is free, and returns its future."""
+        executor = self.get_executor()
+        slots = self.slots
+        if not slots.acquire(timeout=self.max_wait):
+            raise PasswordHasherBusy("Too many passwords are being hashed")
+        try:
+            future = executor.submit(function, *args)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def hash(self, password: str) -> str:
+        """Hashes a password on the pool and waits for the hash."""
+        return self.submit(hash_password, password).result()
+
+    def hash_many(self, passwords) -> list:
+        """Hashes passwords on the pool, several at once, and returns their hashes in order."""
+        futures = [self.submit(hash_password, password) for password in passwords]
+        return [future.result() for future in futures]
+
+    def verify(self, password: str, encoded: str) -> bool:
+        """Checks a password against a stored hash on the pool and waits for the result."""
+        return self.submit(verify_password, password, encoded).result()
+
+
+hasher = PasswordHasher(
+    workers=config.PASSWORD_HASH_WORKERS,
+    pool=config.PASSWORD_HASH_POOL,
+    max_pending=config.PASSWORD_HASH_MAX_PENDING,
+    max_wait=config.PASSWORD_HASH_MAX_WAIT_MS / 1000
+)
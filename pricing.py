@@ -0,0 +1,190 @@
+import bisect
+import threading
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+import config
+from model import PricingRule
+from model.pricing import rules_version
+
+ONE = Decimal(1)
+CENT = Decimal("0.01")
+WEEKEND = (5, 6)
+
+
+def count_weekend_days(start: date, days: int) -> int:
+    """Counts the Saturdays and Sundays among `days` days from start: two per full week, then the remaining days."""
+    weeks, remainder = divmod(days, 7)
+    weekday = start.weekday()
+    return weeks * len(WEEKEND) + sum(1 for offset in range(remainder) if (weekday + offset) % 7 in WEEKEND)
+
+
+class RateTable:
+    """
+    The pricing rules compiled for quoting: the rate multiplier of every day of a window, stored as prefix sums.
+
+    The sum of the daily multipliers of any period inside the window is the difference of two prefix sums, so a
+    quote costs a few lookups whatever its length, and a batch of quotes never loops over its days. Periods
+    outside the window are summed in closed form, segment by segment between the season boundaries, which costs a
+    few operations per season whatever the length of the period.
+    """
+
+    def __init__(self, rules, first_day: date, days: int):
+        """
+        Initialize a RateTable instance.
+
+        Args:
+            rules (List[PricingRule]): The pricing rules.
+            first_day (date): The first day of the window.
+            days (int): The number of days of the window.
+        """
+        self.seasons = [(rule.start_date, rule.end_date, rule.multiplier) for rule in rules if rule.kind == "season"]
+        self.weekend = ONE
+        for rule in rules:
+            if rule.kind == "weekend":
+                self.weekend *= rule.multiplier
+        long_stays = sorted((rule.min_days, rule.multiplier) for rule in rules if rule.kind == "long_stay")
+        self.long_stay_days = [min_days for min_days, _ in long_stays]
+        self.long_stay_multipliers = [multiplier for _, multiplier in long_stays]
+        self.models = {}
+        for rule in rules:
+            if rule.kind == "model":
+                key = (rule.make, rule.model)
+                self.models[key] = self.models.get(key, ONE) * rule.multiplier
+
+        self.first_day = first_day
+        self.prefix = [Decimal(0)]
+        for offset in range(days):
+            self.prefix.append(self.prefix[-1] + self.day_multiplier(first_day + timedelta(days=offset)))
+
+    def day_multiplier(self, day: date) -> Decimal:
+        """Returns the product of the seasonal and weekend multipliers of a day."""
+        multiplier = self.weekend if day.weekday() in WEEKEND else ONE
+        for start, end, season in self.seasons:
+            if start <= day < end:
+                multiplier *= season
+        return multiplier
+
+    def day_sum(self, start: date, end: date) -> Decimal:
+        """Returns the sum of the daily multipliers of the days from start up to the day before end."""
+        first, last = (start - self.first_day).days, (end - self.first_day).days
+        if 0 <= first <= last < len(self.prefix):
+            return self.prefix[last] - self.prefix[first]
+        return self.segment_sum(start, end)
+
+    def segment_sum(self, start: date, end: date) -> Decimal:
+        """
+        Sums the daily multipliers of a period of any length without visiting its days.
+
+        The period is cut at the season boundaries inside it, so the seasons in force are the same on every day of
+        a segment; the sum of a segment is then the product of its seasons times its weekdays plus its weekend days
+        weighted by the weekend multiplier.
+        """
+        if end <= start:
+            return Decimal(0)
+        bounds = sorted({start, end} | {day for season in self.seasons for day in season[:2] if start < day < end})
+        total = Decimal(0)
+        for segment_start, segment_end in zip(bounds, bounds[1:]):
+            multiplier = ONE
+            for season_start, season_end, season in self.seasons:
+                if season_start <= segment_start < season_end:
+                    multiplier *= season
+            days = (segment_end - segment_start).days
+            weekend_days = count_weekend_days(segment_start, days)
+            total += multiplier * ((days - weekend_days) + weekend_days * self.weekend)
+        return total
+
+    def long_stay_multiplier(self, days: int) -> Decimal:
+        """Returns the multiplier of the longest long stay rule reached by a rental of `days` days."""
+        index = bisect.bisect_right(self.long_stay_days, days)
+        return self.long_stay_multipliers[index - 1] if index else ONE
+
+    def model_multiplier(self, make: str, model: str) -> Decimal:
+        """Returns the multiplier of a car's model, or of its make when its model has no rule."""
+        return self.models.get((make, model), self.models.get((make, None), ONE))
+
+    def price(self, price_per_day, make: str, model: str, start: date, end: date) -> Decimal:
+        """
+        Returns the total price of renting a car from start to end, rounded to cents.
+
+        Without rules, it is the price per day times the number of days, as it always was.
+        """
+        days = (end - start).days
+        if days <= 0:
+            return Decimal("0.00")
+        total = Decimal(price_per_day) * self.day_sum(start, end) * self.long_stay_multiplier(days) \
+            * self.model_multiplier(make, model)
+        return total.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class PricingEngine:
+    """
+    Prices rentals with the rate table compiled from the pricing rules stored in the database.
+
+    The table is kept per worker process and rebuilt when the version of the rules read from the database
+    changes, which is checked on every quote: a rule change made through any worker reaches all of them at their
+    next quote, whatever the cache backend. It is also rebuilt on the first quote of every day, so its window
+    follows today.
+    """
+
+    def __init__(self, load_rules, load_version, past_days: int = 365, future_days: int = 730):
+        """
+        Initialize a PricingEngine instance.
+
+        Args:
+            load_rules (callable): Takes a session and returns the pricing rules.
+            load_version (callable): Takes a session and returns a value that changes whenever the rules do.
+            past_days (int): The days before today covered by the table.
+            future_days (int): The days after today covered by the table.
+        """
+        self.load_rules = load_rules
+        self.load_version = load_version
+        self.past_days = past_days
+        self.future_days = future_days
+        self.lock = threading.Lock()
+        self.table = None
+        self.version = None
+
+    def rate_table(self, session) -> RateTable:
+        """
+        Returns the rate table of the current rules, building it when the rules have changed, or when the day has
+        and the window of the table no longer starts `past_days` before today.
+        """
+        version = self.load_version(session)
+        first_day = date.today() - timedelta(days=self.past_days)
+        with self.lock:
+            if self.table is None or version != self.version or self.table.first_day != first_day:
+                self.table = RateTable(self.load_rules(session), first_day, self.past_days + self.future_days)
+                self.version = version
+            return self.table
+
+    def price(self, session, car, start: date, end: date) -> Decimal:
+        """Returns the total price of renting a car (anything with price_per_day, make and model)."""
+        return self.rate_table(session).price(car.price_per_day, car.make, car.model, start, end)
+
+    def quote(self, session, cars: dict, periods) -> list:
+        """
+        Prices a batch of (car ID, start, end) periods against one rate table.
+
+        Args:
+            session (Session): The session to load the rules with, if needed.
+            cars (dict): The cars of the periods, by ID.
+            periods (List[tuple]): The car ID, start and end date of each quote.
+
+        Returns:
+            List[Optional[Decimal]]: The total price of each period, or None when its car is not in `cars`.
+        """
+        table = self.rate_table(session)
+        prices = []
+        for car_id, start, end in periods:
+            car = cars.get(car_id)
+            prices.append(table.price(car.price_per_day, car.make, car.model, start, end) if car else None)
+        return prices
+
+
+pricing = PricingEngine(
+    lambda session: session.query(PricingRule).all(),
+    rules_version,
+    past_days=config.PRICING_PAST_DAYS,
+    future_days=config.PRICING_FUTURE_DAYS
+)
@@ -0,0 +1,288 @@
+import ipaddress
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from flask import g, request
+
+import config
+from logger import logger
+
+RATE_LIMITED_MESSAGE = "Too many requests, try again later"
+BUSY_MESSAGE = "Server is busy, try again"
+
+# Takes a token from a bucket stored as a hash (tokens, at), atomically, on the clock of the Redis server so that
+# every worker process agrees on it. Returns 0 when a token was taken, or the seconds until one is available, as a
+# string since Lua numbers are truncated to integers in replies.
+TAKE_SCRIPT = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = math.min(burst, (tonumber(state[1]) or burst) + math.max(0, now - (tonumber(state[2]) or now)) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class LocalBuckets:
+    """
+    Token buckets kept in the worker process, the least recently used dropped beyond `max_keys`.
+
+    Each worker process has its own buckets, so with several of them a client gets up to the limit from each; the
+    Redis store holds the limits across workers.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        """
+        Initialize a LocalBuckets instance.
+
+        Args:
+            max_keys (int): The maximum number of buckets; a dropped bucket starts over full.
+        """
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        """Takes a token from a bucket and returns 0, or the seconds until one is available when it is empty."""
+        now = time.monotonic()
+        with self.lock:
+            tokens, at = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - at) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self.buckets[key] = (tokens, now)
+            self.buckets.move_to_end(key)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class RedisBuckets:
+    """
+    Token buckets stored in a Redis server, shared by all the worker processes.
+
+    A bucket is updated by a script, in one round trip, and expires once it would be full again.
+    """
+
+    def __init__(self, client, prefix: str = "car-rental:rate:"):
+        """
+        Initialize a RedisBuckets instance.
+
+        Args:
+            client: A Redis client.
+            prefix (str): Prepended to every key, to share a server with other applications.
+        """
+        self.prefix = prefix
+        self.script = client.register_script(TAKE_SCRIPT)
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        """Takes a token from a bucket and returns 0, or the seconds until one is available when it is empty."""
+        return float(self.script(keys=[self.prefix + key], args=[rate, burst]))
+
+
+def parse_limit(spec: str) -> Optional[tuple]:
+    """Parses a limit written "rate:burst" (requests per second, and bucket size), or "rate" for a burst of rate."""
+    if not spec:
+        return None
+    rate, _, burst = spec.partition(":")
+    return float(rate), float(burst or rate)
+
+
+def parse_routes(spec: str) -> dict:
+    """Parses the limits of endpoints written "endpoint=limit,endpoint=limit", e.g. "get_rentals=2:10"."""
+    routes = {}
+    for item in filter(None, (item.strip() for item in spec.split(","))):
+        endpoint, _, limit = item.partition("=")
+        routes[endpoint.strip()] = limit.strip()
+    return routes
+
+
+class RateLimiter:
+    """
+    Rate limits every client on each endpoint with a token bucket.
+
+    A client gets a bucket per endpoint, with the limit of the endpoint or the default one. A request takes a
+    token from it, and is rejected when it is empty; the bucket refills at `rate` tokens per second, up to `burst`.
+    """
+
+    def __init__(self, buckets, default: Optional[tuple] = None, routes: dict = None):
+        """
+        Initialize a RateLimiter instance.
+
+        Args:
+            buckets: The bucket store (LocalBuckets or RedisBuckets), or None to disable rate limiting.
+            default (Optional[tuple]): The (rate, burst) of the endpoints without a limit of their own, or None.
+            routes (dict): The (rate, burst) of endpoints by name; None leaves an endpoint unlimited.
+        """
+        self.buckets = buckets
+        self.default = default
+        self.routes = routes or {}
+
+    def check(self, client: str, endpoint: str) -> float:
+        """
+        Takes a token of a client on an endpoint.
+
+        Returns:
+            float: 0 when the request may run, or the seconds after which the client may retry. When the store
+            fails (e.g. Redis is down), the request runs.
+        """
+        limit = self.routes.get(endpoint, self.default)
+        if self.buckets is None or limit is None:
+            return 0.0
+        try:
+            return self.buckets.take(f"{endpoint}:{client}", *limit)
+        except Exception as e:
+            logger.warning("Error rate limiting client '%s' on %s: %s", client, endpoint, e)
+            return 0.0
+
+
+class LoadShedder:
+    """
+    Caps the requests of the expensive endpoints that run at once in a worker process.
+
+    A request of a capped endpoint takes one of its slots before its handler runs, and releases it once its
+    response is sent. When they are all taken it waits up to `max_wait` seconds for one, and is otherwise
+    rejected, so a saturated endpoint answers quickly instead of queueing requests it cannot serve in time, and
+    leaves the threads and database connections of the worker to the other endpoints.
+    """
+
+    def __init__(self, limits: dict = None, max_wait: float = 0.1):
+        """
+        Initialize a LoadShedder instance.
+
+        Args:
+            limits (dict): The number of requests of each capped endpoint that run at once.
+            max_wait (float): How long a request waits for a free slot, in seconds.
+        """
+        self.slots = {endpoint: threading.BoundedSemaphore(limit) for endpoint, limit in (limits or {}).items()}
+        self.max_wait = max_wait
+
+    def acquire(self, endpoint: str, wait: bool = True) -> bool:
+        """Takes a slot of an endpoint, waiting for one when `wait` is true. Uncapped endpoints always get one."""
+        slots = self.slots.get(endpoint)
+        if slots is None:
+            return True
+        return slots.acquire(timeout=self.max_wait) if wait else slots.acquire(blocking=False)
+
+    def release(self, endpoint: str):
+        """Releases a slot taken by acquire."""
+        slots = self.slots.get(endpoint)
+        if slots is not None:
+            slots.release()
+
+
+def parse_networks(spec: str) -> list:
+    """Parses a comma-separated list of addresses and networks, e.g. "10.0.0.0/8,192.168.1.7"."""
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in spec.split(",") if item.strip()]
+
+
+def is_trusted_proxy(remote_addr: Optional[str], proxies: list) -> bool:
+    """Checks whether a peer address belongs to one of the trusted proxy networks."""
+    if not remote_addr or not proxies:
+        return False
+    try:
+        address = ipaddress.ip_address(remote_addr)
+    except ValueError:
+        return False
+    return any(address in network for network in proxies)
+
+
+def client_key(headers, remote_addr: Optional[str]) -> str:
+    """
+    Identifies the client of a request: by its address, or by the config.RATE_LIMIT_CLIENT_HEADER header (e.g.
+    X-Forwarded-For) when the request comes from a trusted proxy.
+
+    Each proxy appends the address it received the request from to the header, so the client is the entry
+    config.RATE_LIMIT_PROXY_COUNT from the right: the entries to its left were sent by the client itself, and any
+    client could rotate them to get fresh buckets. A header with fewer entries than proxies is ignored.
+    """
+    if config.RATE_LIMIT_CLIENT_HEADER and is_trusted_proxy(remote_addr, TRUSTED_PROXIES):
+        entries = [entry.strip() for entry in headers.get(config.RATE_LIMIT_CLIENT_HEADER, "").split(",")]
+        if len(entries) >= config.RATE_LIMIT_PROXY_COUNT and entries[-config.RATE_LIMIT_PROXY_COUNT]:
+            return entries[-config.RATE_LIMIT_PROXY_COUNT]
+    return remote_addr or "unknown"
+
+
+def admit(client: str, endpoint: str, wait: bool = True) -> Optional[tuple]:
+    """
+    Decides whether a request may run: it passes the rate limit of its client, then gets a slot of its endpoint.
+
+    Returns:
+        Optional[tuple]: None when the request may run, holding a slot that must be released with
+        load_shedder.release; otherwise the status, message and Retry-After seconds of its rejection.
+    """
+    retry_after = rate_limiter.check(client, endpoint)
+    if retry_after:
+        logger.debug("Rate limited client '%s' on %s for %.3f s", client, endpoint, retry_after)
+        return 429, RATE_LIMITED_MESSAGE, math.ceil(retry_after)
+    if not load_shedder.acquire(endpoint, wait):
+        logger.debug("Shed a request of client '%s' on %s", client, endpoint)
+        return 503, BUSY_MESSAGE, 1
+    return None
+
+
+def install_rate_limits(app):
+    """
+    Rate limits and sheds the requests of the app before their handlers run, so a rejected request never opens a
+    session. It must be installed before the other before_request functions of the app, which it then skips.
+    """
+
+    @app.before_request
+    def admit_request():
+        if request.endpoint is None:
+            return None
+        rejection = admit(client_key(request.headers, request.remote_addr), request.endpoint)
+        if rejection is not None:
+            status, message, retry_after = rejection
+            return {"message": message}, status, {"Retry-After": str(retry_after)}
+        g.shed_endpoint = request.endpoint
+        return None
+
+    # Runs once the response is sent, which for a streamed response is once the stream ends.
+    @app.teardown_request
+    def release_slot(exception=None):
+        endpoint = g.pop("shed_endpoint", None)
+        if endpoint is not None:
+            load_shedder.release(endpoint)
+
+
+def build_buckets():
+    """
+    Builds the bucket store chosen by config.RATE_LIMIT_BACKEND: "local", "redis" or "none".
+    """
+    if config.RATE_LIMIT_BACKEND == "local":
+        return LocalBuckets(max_keys=config.RATE_LIMIT_MAX_CLIENTS)
+    if config.RATE_LIMIT_BACKEND == "redis":
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the redis package")
+        return RedisBuckets(redis.Redis.from_url(config.RATE_LIMIT_REDIS_URL))
+    return None
+
+
+TRUSTED_PROXIES = parse_networks(config.RATE_LIMIT_TRUSTED_PROXIES)
+
+rate_limiter = RateLimiter(
+    build_buckets(),
+    default=parse_limit(config.RATE_LIMIT_DEFAULT),
+    routes={endpoint: parse_limit(limit) for endpoint, limit in parse_routes(config.RATE_LIMIT_ROUTES).items()}
+)
+load_shedder = LoadShedder(
+    limits={endpoint: int(limit) for endpoint, limit in parse_routes(config.SHED_ROUTES).items()},
+    max_wait=config.SHED_MAX_WAIT_MS / 1000
+)
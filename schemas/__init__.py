@@ -1,5 +1,12 @@
+from schemas.page import *
 from schemas.car import *
 from schemas.rental import *
 from schemas.user import *
 from schemas.error import *
-from schemas.message import *
\ No newline at end of file
+from schemas.message import *
+from schemas.bulk import *
+from schemas.stats import *
+from schemas.report import *
+from schemas.idempotency import *
+from schemas.quote import *
+from schemas.change import *
\ No newline at end of file
@@ -0,0 +1,38 @@
+from pydantic import BaseModel
+from typing import Optional, List
+
+class BulkRowResultSchema(BaseModel):
+    """
+    Schema representing the result of one row of a bulk import.
+
+    Attributes:
+        index (int): The position of the row in the uploaded array or NDJSON body.
+        status (int): The status the single-row endpoint would have returned for the row (200, 400, 409 or 422).
+        id (Optional[int]): The ID of the inserted row, when it was inserted.
+        message (Optional[str]): The error message, when it was not inserted.
+    """
+    index: int
+    status: int
+    id: Optional[int] = None
+    message: Optional[str] = None
+
+class BulkResultSchema(BaseModel):
+    """
+    Schema representing the outcome of a bulk import.
+
+    Attributes:
+        inserted (int): The number of rows inserted.
+        failed (int): The number of rows rejected.
+        results (List[BulkRowResultSchema]): The result of each row, in upload order.
+    """
+    inserted: int
+    failed: int
+    results: List[BulkRowResultSchema]
+
+def present_bulk_results(results: List[dict]):
+    """
+    Returns a representation of the bulk import results following the schema defined in BulkResultSchema.
+    """
+    results = sorted(results, key=lambda result: result["index"])
+    inserted = sum(1 for result in results if result["status"] == 200)
+    return {"inserted": inserted, "failed": len(results) - inserted, "results": results}
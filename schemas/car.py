@@ -1,6 +1,8 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
+from datetime import date
 from model.car import Car
+from schemas.page import PageQuerySchema, MAX_PAGE_LIMIT, fields_pattern
 
 class CarSchema(BaseModel):
     """
@@ -24,19 +26,115 @@ class CarSearchSchema(BaseModel):
     """
     id: int = 1
 
+class CarSearchQuerySchema(BaseModel):
+    """
+    Defines how the structure representing a search by make and model should be.
+    Every word must start a word of the make or the model.
+    """
+    q: str = Field("toy cor", min_length=1, max_length=100)
+    limit: int = Field(20, ge=1, le=MAX_PAGE_LIMIT)
+
+class CarAvailabilitySearchSchema(PageQuerySchema):
+    """
+    Defines how a search for the cars available in a rental period should be.
+
+    Attributes:
+        start (date): The start date of the rental period.
+        end (date): The end date of the rental period.
+    """
+    start: date
+    end: date
+
+class CarCalendarQuerySchema(BaseModel):
+    """
+    Defines how the occupancy calendar of a car should be requested.
+
+    Attributes:
+        id (int): The ID of the car.
+        start (date): The first day of the calendar.
+        end (date): The day after the last day of the calendar.
+    """
+    id: int = 1
+    start: date
+    end: date
+
+class FleetCalendarQuerySchema(BaseModel):
+    """
+    Defines how a page of the occupancy calendar of the fleet should be requested.
+
+    Attributes:
+        start (date): The first day of the calendar.
+        end (date): The day after the last day of the calendar.
+        available (Optional[bool]): When true, only the cars free on every day of the calendar; when false, only
+            the cars rented on at least one day.
+        after_id (Optional[int]): Only cars with an ID greater than this value are returned.
+        limit (Optional[int]): The maximum number of cars in the page. Defaults to 100.
+    """
+    start: date
+    end: date
+    available: Optional[bool] = None
+    after_id: Optional[int] = Field(None, ge=0)
+    limit: Optional[int] = Field(None, ge=1, le=MAX_PAGE_LIMIT)
+
+# The fields of a car in a page of cars, which `fields` selects from.
+CAR_LIST_FIELDS = ("id", "make", "model", "year", "price_per_day")
+
+class CarFilterSchema(PageQuerySchema):
+    """
+    Defines how a filtered and sorted listing of cars should be requested. Every filter is optional.
+
+    Attributes:
+        make (Optional[str]): Only cars of this make.
+        model (Optional[str]): Only cars of this model.
+        year (Optional[int]): Only cars manufactured in this year.
+        min_price (Optional[float]): Only cars whose price per day is at least this value.
+        max_price (Optional[float]): Only cars whose price per day is at most this value.
+        available (Optional[bool]): Only cars that are free today (true), or rented today (false).
+        sort (str): The field to sort by, prefixed with "-" for descending order. Ties are sorted by ID.
+        fields (Optional[str]): The fields of each car to read and return, comma-separated (e.g. "id,make");
+            all of them by default.
+    """
+    make: Optional[str] = None
+    model: Optional[str] = None
+    year: Optional[int] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    available: Optional[bool] = None
+    sort: Literal["id", "-id", "year", "-year", "price_per_day", "-price_per_day"] = "id"
+    fields: Optional[str] = Field(None, pattern=fields_pattern(CAR_LIST_FIELDS))
+
+class CarListItemSchema(CarSchema):
+    """
+    Schema representing a car inside a listing.
+
+    Attributes:
+        id (int): The unique identifier of the car.
+    """
+    id: int = 1
+
 class CarListSchema(BaseModel):
     """
-    Schema representing a list of cars.
+    Schema representing a page of cars.
 
     Attributes:
-        cars (List[CarSchema]): A list of car details.
+        cars (List[CarListItemSchema]): A list of car details, ordered by ID.
+        next_after_id (Optional[int]): The cursor to pass as `after_id` to fetch the next page,
+            or None when this is the last page.
     """
-    cars: List[CarSchema]
+    cars: List[CarListItemSchema]
+    next_after_id: Optional[int] = None
+
+# The columns present_cars reads, selected on their own by the JSON fast path.
+CAR_LIST_COLUMNS = (Car.id, Car.make, Car.model, Car.year, Car.price_per_day)
 
-def present_cars(cars: List[Car]):
+def present_cars(cars: List[Car], next_after_id: Optional[int] = None, fields: Optional[tuple] = None):
     """
-    Returns a representation of the cars following the schema defined in CarSchema.
+    Returns a representation of a page of cars following the schema defined in CarListSchema.
+    With `fields`, each car is narrowed to those fields.
     """
+    if fields is not None:
+        return {"cars": [{name: getattr(car, name) for name in fields} for car in cars],
+                "next_after_id": next_after_id}
     result = []
     for car in cars:
         result.append({
@@ -46,7 +144,43 @@ def present_cars(cars: List[Car]):
             "year": car.year,
             "price_per_day": car.price_per_day
         })
-    return {"cars": result}
+    return {"cars": result, "next_after_id": next_after_id}
+
+class CarCalendarSchema(BaseModel):
+    """
+    Schema representing the occupancy calendar of a car.
+
+    Attributes:
+        id (int): The unique identifier of the car.
+        available (bool): Whether the car is free on every day of the calendar.
+        occupancy (str): One character per day from the first day of the calendar: "1" when the car is rented,
+            "0" when it is free.
+    """
+    id: int = 1
+    available: bool = True
+    occupancy: str = "0000000"
+
+class FleetCalendarSchema(BaseModel):
+    """
+    Schema representing a page of the occupancy calendar of the fleet.
+
+    Attributes:
+        start (date): The first day of the calendar.
+        end (date): The day after the last day of the calendar.
+        cars (List[CarCalendarSchema]): The calendar of each car, ordered by ID.
+        next_after_id (Optional[int]): The cursor to pass as `after_id` to fetch the next page,
+            or None when this is the last page.
+    """
+    start: date
+    end: date
+    cars: List[CarCalendarSchema]
+    next_after_id: Optional[int] = None
+
+def present_car_calendar(car_id: int, occupancy: str):
+    """
+    Returns a representation of the calendar of a car following the schema defined in CarCalendarSchema.
+    """
+    return {"id": car_id, "available": "1" not in occupancy, "occupancy": occupancy}
 
 class CarViewSchema(BaseModel):
     """
@@ -58,7 +192,7 @@ class CarViewSchema(BaseModel):
         model (str): The model of the car (e.g., Camry, Focus).
         year (int): The year the car was manufactured.
         price_per_day (float): The rental price per day in currency units.
-        availability_status (bool): The availability status of the car for rental.
+        availability_status (bool): Whether the car is free today, i.e. none of its rentals covers today.
     """
     id: int
     make: str = "Toyota"
@@ -88,5 +222,5 @@ def present_car(car: Car):
         "model": car.model,
         "year": car.year,
         "price_per_day": car.price_per_day,
-        "availability_status": car.availability_status
+        "availability_status": car.available_today
     }
\ No newline at end of file
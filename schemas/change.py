@@ -0,0 +1,99 @@
+import json
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
+from datetime import datetime
+from model.changelog import Change
+from schemas.page import MAX_PAGE_LIMIT
+
+class ChangeQuerySchema(BaseModel):
+    """
+    Defines how a batch of the change feed should be requested.
+
+    Attributes:
+        since (int): Only the changes with a greater sequence number are returned; 0 for the start of the log.
+        limit (int): The maximum number of changes in the batch.
+    """
+    since: int = Field(0, ge=0)
+    limit: int = Field(100, ge=1, le=MAX_PAGE_LIMIT)
+
+class ChangeStreamQuerySchema(BaseModel):
+    """
+    Defines how the change feed should be streamed. A Last-Event-ID header, sent by a reconnecting EventSource,
+    takes precedence over `since`.
+
+    Attributes:
+        since (int): Only the changes with a greater sequence number are streamed; 0 for the start of the log.
+    """
+    since: int = Field(0, ge=0)
+
+class ChangeSchema(BaseModel):
+    """
+    Schema representing a change of the feed.
+
+    Attributes:
+        seq (int): The sequence number of the change, increasing in commit order.
+        entity (str): The kind of the changed row: "user", "car" or "rental".
+        id (int): The ID of the changed row.
+        op (str): "insert" or "delete".
+        changed_at (datetime): When the change was committed.
+        data (Optional[dict]): The values of an inserted row, or None for a delete, or for an insert whose row
+            was deleted later.
+    """
+    seq: int = 1
+    entity: Literal["user", "car", "rental"] = "car"
+    id: int = 1
+    op: Literal["insert", "delete"] = "insert"
+    changed_at: datetime
+    data: Optional[dict] = None
+
+class ChangeListSchema(BaseModel):
+    """
+    Schema representing a batch of the change feed.
+
+    Attributes:
+        changes (List[ChangeSchema]): The changes, ordered by sequence number.
+        next_since (int): The value to pass as `since` to fetch the next batch.
+        last_seq (Optional[int]): The sequence number of the last change of the log, or None when it is empty.
+    """
+    changes: List[ChangeSchema]
+    next_since: int
+    last_seq: Optional[int] = None
+
+def present_change(change: Change):
+    """
+    Returns a representation of a change following the schema defined in ChangeSchema.
+    """
+    return {
+        "seq": change.seq,
+        "entity": change.entity,
+        "id": change.entity_id,
+        "op": change.op,
+        "changed_at": change.changed_at,
+        "data": json.loads(change.data) if change.data else None
+    }
+
+def present_changes(changes: List[Change], since: int, last_seq: Optional[int]):
+    """
+    Returns a representation of a batch of changes following the schema defined in ChangeListSchema.
+    """
+    return {
+        "changes": [present_change(change) for change in changes],
+        "next_since": changes[-1].seq if changes else since,
+        "last_seq": last_seq
+    }
+
+def present_change_event(change: Change, dumps):
+    """
+    Returns a change as a server-sent event: its sequence number as the event ID, and as data its representation
+    following ChangeSchema, encoded with `dumps`.
+    """
+    return f"id: {change.seq}\nevent: change\ndata: {dumps(present_change(change))}\n\n"
+
+def resume_after(last_event_id: Optional[str], since: int) -> int:
+    """
+    Returns the sequence number a stream starts after: the Last-Event-ID of a reconnecting client, if valid, or
+    the `since` argument.
+    """
+    if last_event_id and last_event_id.strip().isdigit():
+        return int(last_event_id)
+    return since
@@ -0,0 +1,14 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class IdempotencyHeaderSchema(BaseModel):
+    """
+    Defines the optional Idempotency-Key header of the write endpoints.
+
+    A client that retries a request sends it with the same key: once the first request has succeeded, every
+    retry gets its response back, with an `Idempotent-Replayed: true` header, instead of writing again.
+
+    Attributes:
+        idempotency_key (Optional[str]): A unique value chosen by the client for each logical request.
+    """
+    idempotency_key: Optional[str] = Field(None, alias="Idempotency-Key", min_length=1, max_length=255)
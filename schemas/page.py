@@ -0,0 +1,53 @@
+from pydantic import BaseModel, Field, ValidationError
+from typing import Optional, Tuple
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+STREAM_BATCH_SIZE = 500
+
+class PageQuerySchema(BaseModel):
+    """
+    Defines how a keyset-paginated listing should be requested.
+
+    Attributes:
+        after_id (Optional[int]): Only rows with an ID greater than this value are returned.
+        limit (Optional[int]): The maximum number of rows in the page. Defaults to 100 for JSON pages
+            and to no limit when streaming.
+        stream (bool): When true, rows are streamed as NDJSON (one JSON object per line).
+    """
+    after_id: Optional[int] = Field(None, ge=0)
+    limit: Optional[int] = Field(None, ge=1, le=MAX_PAGE_LIMIT)
+    stream: bool = False
+
+def streamed(args) -> bool:
+    """
+    Returns whether a listing is requested as a stream, reading the `stream` argument of its query string as
+    PageQuerySchema validates it (e.g. "yes" and "on" are true). An invalid value counts as a stream, so that the
+    request is left to its validation, which rejects it, rather than answered from its ETag.
+    """
+    try:
+        return PageQuerySchema.model_validate({"stream": args.get("stream", False)}).stream
+    except ValidationError:
+        return True
+
+def fields_pattern(names) -> str:
+    """
+    Builds the pattern of a `fields` parameter: a comma-separated list of some of the names.
+    """
+    name = "|".join(names)
+    return f"^({name})(,({name}))*$"
+
+def selected_fields(fields: Optional[str], names) -> Optional[Tuple[str, ...]]:
+    """
+    Returns the names listed by a `fields` parameter, in the order of `names`, or None when it is not given.
+    """
+    if not fields:
+        return None
+    requested = set(fields.split(","))
+    return tuple(name for name in names if name in requested)
+
+def project_columns(columns, fields) -> tuple:
+    """
+    Returns the columns of a listing that its selected fields need, and the ID, which is the cursor of the pages.
+    """
+    return tuple(column for column in columns if column.key == "id" or column.key in fields)
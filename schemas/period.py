@@ -0,0 +1,21 @@
+from datetime import date, timedelta
+
+import config
+
+
+def check_period(start: date, end: date):
+    """
+    Checks that a rental period is within the limits of config.RENTAL_MAX_DAYS and config.RENTAL_HORIZON_DAYS,
+    so that pricing it or recording it in the reports costs a bounded amount of work.
+
+    An end date before the start date is left to the endpoints, which answer it with their own message.
+
+    Raises:
+        ValueError: The period is too long, or one of its dates is too far from today.
+    """
+    if (end - start).days > config.RENTAL_MAX_DAYS:
+        raise ValueError(f"Invalid rental period: Longer than {config.RENTAL_MAX_DAYS} days")
+    today = date.today()
+    horizon = timedelta(days=config.RENTAL_HORIZON_DAYS)
+    if not (today - horizon <= start <= today + horizon and today - horizon <= end <= today + horizon):
+        raise ValueError(f"Invalid rental period: Dates must be within {config.RENTAL_HORIZON_DAYS} days of today")
@@ -0,0 +1,163 @@
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional, Literal
+from datetime import date
+
+from model.pricing import PricingRule
+from schemas.page import MAX_PAGE_LIMIT
+from schemas.period import check_period
+
+class PricingRuleSchema(BaseModel):
+    """
+    Schema representing a pricing rule. Which of the optional fields are required depends on its kind.
+
+    Attributes:
+        kind (str): season, weekend, long_stay or model.
+        multiplier (float): The factor applied to the price: below 1 for a discount, above 1 for a surcharge.
+        start_date (Optional[date]): The first day of a season.
+        end_date (Optional[date]): The day after the last day of a season.
+        min_days (Optional[int]): The minimum length, in days, of a long stay.
+        make (Optional[str]): The make of the cars of a model rule.
+        model (Optional[str]): The model of the cars of a model rule; every model of the make when empty.
+    """
+    kind: Literal["season", "weekend", "long_stay", "model"] = "weekend"
+    multiplier: float = Field(1.1, gt=0, lt=100)
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    min_days: Optional[int] = Field(None, ge=1)
+    make: Optional[str] = None
+    model: Optional[str] = None
+
+class PricingRuleViewSchema(PricingRuleSchema):
+    """
+    Schema representing a pricing rule with its ID.
+
+    Attributes:
+        id (int): The unique identifier of the rule.
+    """
+    id: int = 1
+
+class PricingRuleListSchema(BaseModel):
+    """
+    Schema representing the list of pricing rules.
+
+    Attributes:
+        rules (List[PricingRuleViewSchema]): Every pricing rule, ordered by ID.
+    """
+    rules: List[PricingRuleViewSchema]
+
+class PricingRuleSearchSchema(BaseModel):
+    """
+    Defines how the structure representing a search should be.
+    The search will be made based only on the rule's ID.
+    """
+    id: int = 1
+
+class PricingRuleDeleteSchema(BaseModel):
+    """
+    Defines how the data structure returned after a delete request should be.
+
+    Attributes:
+        message (str): The message indicating the result of the deletion.
+        id (int): The ID of the rule that was deleted.
+    """
+    message: str
+    id: int
+
+class QuoteItemSchema(BaseModel):
+    """
+    Schema representing a period to price for a car. The period is limited like a rental (see check_period).
+
+    Attributes:
+        car_id (int): The ID of the car.
+        start (date): The start date of the rental period.
+        end (date): The end date of the rental period.
+    """
+    car_id: int
+    start: date
+    end: date
+
+    @model_validator(mode="after")
+    def check_limits(self):
+        check_period(self.start, self.end)
+        return self
+
+class QuoteRequestSchema(BaseModel):
+    """
+    Defines how a batch of quotes should be requested.
+
+    Attributes:
+        items (List[QuoteItemSchema]): The periods to price, at most 1000.
+    """
+    items: List[QuoteItemSchema] = Field(..., max_length=MAX_PAGE_LIMIT)
+
+class QuoteSchema(QuoteItemSchema):
+    """
+    Schema representing the quote of a period.
+
+    Attributes:
+        days (int): The number of days of the period.
+        total_price (Optional[float]): The total price of the rental, or None when it cannot be quoted.
+        message (Optional[str]): Why the period cannot be quoted, if it cannot.
+    """
+    days: int = 0
+    total_price: Optional[float] = None
+    message: Optional[str] = None
+
+class QuoteListSchema(BaseModel):
+    """
+    Schema representing a batch of quotes.
+
+    Attributes:
+        quotes (List[QuoteSchema]): The quote of each requested period, in the order of the request.
+    """
+    quotes: List[QuoteSchema]
+
+def present_pricing_rule(rule: PricingRule):
+    """
+    Returns a representation of the pricing rule following the schema defined in PricingRuleViewSchema.
+
+    Args:
+        rule (PricingRule): A pricing rule object.
+
+    Returns:
+        dict: A dictionary with the rule details.
+    """
+    return {
+        "id": rule.id,
+        "kind": rule.kind,
+        "multiplier": rule.multiplier,
+        "start_date": rule.start_date,
+        "end_date": rule.end_date,
+        "min_days": rule.min_days,
+        "make": rule.make,
+        "model": rule.model
+    }
+
+def present_pricing_rules(rules: List[PricingRule]):
+    """
+    Returns a representation of the pricing rules following the schema defined in PricingRuleListSchema.
+    """
+    return {"rules": [present_pricing_rule(rule) for rule in rules]}
+
+def present_quotes(items: List[QuoteItemSchema], prices: list):
+    """
+    Returns a representation of a batch of quotes following the schema defined in QuoteListSchema.
+
+    Args:
+        items (List[QuoteItemSchema]): The requested periods.
+        prices (list): The total price of each period, or None when its car was not found.
+
+    Returns:
+        dict: A dictionary with the quote of each period.
+    """
+    result = []
+    for item, price in zip(items, prices):
+        quote = {"car_id": item.car_id, "start": item.start, "end": item.end, "days": (item.end - item.start).days}
+        if item.end < item.start:
+            quote.update(total_price=None, message="Invalid rental period: End date is before start date")
+        elif price is None:
+            quote.update(total_price=None, message="Car not found")
+        else:
+            quote.update(total_price=price, message=None)
+        result.append(quote)
+    return {"quotes": result}
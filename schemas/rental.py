@@ -1,12 +1,15 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional, Literal
 from datetime import date
 
 from model.rental import Rental
+from schemas.page import PageQuerySchema, fields_pattern
+from schemas.period import check_period
 
 class RentalSchema(BaseModel):
     """
-    Schema representing the basic details of a rental.
+    Schema representing the basic details of a rental. The period is at most config.RENTAL_MAX_DAYS long, since
+    the reports record every day of it (see check_period).
 
     Attributes:
         user_id (int): The ID of the user who is renting the car.
@@ -19,6 +22,11 @@ class RentalSchema(BaseModel):
     rental_start_date: date
     rental_end_date: date
 
+    @model_validator(mode="after")
+    def check_limits(self):
+        check_period(self.rental_start_date, self.rental_end_date)
+        return self
+
 class RentalSearchSchema(BaseModel):
     """
     Defines how the structure representing a search should be.
@@ -26,6 +34,29 @@ class RentalSearchSchema(BaseModel):
     """
     id: int = 1
 
+# The fields of a rental in a page of rentals, which `fields` selects from.
+RENTAL_LIST_FIELDS = ("id", "user_id", "car_id", "rental_start_date", "rental_end_date", "total_price")
+
+class RentalFilterSchema(PageQuerySchema):
+    """
+    Defines how a filtered and sorted listing of rentals should be requested. Every filter is optional.
+
+    Attributes:
+        user_id (Optional[int]): Only rentals of this user.
+        car_id (Optional[int]): Only rentals of this car.
+        start_from (Optional[date]): Only rentals starting on or after this date.
+        start_to (Optional[date]): Only rentals starting on or before this date.
+        sort (str): The field to sort by, prefixed with "-" for descending order. Ties are sorted by ID.
+        fields (Optional[str]): The fields of each rental to read and return, comma-separated
+            (e.g. "id,total_price"); all of them by default.
+    """
+    user_id: Optional[int] = None
+    car_id: Optional[int] = None
+    start_from: Optional[date] = None
+    start_to: Optional[date] = None
+    sort: Literal["id", "-id", "rental_start_date", "-rental_start_date", "total_price", "-total_price"] = "id"
+    fields: Optional[str] = Field(None, pattern=fields_pattern(RENTAL_LIST_FIELDS))
+
 class RentalViewSchema(RentalSchema):
     """
     Schema representing a detailed view of a rental including its ID.
@@ -39,12 +70,15 @@ class RentalViewSchema(RentalSchema):
 
 class RentalListSchema(BaseModel):
     """
-    Schema representing a list of rentals.
+    Schema representing a page of rentals.
 
     Attributes:
-        rentals (List[RentalViewSchema]): A list of rental details.
+        rentals (List[RentalViewSchema]): A list of rental details, ordered by ID.
+        next_after_id (Optional[int]): The cursor to pass as `after_id` to fetch the next page,
+            or None when this is the last page.
     """
     rentals: List[RentalViewSchema]
+    next_after_id: Optional[int] = None
 
 class RentalDeleteSchema(BaseModel):
     """
@@ -76,16 +110,26 @@ def present_rental(rental: Rental):
         "total_price": rental.total_price
     }
 
-def present_rentals(rentals: List[Rental]):
+# The columns present_rentals reads, selected on their own by the JSON fast path.
+RENTAL_LIST_COLUMNS = (
+    Rental.id, Rental.user_id, Rental.car_id, Rental.rental_start_date, Rental.rental_end_date, Rental.total_price
+)
+
+def present_rentals(rentals: List[Rental], next_after_id: Optional[int] = None, fields: Optional[tuple] = None):
     """
-    Returns a representation of the rentals following the schema defined in RentalViewSchema.
+    Returns a representation of a page of rentals following the schema defined in RentalListSchema.
 
     Args:
         rentals (List[Rental]): A list of rental objects.
+        next_after_id (Optional[int]): The cursor of the next page, if any.
+        fields (Optional[tuple]): The fields each rental is narrowed to, if any.
 
     Returns:
-        dict: A dictionary with a list of rental details.
+        dict: A dictionary with a list of rental details and the next page cursor.
     """
+    if fields is not None:
+        return {"rentals": [{name: getattr(rental, name) for name in fields} for rental in rentals],
+                "next_after_id": next_after_id}
     result = []
     for rental in rentals:
         result.append({
@@ -96,4 +140,4 @@ def present_rentals(rentals: List[Rental]):
             "rental_end_date": rental.rental_end_date,
             "total_price": rental.total_price
         })
-    return {"rentals": result}
\ No newline at end of file
+    return {"rentals": result, "next_after_id": next_after_id}
\ No newline at end of file
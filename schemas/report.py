@@ -0,0 +1,191 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional, Literal
+from datetime import date
+
+from schemas.page import MAX_PAGE_LIMIT
+
+class CarReportQuerySchema(BaseModel):
+    """
+    Defines how a page of the revenue report by car should be requested.
+
+    Attributes:
+        after_id (Optional[int]): The cursor returned as `next_after_id` by the previous page.
+        limit (Optional[int]): The maximum number of cars in the page. Defaults to 100.
+        sort (str): The field to sort by, prefixed with "-" for descending order. Ties are sorted by car ID.
+    """
+    after_id: Optional[int] = Field(None, ge=0)
+    limit: Optional[int] = Field(None, ge=1, le=MAX_PAGE_LIMIT)
+    sort: Literal["car_id", "-car_id", "revenue", "-revenue", "rentals", "-rentals", "booked_days",
+                  "-booked_days"] = "car_id"
+
+class UserReportQuerySchema(BaseModel):
+    """
+    Defines how a page of the revenue report by user should be requested.
+
+    Attributes:
+        after_id (Optional[int]): The cursor returned as `next_after_id` by the previous page.
+        limit (Optional[int]): The maximum number of users in the page. Defaults to 100.
+        sort (str): The field to sort by, prefixed with "-" for descending order. Ties are sorted by user ID.
+    """
+    after_id: Optional[int] = Field(None, ge=0)
+    limit: Optional[int] = Field(None, ge=1, le=MAX_PAGE_LIMIT)
+    sort: Literal["user_id", "-user_id", "revenue", "-revenue", "rentals", "-rentals"] = "user_id"
+
+class PeriodReportQuerySchema(BaseModel):
+    """
+    Defines how the revenue and utilization report by period should be requested.
+
+    Attributes:
+        start_date (date): The first day of the report.
+        end_date (date): The last day of the report.
+        period (str): The length of each period: day, week (starting on Monday) or month.
+    """
+    start_date: date
+    end_date: date
+    period: Literal["day", "week", "month"] = "month"
+
+class CarReportSchema(BaseModel):
+    """
+    Schema representing the revenue and utilization of a car over its whole history.
+
+    Attributes:
+        car_id (int): The ID of the car.
+        rentals (int): The number of rentals of the car.
+        revenue (float): The sum of the total prices of its rentals.
+        booked_days (int): The number of days the car was booked for.
+    """
+    car_id: int
+    rentals: int = 0
+    revenue: float = 0.0
+    booked_days: int = 0
+
+class CarReportListSchema(BaseModel):
+    """
+    Schema representing a page of the revenue report by car.
+
+    Attributes:
+        cars (List[CarReportSchema]): The report of each car that has been rented.
+        next_after_id (Optional[int]): The cursor to pass as `after_id` to fetch the next page,
+            or None when this is the last page.
+    """
+    cars: List[CarReportSchema]
+    next_after_id: Optional[int] = None
+
+class UserReportSchema(BaseModel):
+    """
+    Schema representing the revenue of a user over their whole history.
+
+    Attributes:
+        user_id (int): The ID of the user.
+        rentals (int): The number of rentals of the user.
+        revenue (float): The sum of the total prices of their rentals.
+    """
+    user_id: int
+    rentals: int = 0
+    revenue: float = 0.0
+
+class UserReportListSchema(BaseModel):
+    """
+    Schema representing a page of the revenue report by user.
+
+    Attributes:
+        users (List[UserReportSchema]): The report of each user who has rented a car.
+        next_after_id (Optional[int]): The cursor to pass as `after_id` to fetch the next page,
+            or None when this is the last page.
+    """
+    users: List[UserReportSchema]
+    next_after_id: Optional[int] = None
+
+class PeriodSummarySchema(BaseModel):
+    """
+    Schema representing the revenue and fleet utilization of a period.
+
+    Attributes:
+        period_start (date): The first day of the period.
+        rentals (int): The number of rentals starting in the period.
+        revenue (float): The sum of the total prices of those rentals.
+        booked_days (int): The number of days cars were booked for in the period.
+        available_days (int): The number of days of the period times the number of cars.
+        utilization (float): The share of the available days that were booked.
+    """
+    period_start: date
+    rentals: int = 0
+    revenue: float = 0.0
+    booked_days: int = 0
+    available_days: int = 0
+    utilization: float = 0.0
+
+class PeriodReportSchema(BaseModel):
+    """
+    Schema representing the revenue and fleet utilization report by period.
+
+    Attributes:
+        period (str): The length of each period.
+        start_date (date): The first day of the report.
+        end_date (date): The last day of the report.
+        fleet_size (int): The number of cars the available days are counted for.
+        periods (List[PeriodSummarySchema]): The summary of each period, in order, including the empty ones.
+        total (PeriodSummarySchema): The summary of the whole report, starting on its first day.
+    """
+    period: str
+    start_date: date
+    end_date: date
+    fleet_size: int
+    periods: List[PeriodSummarySchema]
+    total: PeriodSummarySchema
+
+def present_car_reports(reports, next_after_id: Optional[int] = None):
+    """
+    Returns a representation of a page of the revenue report by car following the schema defined in
+    CarReportListSchema.
+
+    Args:
+        reports (List[CarReport]): The summary rows of the cars.
+        next_after_id (Optional[int]): The cursor of the next page, if any.
+
+    Returns:
+        dict: A dictionary with the report of each car and the next page cursor.
+    """
+    result = []
+    for report in reports:
+        result.append({
+            "car_id": report.car_id,
+            "rentals": report.rentals,
+            "revenue": report.revenue,
+            "booked_days": report.booked_days
+        })
+    return {"cars": result, "next_after_id": next_after_id}
+
+def present_user_reports(reports, next_after_id: Optional[int] = None):
+    """
+    Returns a representation of a page of the revenue report by user following the schema defined in
+    UserReportListSchema.
+
+    Args:
+        reports (List[UserReport]): The summary rows of the users.
+        next_after_id (Optional[int]): The cursor of the next page, if any.
+
+    Returns:
+        dict: A dictionary with the report of each user and the next page cursor.
+    """
+    result = []
+    for report in reports:
+        result.append({
+            "user_id": report.user_id,
+            "rentals": report.rentals,
+            "revenue": report.revenue
+        })
+    return {"users": result, "next_after_id": next_after_id}
+
+def present_period_summary(period_start: date, rentals: int, revenue, booked_days: int, available_days: int):
+    """
+    Returns a representation of the summary of a period following the schema defined in PeriodSummarySchema.
+    """
+    return {
+        "period_start": period_start,
+        "rentals": rentals,
+        "revenue": revenue,
+        "booked_days": booked_days,
+        "available_days": available_days,
+        "utilization": round(booked_days / available_days, 4) if available_days else 0.0
+    }
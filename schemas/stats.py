@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+
+class CacheStatsSchema(BaseModel):
+    """
+    Schema representing the counters of the read-through cache of a worker process.
+
+    Attributes:
+        backend (str): The configured cache backend.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that had to load from the database.
+        hit_ratio (float): The share of lookups answered from the cache.
+        invalidations (int): The number of namespaces invalidated by writes.
+    """
+    backend: str = "lru"
+    hits: int = 0
+    misses: int = 0
+    hit_ratio: float = 0.0
+    invalidations: int = 0
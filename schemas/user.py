@@ -1,7 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from model.user import User
 from schemas import RentalSchema
+from schemas.page import PageQuerySchema, fields_pattern
 
 class UserSchema(BaseModel):
     """
@@ -19,38 +20,77 @@ class UserSearchSchema(BaseModel):
     """
     id: int = 1
 
+# The fields of a user in a page of users, which `fields` selects from.
+USER_LIST_FIELDS = ("name", "email", "driver_license_number")
+
+class UserPageQuerySchema(PageQuerySchema):
+    """
+    Defines how a page of users should be requested.
+    Only the fields listed in `fields` (comma-separated, e.g. "name,email") are read and returned; all by default.
+    """
+    fields: Optional[str] = Field(None, pattern=fields_pattern(USER_LIST_FIELDS))
+
+class UserListItemSchema(BaseModel):
+    """
+    Defines how a user is represented in a page of users. The password is never returned.
+    """
+    name: str = "John Doe"
+    email: str = "john.doe@example.com"
+    driver_license_number: str = "D12345678"
+
 class UserListSchema(BaseModel):
     """
-    Defines how a list of users will be returned.
+    Defines how a page of users will be returned.
+    The cursor of the next page is given by next_after_id, which is None on the last page.
     """
-    users: List[UserSchema]
+    users: List[UserListItemSchema]
+    next_after_id: Optional[int] = None
+
+# The columns present_users reads (and the ID, the pagination cursor), selected on their own by the JSON fast path.
+USER_LIST_COLUMNS = (User.id, User.name, User.email, User.driver_license_number)
 
-def present_users(users: List[User]):
+def present_users(users: List[User], next_after_id: Optional[int] = None, fields: Optional[tuple] = None):
     """
-    Returns a representation of the users following the schema defined in UserSchema.
+    Returns a representation of a page of users following the schema defined in UserListSchema.
+    With `fields`, each user is narrowed to those fields.
     """
+    if fields is not None:
+        return {"users": [{name: getattr(user, name) for name in fields} for user in users],
+                "next_after_id": next_after_id}
     result = []
     for user in users:
         result.append({
             "name": user.name,
             "email": user.email,
-            "password": user.password,
             "driver_license_number": user.driver_license_number
         })
-    return {"users": result}
+    return {"users": result, "next_after_id": next_after_id}
 
 class UserViewSchema(BaseModel):
     """
-    Defines how a user will be returned: user + rentals.
+    Defines how a user will be returned: user + rentals. The password is never returned.
     """
     id: int = 1
     name: str = "John Doe"
     email: str = "john.doe@example.com"
-    password: str = "password123"
     driver_license_number: str = "D12345678"
     total_rentals: int = 1
     rentals: List[RentalSchema]
 
+class LoginSchema(BaseModel):
+    """
+    Defines how the credentials of a login should be sent.
+    """
+    email: str = "john.doe@example.com"
+    password: str = "password123"
+
+class LoginResultSchema(BaseModel):
+    """
+    Defines how the result of a successful login will be returned.
+    """
+    message: str
+    id: int
+
 class UserDeleteSchema(BaseModel):
     """
     Defines how the data structure returned after a delete request should be.
@@ -61,13 +101,21 @@ class UserDeleteSchema(BaseModel):
 def present_user(user: User):
     """
     Returns a representation of the user following the schema defined in UserViewSchema.
+    The user should be loaded with the "user_detail" loader profile, so the rentals and their count
+    come from the eager loads instead of one lazy load per access.
     """
     return {
         "id": user.id,
         "name": user.name,
         "email": user.email,
-        "password": user.password,
         "driver_license_number": user.driver_license_number,
-        "total_rentals": len(user.rentals),
-        "rentals": [{"start_date": r.start_date, "end_date": r.end_date, "car_id": r.car_id} for r in user.rentals]
+        "total_rentals": user.total_rentals,
+        "rentals": [
+            {
+                "user_id": r.user_id,
+                "car_id": r.car_id,
+                "rental_start_date": r.rental_start_date,
+                "rental_end_date": r.rental_end_date
+            } for r in user.rentals
+        ]
     }
\ No newline at end of file
@@ -0,0 +1,59 @@
+import dataclasses
+import decimal
+import functools
+from datetime import date
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Dates repeat a lot in listings (e.g. rental periods), so their formatting is cached.
+cached_http_date = functools.lru_cache(maxsize=65536)(http_date)
+
+
+def default(o):
+    """
+    Serializes the values orjson does not handle natively the way Flask's default provider does: Decimal as a
+    string and dates in the HTTP date format, so that both providers produce the same payloads.
+    """
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    if isinstance(o, date):
+        return cached_http_date(o)
+    if dataclasses.is_dataclass(o):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider encoding with orjson instead of the standard library encoder.
+
+    Responses are encoded straight to bytes, with sorted keys like the default provider. Non-ASCII characters are
+    written as UTF-8 instead of \\u escapes; the payloads are otherwise identical.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        return self.encode(obj, indent=bool(kwargs.get("indent"))).decode()
+
+    def encode(self, obj, indent: bool = False) -> bytes:
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=default, option=option)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self.encode(obj, indent=indent) + b"\n", mimetype=self.mimetype)
+
+
+def fast_json_available() -> bool:
+    """Tells whether the optional orjson package, which FastJSONProvider needs, is installed."""
+    return orjson is not None
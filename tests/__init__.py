@@ -0,0 +1,20 @@
+"""
+Tests of the API, run from the root of the repository with `python -m nose2` (or `python -m unittest`).
+
+They run against a scratch SQLite database in a temporary directory, migrated and seeded once per run (see
+tests.support), so database/db.sqlite3 is never touched. The environment is set here, before config is first
+imported. The read-through cache is disabled, so every request runs its queries.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+SCRATCH_PATH = tempfile.mkdtemp(prefix="car-rental-tests-")
+atexit.register(shutil.rmtree, SCRATCH_PATH, ignore_errors=True)
+
+os.environ.pop("DATABASE_URL", None)
+os.environ["DB_PATH"] = SCRATCH_PATH + "/"
+os.environ["LOG_PATH"] = os.path.join(SCRATCH_PATH, "log") + "/"
+os.environ["LOG_LEVEL"] = "ERROR"
+os.environ["CACHE_BACKEND"] = "none"
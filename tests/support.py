@@ -0,0 +1,38 @@
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# The size of the seeded database: enough rentals per user and car for a listing or a user to span many of them.
+SIZES = {"cars": 20, "users": 50, "rentals": 2000}
+
+seeded = False
+
+
+def seed_database():
+    """Migrates and seeds the scratch database (see benchmark.seed), once per test run."""
+    global seeded
+    if not seeded:
+        from benchmark.seed import seed
+        seed(**SIZES)
+        seeded = True
+
+
+@contextmanager
+def count_statements(engine):
+    """
+    Collects the SQL statements run on an engine inside the block, in a list of (statement, parameters). Only those
+    of the current thread are collected, so the background threads (e.g. the sweepers) do not change the count.
+    """
+    statements = []
+    thread = threading.get_ident()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread:
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
@@ -0,0 +1,115 @@
+"""
+Checks with EXPLAIN QUERY PLAN that every filter, sort and page cursor of the listings, and the overlap check of the
+rentals, is served by its index. The plans are those of the statements the requests actually run, on the seeded
+and analyzed database.
+"""
+import re
+import unittest
+from datetime import date
+
+from tests.support import seed_database, count_statements
+
+
+class QueryPlanTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        seed_database()
+        from app import app
+        from model import engine, Session, Car
+        cls.client = app.test_client()
+        cls.engine = engine
+        cls.session = Session
+        cls.make, cls.model = Session().query(Car.make, Car.model).first()
+        Session.remove()
+
+    def explain(self, statements) -> str:
+        """Returns the query plans of the SELECT statements run, one step per line."""
+        steps = []
+        with self.engine.connect() as connection:
+            for statement, parameters in statements:
+                if statement.lstrip().upper().startswith("SELECT"):
+                    plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                    steps.extend(row[-1] for row in plan)
+        return "\n".join(steps)
+
+    def plan(self, url: str) -> str:
+        """Returns the query plans of the statements run by a GET request, which must succeed."""
+        with count_statements(self.engine) as statements:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return self.explain(statements)
+
+    def assertUsesIndex(self, plan: str, table: str, index: str):
+        """Checks that a plan reads a table through an index, and never scans it."""
+        self.assertRegex(plan, rf"SEARCH {table} USING (COVERING )?INDEX {index}\b")
+        self.assertNotRegex(plan, rf"SCAN {table}\b(?! USING)", plan)
+
+    def test_car_filters(self):
+        cases = {
+            f"/cars?make={self.make}": "ix_car_live_make_model",
+            f"/cars?make={self.make}&model={self.model}": "ix_car_live_make_model",
+            f"/cars?model={self.model}": "ix_car_live_model",
+            "/cars?year=2020": "ix_car_live_year",
+            "/cars?min_price=50": "ix_car_live_price_per_day",
+            "/cars?max_price=50": "ix_car_live_price_per_day",
+            "/cars?min_price=20&max_price=50": "ix_car_live_price_per_day",
+        }
+        for url, index in cases.items():
+            with self.subTest(url=url):
+                self.assertUsesIndex(self.plan(url), "car", index)
+
+    def test_car_sorts_and_keysets(self):
+        cases = {
+            "/cars?sort=year&after_id=3": "ix_car_live_year",
+            "/cars?sort=-year&after_id=3": "ix_car_live_year",
+            "/cars?sort=price_per_day&after_id=3": "ix_car_live_price_per_day",
+            "/cars?sort=-price_per_day&after_id=3": "ix_car_live_price_per_day",
+        }
+        for url, index in cases.items():
+            with self.subTest(url=url):
+                self.assertUsesIndex(self.plan(url), "car", index)
+        self.assertIn("SEARCH car USING INTEGER PRIMARY KEY (rowid>?)", self.plan("/cars?after_id=3"))
+
+    def test_car_availability(self):
+        # Each car is checked with one seek of the rentals of the car.
+        for url in ("/cars?available=true", "/cars?available=false", "/cars/available?start=2030-01-01&end=2030-01-08"):
+            with self.subTest(url=url):
+                self.assertUsesIndex(self.plan(url), "rental", "ix_rental_live_car_period")
+
+    def test_rental_filters(self):
+        cases = {
+            "/rentals?user_id=3": "ix_rental_live_user_id",
+            "/rentals?car_id=3": "ix_rental_live_car_period",
+            "/rentals?start_from=2024-01-01": "ix_rental_live_start_date",
+            "/rentals?start_to=2024-01-01": "ix_rental_live_start_date",
+            "/rentals?start_from=2024-01-01&start_to=2024-03-01": "ix_rental_live_start_date",
+        }
+        for url, index in cases.items():
+            with self.subTest(url=url):
+                self.assertUsesIndex(self.plan(url), "rental", index)
+
+    def test_rental_sorts_and_keysets(self):
+        cases = {
+            "/rentals?sort=rental_start_date&after_id=5": "ix_rental_live_start_date",
+            "/rentals?sort=-rental_start_date&after_id=5": "ix_rental_live_start_date",
+            "/rentals?sort=total_price&after_id=5": "ix_rental_live_total_price",
+            "/rentals?sort=-total_price&after_id=5": "ix_rental_live_total_price",
+        }
+        for url, index in cases.items():
+            with self.subTest(url=url):
+                self.assertUsesIndex(self.plan(url), "rental", index)
+        self.assertIn("SEARCH rental USING INTEGER PRIMARY KEY (rowid>?)", self.plan("/rentals?after_id=5"))
+
+    def test_rental_overlap_check(self):
+        from model import has_overlap
+        with count_statements(self.engine) as statements:
+            has_overlap(self.session(), 3, date(2030, 1, 1), date(2030, 1, 8))
+        self.session.remove()
+        plan = self.explain(statements)
+        self.assertUsesIndex(plan, "rental", "ix_rental_live_car_period")
+        self.assertRegex(plan, re.escape("(car_id=? AND rental_end_date>?)"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Soaks the API with a long run of requests: every request must return its connection to the pool and drop its
+session, and the memory of the process must stay flat once the per-process caches are warm.
+
+The run is short by default; set SOAK_REQUESTS for a long one, e.g. SOAK_REQUESTS=100000.
+"""
+import gc
+import os
+import tracemalloc
+import unittest
+
+from tests.support import seed_database
+
+SOAK_REQUESTS = int(os.getenv("SOAK_REQUESTS", "1000"))
+
+# Memory allocated once the run is warm that may still be held at its end, e.g. by the logging handlers or the
+# statement caches of SQLAlchemy settling.
+MAX_GROWTH_BYTES = 512 * 1024
+
+
+class SoakTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        seed_database()
+        from app import app
+        from model import engine, Session
+        cls.client = app.test_client()
+        cls.engine = engine
+        cls.session = Session
+        cls.urls = [
+            "/users?limit=20", "/user?id=1", "/cars?limit=20", "/cars?available=true&limit=20", "/car?id=1",
+            "/rentals?limit=50", "/rental?id=1", "/cars/search?q=a", "/reports/cars?limit=10",
+        ]
+
+    def run_requests(self, count: int):
+        """Runs `count` GET requests over the URLs, checking the pool and the session after each of them."""
+        for i in range(count):
+            url = self.urls[i % len(self.urls)]
+            response = self.client.get(url)
+            self.assertIn(response.status_code, (200, 404), url)
+            self.assertEqual(self.engine.pool.checkedout(), 0, url)
+            self.assertFalse(self.session.registry.has(), url)
+
+    def test_connections_and_memory_stay_flat(self):
+        # Warms up the statement caches, the pool and the lazily started threads.
+        self.run_requests(len(self.urls) * 20)
+        connections = self.engine.pool.checkedin()
+
+        tracemalloc.start()
+        try:
+            gc.collect()
+            baseline = tracemalloc.get_traced_memory()[0]
+            self.run_requests(SOAK_REQUESTS)
+            gc.collect()
+            growth = tracemalloc.get_traced_memory()[0] - baseline
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(self.engine.pool.checkedout(), 0)
+        self.assertLessEqual(self.engine.pool.checkedin(), max(connections, 1))
+        self.assertLess(growth, MAX_GROWTH_BYTES, f"{growth} bytes held after {SOAK_REQUESTS} requests")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""
+Guards the read endpoints against N+1 queries: the statements an endpoint runs must not depend on how many rows it
+returns, or on how many rentals the returned users have.
+"""
+import unittest
+
+from sqlalchemy import func
+
+from tests.support import seed_database, count_statements
+
+
+class StatementCountTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        seed_database()
+        from app import app
+        from model import engine, Session, Rental
+        cls.client = app.test_client()
+        cls.engine = engine
+        session = Session()
+        counts = session.query(Rental.user_id, func.count()).group_by(Rental.user_id).order_by(func.count()).all()
+        cls.busiest_user, cls.quietest_user = counts[-1][0], counts[0][0]
+        Session.remove()
+
+    def statements(self, method: str, url: str, **kwargs) -> list:
+        """Returns the statements run by a request, which must succeed."""
+        with count_statements(self.engine) as statements:
+            response = self.client.open(url, method=method, **kwargs)
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return statements
+
+    def assertConstant(self, *urls):
+        """Checks that the GET requests of the URLs run as many statements as each other."""
+        counts = {url: len(self.statements("GET", url)) for url in urls}
+        self.assertEqual(len(set(counts.values())), 1, counts)
+
+    def test_user_listing(self):
+        self.assertConstant("/users?limit=1", "/users?limit=10", "/users?limit=50")
+
+    def test_car_listing(self):
+        self.assertConstant("/cars?limit=1", "/cars?limit=20", "/cars?sort=-price_per_day&limit=20")
+
+    def test_rental_listing(self):
+        self.assertConstant("/rentals?limit=1", "/rentals?limit=100", "/rentals?limit=1000")
+
+    def test_user_detail_does_not_load_rentals_one_by_one(self):
+        self.assertConstant(f"/user?id={self.quietest_user}", f"/user?id={self.busiest_user}")
+        # The user with its rental count, then its rentals in one eager load.
+        self.assertLessEqual(len(self.statements("GET", f"/user?id={self.busiest_user}")), 2)
+
+    def test_add_user_presents_without_lazy_loads(self):
+        statements = self.statements("POST", "/user", data={
+            "name": "Statement Count", "email": "statement.count@example.com", "password": "secret",
+            "driver_license_number": "SC-1"
+        })
+        self.assertFalse([statement for statement, _ in statements if "FROM rental" in statement], statements)
+
+
+if __name__ == "__main__":
+    unittest.main()